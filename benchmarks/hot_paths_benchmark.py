@@ -0,0 +1,156 @@
+"""
+Microbenchmarks of the pure-Python code every search runs, without network
+
+Covers validate_search_params, construct_query_payload for every SEARCH_TYPES
+entry, format_applicant_name_for_search, validate_date_range,
+format_results_for_csv and get_nested_value. Search parameters are built from
+the queries in search_strings1.csv, result sets are synthetic ODP records of
+100 to 100k rows. Timings are reported like pytest-benchmark (min, median,
+mean, stddev, rounds); --memory reports the net and peak allocation of one
+call measured with tracemalloc instead.
+
+Run from the repository root:
+    python -m benchmarks.hot_paths_benchmark [--filter csv] [--memory] [--json results.json]
+"""
+import argparse
+import csv
+import json
+import logging
+import os
+import statistics
+import timeit
+import tracemalloc
+
+from benchmarks.mock_odp import APPLICANTS, make_record
+from patent_database.constants import SEARCH_TYPES, CSV_EXPORT_FIELDS
+from patent_database.operations import construct_query_payload, format_applicant_name_for_search, validate_date_range
+from patent_database.utils import validate_search_params, format_results_for_csv, get_nested_value
+
+SEARCH_STRINGS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'search_strings1.csv')
+RESULT_SIZES = [100, 1000, 10000, 100000]
+
+def load_queries(path=SEARCH_STRINGS):
+    """The `q` strings of search_strings1.csv, whose Query column reads `"q": "..."`"""
+    with open(path, encoding='utf-8-sig', newline='') as file:
+        return [json.loads('{' + row['Query'] + '}')['q'] for row in csv.DictReader(file)]
+
+def search_params_by_type(queries):
+    """Search parameters for every search type, as the frontend sends them"""
+    dates = {'dateFrom': '2020-01-01', 'dateTo': '2024-12-31'}
+    return {
+        'simple': {'query_params': {'term': 'wireless sensor', **dates},
+                   'quick_fields': {'applicant_name': 'Acme Widgets LLC', 'inventor_name': 'Jane Roe'}},
+        'boolean': {'query_params': {'terms': [
+            {'field': 'inventionTitle', 'value': 'sensor'},
+            {'field': 'applicationMetaData.applicationTypeLabelName', 'value': 'Utility', 'operator': 'AND'},
+            {'field': 'inventionTitle', 'value': 'battery', 'operator': 'NOT'}]}},
+        'wildcard': {'query_params': {'field': 'inventionTitle', 'value': 'semicond'}},
+        'field_specific': {'query_params': {'field': 'applicationMetaData.examinerNameText', 'value': 'SMITH'}},
+        'range': {'query_params': {'field': 'applicationMetaData.filingDate',
+                                   'valueFrom': '2021-01-01', 'valueTo': '2022-12-31'}},
+        'filtered': {'query_params': {'field': 'applicationMetaData.applicationTypeLabelName', 'value': 'Design'}},
+        'faceted': {'query_params': {'facets': [
+            {'field': 'applicationMetaData.applicationStatusDescriptionText', 'values': ['Patented Case']}]}},
+        'advanced_query': {'query_params': {'raw_query': ' AND '.join(f"({query})" for query in queries[:4])}},
+        'exact_phrase': {'query_params': {'field': 'inventionTitle', 'value': 'wireless sensor network'}},
+        'greater_than': {'query_params': {'field': 'applicationMetaData.filingDate', 'value': '2023-01-01'}},
+        'less_than': {'query_params': {'field': 'applicationMetaData.filingDate', 'value': '2019-12-31'}},
+        'boolean_parentheses': {'query_params': {'field': 'inventionTitle', 'value': 'sensor OR valve OR widget'}},
+    }
+
+def make_params(search_type, template):
+    """Fresh parameters each call; validation and construction may change the dict they are given"""
+    return json.loads(json.dumps(dict(template, search_type=search_type,
+                                      pagination={'offset': 0, 'limit': 100},
+                                      sort=[{'field': 'applicationMetaData.filingDate', 'order': 'desc'}])))
+
+def build_cases(max_records):
+    """(name, function, calls per run) for every benchmark; functions take no arguments"""
+    queries = load_queries()
+    templates = search_params_by_type(queries)
+    assert set(templates) == set(SEARCH_TYPES)
+    cases = []
+
+    for search_type in SEARCH_TYPES:
+        params = make_params(search_type, templates[search_type])
+        cases.append((f"validate_search_params[{search_type}]",
+                      lambda params=params: validate_search_params(params), 1))
+        validated = validate_search_params(make_params(search_type, templates[search_type]))
+        cases.append((f"construct_query_payload[{search_type}]",
+                      lambda validated=validated: construct_query_payload(validated), 1))
+
+    for index, query in enumerate(queries):
+        validated = validate_search_params(make_params('advanced_query', {'query_params': {'raw_query': query}}))
+        cases.append((f"construct_query_payload[csv:{index}]",
+                      lambda validated=validated: construct_query_payload(validated), 1))
+
+    cases.append(("format_applicant_name_for_search",
+                  lambda: [format_applicant_name_for_search(name) for name in APPLICANTS], len(APPLICANTS)))
+    date_pairs = [('2020-01-01', '2024-12-31'), ('2024-12-31', '2020-01-01'), ('2020-01-01', ''), ('bad', '2020-01-01')]
+    cases.append(("validate_date_range",
+                  lambda: [validate_date_range(date_from, date_to) for date_from, date_to in date_pairs],
+                  len(date_pairs)))
+
+    records = [make_record(number) for number in range(max(size for size in RESULT_SIZES if size <= max_records))]
+    for size in RESULT_SIZES:
+        if size <= max_records:
+            cases.append((f"format_results_for_csv[{size}]",
+                          lambda rows=records[:size]: format_results_for_csv(rows), 1))
+    sample = records[:1000]
+    paths = list(CSV_EXPORT_FIELDS) + ['applicationMetaData.inventorBag', 'missing.path.here']
+    cases.append(("get_nested_value[1000 records]",
+                  lambda: [get_nested_value(record, path) for record in sample for path in paths],
+                  len(sample) * len(paths)))
+    return cases
+
+def time_case(function, calls, rounds):
+    """pytest-benchmark style statistics of function(), in microseconds per call"""
+    number, _ = timeit.Timer(function).autorange()
+    times = [seconds / number / calls * 1e6 for seconds in timeit.repeat(function, number=number, repeat=rounds)]
+    return {'min_us': min(times), 'median_us': statistics.median(times), 'mean_us': statistics.fmean(times),
+            'stddev_us': statistics.stdev(times) if len(times) > 1 else 0.0, 'rounds': rounds,
+            'iterations': number}
+
+def memory_case(function, calls):
+    """Net and peak bytes allocated by one run of function(), per call"""
+    function()
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        result = function()
+        after, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del result
+    return {'net_kib': (after - before) / 1024 / calls, 'peak_kib': (peak - before) / 1024 / calls}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--filter', help='only run benchmarks whose name contains this text')
+    parser.add_argument('--memory', action='store_true', help='measure allocations with tracemalloc instead of time')
+    parser.add_argument('--rounds', type=int, default=5, help='timed rounds per benchmark')
+    parser.add_argument('--max-records', type=int, default=max(RESULT_SIZES), help='largest result set to format')
+    parser.add_argument('--json', help='also write the results to this file')
+    args = parser.parse_args()
+
+    # Leave log output out of the measurements; some cases log warnings on purpose
+    logging.disable(logging.CRITICAL)
+
+    results = {}
+    for name, function, calls in build_cases(args.max_records):
+        if args.filter and args.filter not in name:
+            continue
+        results[name] = memory_case(function, calls) if args.memory else time_case(function, calls, args.rounds)
+        stats = results[name]
+        if args.memory:
+            print(f"{name:<48} net {stats['net_kib']:10.2f} KiB  peak {stats['peak_kib']:10.2f} KiB  per call")
+        else:
+            print(f"{name:<48} min {stats['min_us']:10.2f}  median {stats['median_us']:10.2f}  "
+                  f"mean {stats['mean_us']:10.2f} +- {stats['stddev_us']:8.2f} us/call")
+
+    if args.json:
+        with open(args.json, 'w') as file:
+            json.dump({'mode': 'memory' if args.memory else 'time', 'results': results}, file, indent=2)
+
+if __name__ == '__main__':
+    main()
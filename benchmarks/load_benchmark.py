@@ -0,0 +1,144 @@
+"""
+Load test of the search endpoints against a local stand-in for the ODP API
+
+Starts benchmarks.mock_odp, points API_ENDPOINTS at it, serves the app with a
+threaded WSGI server and sends concurrent requests to /api/search,
+/api/export-csv, /api/find-similar and /api/preview-query. Throughput and
+p50/p95/p99 latency per endpoint are written as JSON for comparing releases.
+
+Run from the repository root:
+    python -m benchmarks.load_benchmark --requests 200 --concurrency 8 --latency 0.05 --output load.json
+"""
+import argparse
+import json
+import logging
+import platform
+import statistics
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from werkzeug.serving import make_server
+
+import config
+from benchmarks.mock_odp import MockODPServer
+
+ENDPOINTS = ['search', 'export-csv', 'find-similar', 'preview-query']
+
+def search_params(index, page_size):
+    """Search parameters that differ per request, so the response cache does not answer them all"""
+    return {'search_type': 'simple', 'query_params': {'term': f'widget{index}'},
+            'pagination': {'offset': 0, 'limit': page_size}}
+
+def request_body(endpoint, index, page_size):
+    if endpoint == 'export-csv':
+        return {'search_params': search_params(index, page_size)}
+    if endpoint == 'find-similar':
+        return {'title': f'Wireless sensor{index} network', 'patent_number': str(16000000 + index)}
+    return search_params(index, page_size)
+
+def percentile_summary(latencies):
+    """Mean and p50/p95/p99 of latencies in seconds, in milliseconds"""
+    if len(latencies) < 2:
+        value = round(latencies[0] * 1000, 2) if latencies else None
+        return {'mean_ms': value, 'p50_ms': value, 'p95_ms': value, 'p99_ms': value}
+    cuts = statistics.quantiles(latencies, n=100, method='inclusive')
+    return {'mean_ms': round(statistics.fmean(latencies) * 1000, 2),
+            'p50_ms': round(cuts[49] * 1000, 2),
+            'p95_ms': round(cuts[94] * 1000, 2),
+            'p99_ms': round(cuts[98] * 1000, 2)}
+
+def run_endpoint(base_url, endpoint, count, concurrency, page_size):
+    """
+    Send `count` requests to one endpoint, `concurrency` at a time
+
+    Returns:
+        dict: Requests, errors, wall time, throughput and latency percentiles
+    """
+    sessions = threading.local()
+
+    def send(index):
+        session = getattr(sessions, 'session', None) or requests.Session()
+        sessions.session = session
+        started = time.perf_counter()
+        response = session.post(f"{base_url}/api/{endpoint}", json=request_body(endpoint, index, page_size))
+        response.content
+        return time.perf_counter() - started, response.status_code
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        outcomes = list(executor.map(send, range(count)))
+    elapsed = time.perf_counter() - started
+
+    latencies = [latency for latency, _ in outcomes]
+    return {
+        'requests': count,
+        'errors': sum(1 for _, status in outcomes if status != 200),
+        'seconds': round(elapsed, 3),
+        'throughput_rps': round(count / elapsed, 2),
+        **percentile_summary(latencies),
+    }
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=200, help='requests per endpoint')
+    parser.add_argument('--concurrency', type=int, default=8, help='requests in flight at once')
+    parser.add_argument('--endpoints', nargs='+', choices=ENDPOINTS, default=ENDPOINTS)
+    parser.add_argument('--latency', type=float, default=0.05, help='seconds the mock API takes per response')
+    parser.add_argument('--jitter', type=float, default=0.02, help='random extra mock latency, up to this many seconds')
+    parser.add_argument('--rate-429', type=float, default=0.0, help='share of mock API responses that are 429')
+    parser.add_argument('--page-size', type=int, default=100, help='results per search page')
+    parser.add_argument('--rate-limit', type=float, default=1000,
+                        help='ODP_RATE_LIMIT_PER_SECOND while benchmarking; the mock has no quota')
+    parser.add_argument('--cache', action='store_true', help='keep the response cache enabled')
+    parser.add_argument('--verbose', action='store_true', help='keep INFO logs')
+    parser.add_argument('--output', help='write the JSON results to this file as well as stdout')
+    args = parser.parse_args()
+
+    config.DevConfig.ODP_RATE_LIMIT_PER_SECOND = args.rate_limit
+    config.DevConfig.ODP_RATE_LIMIT_BURST = max(int(args.rate_limit), 1)
+    config.DevConfig.ODP_CACHE_ENABLED = args.cache
+    if not args.verbose:
+        logging.disable(logging.INFO)
+
+    from patent_database.constants import API_ENDPOINTS
+    from run import create_dev_app
+
+    mock = MockODPServer(args.latency, args.jitter, args.rate_429, args.page_size).start()
+    API_ENDPOINTS.update(mock.endpoints())
+    server = make_server('127.0.0.1', 0, create_dev_app(), threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True, name='benchmark-app').start()
+    base_url = f"http://127.0.0.1:{server.server_port}/patent_database"
+
+    try:
+        results = {endpoint: run_endpoint(base_url, endpoint, args.requests, args.concurrency, args.page_size)
+                   for endpoint in args.endpoints}
+    finally:
+        server.shutdown()
+        mock.stop()
+
+    report = {
+        'revision': git_revision(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'settings': {key: value for key, value in vars(args).items() if key not in ('output', 'verbose')},
+        'mock': {'requests': mock.requests, 'throttled': mock.throttled},
+        'results': results,
+    }
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, 'w') as file:
+            file.write(output + '\n')
+
+if __name__ == '__main__':
+    main()
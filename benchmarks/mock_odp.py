@@ -0,0 +1,163 @@
+"""
+Local stand-in for the USPTO ODP search API, for benchmarks and offline runs
+
+Answers POST .../applications/search with `count` and a page of
+`patentFileWrapperDataBag` records shaped like real ODP results, and
+GET .../applications/<number> with a single record. Latency, the share of
+429 responses and the largest page returned are configurable.
+
+Run on its own from the repository root:
+    python -m benchmarks.mock_odp --port 8099 --latency 0.2 --rate-429 0.05
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+DEFAULT_TOTAL = 5000
+
+STATUSES = ['Patented Case', 'Non Final Action Mailed', 'Final Rejection Mailed',
+            'Docketed New Case - Ready for Examination', 'Abandoned -- Failure to Respond to an Office Action']
+TYPES = ['Utility', 'Utility', 'Utility', 'Design', 'Plant']
+APPLICANTS = ['Acme Widgets LLC', 'Globex Corporation', 'Initech, Inc.', 'Umbrella Research L.L.C.', 'Hooli Inc.']
+TITLE_WORDS = ['widget', 'assembly', 'wireless', 'sensor', 'battery', 'method', 'system', 'apparatus',
+               'semiconductor', 'display', 'neural', 'network', 'valve', 'fastener', 'coating']
+
+def make_record(number):
+    """One search result for application number 16000000 + number, the same every time"""
+    rng = random.Random(number)
+    application_number = str(16000000 + number)
+    filing_date = f"20{rng.randint(15, 24)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+    inventors = [f"{rng.choice(['Jane', 'John', 'Wei', 'Priya', 'Omar'])} {rng.choice(['Roe', 'Doe', 'Chen', 'Patel'])}"
+                 for _ in range(rng.randint(1, 4))]
+    status = rng.choice(STATUSES)
+    return {
+        'applicationNumberText': application_number,
+        'applicationMetaData': {
+            'applicationNumberText': application_number,
+            'inventionTitle': ' '.join(rng.sample(TITLE_WORDS, 4)).capitalize(),
+            'filingDate': filing_date,
+            'effectiveFilingDate': filing_date,
+            'applicationTypeLabelName': rng.choice(TYPES),
+            'applicationStatusDescriptionText': status,
+            'applicationStatusCode': 150 if status == 'Patented Case' else rng.randint(19, 161),
+            'applicationStatusDate': f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+            'firstApplicantName': rng.choice(APPLICANTS),
+            'firstInventorName': inventors[0],
+            'inventorBag': [{'inventorNameText': name, 'countryCode': 'US'} for name in inventors],
+            'examinerNameText': f"{rng.choice(['SMITH', 'JONES', 'GARCIA'])}, {rng.choice(['ANNA', 'MARK'])}",
+            'groupArtUnitNumber': str(rng.randint(1600, 3700)),
+            'patentNumber': str(11000000 + number) if status == 'Patented Case' else None,
+            'grantDate': f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}" if status == 'Patented Case' else None,
+            'cpcClassificationBag': [f"H04W{rng.randint(4, 99)}/{rng.randint(0, 99):02d}" for _ in range(3)],
+            'businessEntityStatusCategory': rng.choice(['Regular Undiscounted', 'Small', 'Micro']),
+        },
+    }
+
+class MockODPServer:
+    """
+    Threaded HTTP server answering like the ODP search API
+
+    Args:
+        latency (float): Seconds every response is delayed
+        jitter (float): Extra random delay of up to this many seconds
+        rate_429 (float): Share of requests answered 429 Too Many Requests (0 to 1)
+        page_size (int): Most records returned for one request, whatever the limit asked
+        total (int): `count` reported for every search
+        port (int): Port to listen on; 0 picks a free one
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, rate_429=0.0, page_size=100, total=DEFAULT_TOTAL, port=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_429 = rate_429
+        self.page_size = page_size
+        self.total = total
+        self.requests = 0
+        self.throttled = 0
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), self._handler())
+        self.server.daemon_threads = True
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server.server_port}"
+
+    def endpoints(self):
+        """API_ENDPOINTS entries pointing at this server"""
+        return {'patent_search': f"{self.url}/api/v1/patent/applications/search",
+                'patent_details': f"{self.url}/api/v1/patent/applications"}
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True, name='mock-odp').start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def search_page(self, payload):
+        pagination = payload.get('pagination') or {}
+        offset = int(pagination.get('offset', 0))
+        limit = min(int(pagination.get('limit', 25)), self.page_size)
+        numbers = range(offset, min(offset + limit, self.total))
+        return {'count': self.total, 'patentFileWrapperDataBag': [make_record(number) for number in numbers]}
+
+    def _handler(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def reply(self, build_body):
+                with mock.lock:
+                    mock.requests += 1
+                    throttled = random.random() < mock.rate_429
+                    mock.throttled += throttled
+                time.sleep(mock.latency + random.uniform(0, mock.jitter))
+                status, body = (429, {'error': 'Too Many Requests'}) if throttled else (200, build_body())
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                if throttled:
+                    self.send_header('Retry-After', '1')
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                payload = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+                self.reply(lambda: mock.search_page(payload))
+
+            def do_GET(self):
+                number = self.path.split('?')[0].rstrip('/').rsplit('/', 1)[-1]
+                offset = int(number) - 16000000 if number.isdigit() else -1
+                self.reply(lambda: {'count': 1 if 0 <= offset < mock.total else 0,
+                                    'patentFileWrapperDataBag': [make_record(offset)] if 0 <= offset < mock.total else []})
+
+        return Handler
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--port', type=int, default=8099)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every response')
+    parser.add_argument('--jitter', type=float, default=0.0, help='random extra delay, up to this many seconds')
+    parser.add_argument('--rate-429', type=float, default=0.0, help='share of requests answered 429')
+    parser.add_argument('--page-size', type=int, default=100, help='most records returned per request')
+    parser.add_argument('--total', type=int, default=DEFAULT_TOTAL, help='count reported for every search')
+    args = parser.parse_args()
+
+    mock = MockODPServer(args.latency, args.jitter, args.rate_429, args.page_size, args.total, args.port)
+    print(f"Mock ODP search API at {mock.endpoints()['patent_search']}")
+    try:
+        mock.server.serve_forever()
+    except KeyboardInterrupt:
+        mock.stop()
+
+if __name__ == '__main__':
+    main()
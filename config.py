@@ -11,4 +11,76 @@ class DevConfig:
     MAX_RESULTS_PER_PAGE = 100
     # Logging level
     LOG_LEVEL = 'INFO'
+    # USPTO ODP HTTP client - connection pool sizes per worker process
+    ODP_POOL_CONNECTIONS = 4
+    ODP_POOL_MAXSIZE = 10
+    # USPTO ODP HTTP client - default connect/read timeouts in seconds
+    ODP_CONNECT_TIMEOUT = 5
+    ODP_READ_TIMEOUT = 30
+    # USPTO ODP rate limit - token bucket refill rate (requests/second) and burst size.
+    # Keep these at or below the quota of the API key
+    ODP_RATE_LIMIT_PER_SECOND = 5
+    ODP_RATE_LIMIT_BURST = 10
+    # Optional file path to share the rate limit across worker processes (None = per process)
+    ODP_RATE_LIMIT_STATE_FILE = None
+    # Retries for 429 responses, with jittered exponential backoff (seconds)
+    ODP_MAX_RETRIES = 5
+    ODP_RETRY_BASE_DELAY = 0.5
+    ODP_RETRY_MAX_DELAY = 30
+    # Alternative company-name searches - concurrent requests and overall deadline (seconds)
+    ODP_ALTERNATIVE_SEARCH_CONCURRENCY = 4
+    ODP_ALTERNATIVE_SEARCH_TIMEOUT = 20
+    # Response cache for ODP calls - maximum entries and time-to-live in seconds
+    ODP_CACHE_ENABLED = True
+    ODP_CACHE_MAX_ENTRIES = 512
+    ODP_CACHE_TTL = 300
+    # Cache backend: 'memory' (per process) or 'sqlite' (persistent, shared by worker processes)
+    ODP_CACHE_BACKEND = 'memory'
+    ODP_CACHE_PATH = 'instance/odp_cache.sqlite3'
+    ODP_CACHE_MAX_BYTES = 256 * 1024 * 1024
+    # Seconds expired cache entries are kept to serve while the circuit breaker is open
+    ODP_CACHE_STALE_TTL = 3600
+    # Time budget in seconds for all upstream calls made while handling one incoming request
+    ODP_REQUEST_DEADLINE = 45
+    # Circuit breaker - opens when the error rate over the window (seconds) reaches the
+    # threshold, then probes the API again after the recovery timeout (seconds)
+    ODP_BREAKER_ERROR_THRESHOLD = 0.5
+    ODP_BREAKER_MIN_REQUESTS = 10
+    ODP_BREAKER_WINDOW = 60
+    ODP_BREAKER_RECOVERY_TIMEOUT = 30
+    # Pages fetched concurrently when a search is paged through to the end
+    ODP_PAGE_FETCH_CONCURRENCY = 4
+    # Exports of every page of a search - row ceiling and time budget in seconds
+    ODP_EXPORT_MAX_ROWS = 10000
+    ODP_EXPORT_DEADLINE = 300
+    # Local SQLite mirror of returned search records, queried with source='local'
+    ODP_MIRROR_ENABLED = False
+    ODP_MIRROR_PATH = 'instance/odp_mirror.sqlite3'
+    # Searches narrower than a saved query synced within this many seconds are answered from the mirror
+    ODP_LOCAL_MAX_AGE = 86400
+    # Most mirror records searched in memory, each worker holding its own copy; larger mirrors use SQLite FTS5
+    ODP_LOCAL_INDEX_MAX_RECORDS = 200000
+    # Time budget in seconds of one incremental sync run into the mirror
+    ODP_SYNC_DEADLINE = 1800
+    # Most rows one sync request window pages through before starting again after the last record synced
+    ODP_SYNC_WINDOW_ROWS = 5000
+    # Directory shared by worker processes for Prometheus metrics; None for a single process
+    ODP_METRICS_MULTIPROC_DIR = None
+    # Logging - JSON lines written by a background thread; payload and header dumps kept at this rate (0 to 1)
+    ODP_LOG_JSON = True
+    ODP_LOG_SAMPLE_RATE = 0.1
+    # Also pass the tool's log records to the host app's root logger handlers
+    ODP_LOG_PROPAGATE = False
+    # Record upstream traffic to a cassette ('record'), or answer from one without network ('replay');
+    # replayed responses are delayed by their recorded latency times the scale (0 for no delay)
+    ODP_CASSETTE_MODE = None
+    ODP_CASSETTE_PATH = 'instance/odp_cassette.jsonl.gz'
+    ODP_CASSETTE_LATENCY_SCALE = 0.0
+    # /api/search/batch - searches run at the same time, and the most accepted in one batch
+    ODP_BATCH_CONCURRENCY = 4
+    ODP_BATCH_MAX_SEARCHES = 100
+    # Bulk application-number lookup - calls at the same time, the most numbers per lookup, and its time budget in seconds
+    ODP_LOOKUP_CONCURRENCY = 4
+    ODP_LOOKUP_MAX_NUMBERS = 20000
+    ODP_LOOKUP_DEADLINE = 600
     # Add other tool-specific configuration here
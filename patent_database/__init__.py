@@ -5,7 +5,11 @@ patent_database_bp = Blueprint('patent_database', __name__,
                            static_folder='static',
                            url_prefix='/patent_database')
 
-from . import routes
+from . import routes, cli
+from .metrics import setup_metrics
+from .structured_logging import setup_logging
 
 def register(app):
+    setup_logging()
+    setup_metrics()
     app.register_blueprint(patent_database_bp)
@@ -0,0 +1,340 @@
+"""
+Alternative and fallback searches for a company-name search that finds nothing
+"""
+import contextvars
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from .client import get_client
+from .constants import DEFAULT_PAGINATION
+from .metrics import count_alternative_search, count_fallback_search
+from .mirror import mirror_search_results
+from .query_expansion import (find_applicant_clause, expand_applicant_name, replace_applicant_clause,
+                              annotate_matched_variants)
+from .structured_logging import LazyJSON, VERBOSE
+from .timing import span
+from .utils import get_config_value
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def needs_alternative_search(search_result, query_payload):
+    """Check whether a successful search found nothing for a company-name query"""
+    return (search_result.get('success')
+            and not search_result['data']['results']
+            and "applicationMetaData.firstNamedApplicant:" in query_payload.get("q", ""))
+
+def try_alternative_company_search(original_payload, url, use_cache=True, deadline=None):
+    """
+    Try alternative search formats for company names
+    
+    The spellings of the company name (with and without quotes, LLC / L.L.C. /
+    ", LLC", Inc. / Corporation, ...) are collapsed into one OR clause and sent
+    as a single request. Broader formats that change the query shape (wildcard,
+    assignee field, first word only) are only tried if that request finds nothing.
+    
+    Args:
+        original_payload (dict): Original search payload
+        url (str): API endpoint URL
+        use_cache (bool, optional): Set to False to bypass the response cache
+        deadline (Deadline, optional): Time budget of the incoming request
+        
+    Returns:
+        dict: Search results from the most successful alternative search
+    """
+    plan = build_alternative_searches(original_payload)
+    if not plan:
+        return None
+    variants, or_payload, alternatives = plan
+    count_alternative_search()
+    
+    # 1. Search every spelling of the company name in one request
+    result = send_alternative_search(url, ', '.join(variants), or_payload, use_cache, deadline)
+    if result and result['results']:
+        return variant_search_result(result, variants, or_payload)
+    
+    # 2. Broader formats, sent concurrently
+    best_result = run_alternative_searches(url, alternatives, use_cache, deadline)
+    
+    # If no results found with alternative formats, try a fallback search
+    if not best_result:
+        logger.info("No results found with alternative formats. Trying fallback search...")
+        with span('fallback'):
+            fallback_result = try_fallback_search(original_payload, url, use_cache, deadline)
+        if fallback_result:
+            return fallback_result
+    
+    return best_result
+
+def build_alternative_searches(original_payload):
+    """
+    Build the alternative searches for a company-name query
+    
+    Args:
+        original_payload (dict): Original search payload
+        
+    Returns:
+        tuple: (variants, or_payload, alternatives) where or_payload searches every
+            spelling in one OR clause and alternatives is a list of
+            (alt_format, alt_payload) broader searches in order of preference;
+            None if the query has no applicant clause
+    """
+    # Extract the company name from the query
+    query = original_payload.get("q", "")
+    applicant_clause, company_part = find_applicant_clause(query)
+    if not applicant_clause:
+        return None
+    
+    logger.info(f"Extracted company name for alternative search: {company_part}")
+    
+    variants = expand_applicant_name(company_part)
+    or_payload = original_payload.copy()
+    or_payload["q"] = replace_applicant_clause(query, applicant_clause, variants)
+    
+    alternative_formats = []
+    words = company_part.split()
+    
+    # Try just the first word with wildcard
+    if len(words) >= 2:
+        alternative_formats.append(f"{words[0]}*")
+    
+    # Try a more general search using assignee field
+    alternative_formats.append(f"assigneeName:{company_part}")
+    
+    # For multi-word company names, try just the most distinctive word
+    # Usually the first word is the most distinctive for company names
+    if len(words) > 1:
+        alternative_formats.append(words[0].upper())
+    
+    alternatives = []
+    for alt_format in alternative_formats:
+        alt_payload = original_payload.copy()
+        alt_payload["q"] = alt_format
+        alternatives.append((alt_format, alt_payload))
+    
+    return variants, or_payload, alternatives
+
+def variant_search_result(result, variants, or_payload):
+    """Build the success envelope for the OR-of-spellings search, noting the variants that matched"""
+    matched_variants = annotate_matched_variants(result['results'], variants) or variants
+    return {
+        'success': True,
+        'data': result,
+        'query_payload': or_payload,
+        'note': f"Used alternative company name format: {' OR '.join(matched_variants)}"
+    }
+
+def run_alternative_searches(url, alternatives, use_cache=True, deadline=None):
+    """
+    Send alternative search payloads concurrently and keep the best result
+    
+    The winner is the alternative with the most results (earliest format wins a tie).
+    Once an alternative returns a full page, requests that have not started are
+    cancelled, and the whole fan-out is bounded by ODP_ALTERNATIVE_SEARCH_TIMEOUT
+    or the request deadline, whichever ends first.
+    
+    Args:
+        url (str): API endpoint URL
+        alternatives (list): (alt_format, alt_payload) tuples in order of preference
+        use_cache (bool, optional): Set to False to bypass the response cache
+        deadline (Deadline, optional): Time budget of the incoming request
+        
+    Returns:
+        dict: Search results from the most successful alternative, or None
+    """
+    if not alternatives:
+        return None
+    
+    max_workers = get_config_value('ODP_ALTERNATIVE_SEARCH_CONCURRENCY', 4)
+    fan_out_deadline = time.monotonic() + alternative_search_timeout(deadline)
+    selector = AlternativeSelector()
+    
+    executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='odp-alternative')
+    # Each request runs in a copy of this context so its timing spans count towards the incoming request
+    futures = {
+        executor.submit(contextvars.copy_context().run, send_alternative_search,
+                        url, alt_format, alt_payload, use_cache, deadline): (index, alt_format, alt_payload)
+        for index, (alt_format, alt_payload) in enumerate(alternatives)
+    }
+    pending = set(futures)
+    
+    try:
+        while pending:
+            remaining = fan_out_deadline - time.monotonic()
+            if remaining <= 0:
+                logger.warning(f"Alternative search deadline reached with {len(pending)} requests still pending")
+                break
+            
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            full_page = False
+            for future in done:
+                full_page = selector.add(future.result(), *futures[future]) or full_page
+            
+            if full_page:
+                logger.info(f"Alternative search returned a full page. Cancelling {len(pending)} pending requests")
+                break
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+    
+    return selector.best_result
+
+def alternative_search_timeout(deadline=None):
+    """Seconds the alternative fan-out may run: ODP_ALTERNATIVE_SEARCH_TIMEOUT capped by the request deadline"""
+    fan_out_timeout = get_config_value('ODP_ALTERNATIVE_SEARCH_TIMEOUT', 20)
+    if deadline is not None:
+        fan_out_timeout = min(fan_out_timeout, deadline.remaining())
+    return fan_out_timeout
+
+class AlternativeSelector:
+    """
+    Keeps the best alternative search result as results arrive in any order
+    
+    The alternative with the most results wins; on a tie the one listed first wins.
+    """
+    
+    def __init__(self):
+        self.best_result = None
+        self.best_rank = None
+    
+    def add(self, result, index, alt_format, alt_payload):
+        """
+        Consider one finished alternative search
+        
+        Args:
+            result (dict): Result from send_alternative_search, or None on failure
+            index (int): Position of the alternative in order of preference
+            alt_format (str): The alternative company name format
+            alt_payload (dict): Payload that was sent
+            
+        Returns:
+            bool: True if the result filled a whole page, so pending searches can stop
+        """
+        if not result:
+            return False
+        
+        result_count = len(result['results'])
+        rank = (result_count, -index)
+        if result_count > 0 and (self.best_rank is None or rank > self.best_rank):
+            self.best_rank = rank
+            self.best_result = {
+                'success': True,
+                'data': result,
+                'query_payload': alt_payload,
+                'note': f"Used alternative company name format: {alt_format}"
+            }
+        
+        page_limit = alt_payload.get('pagination', {}).get('limit', DEFAULT_PAGINATION['limit'])
+        return result_count >= page_limit
+
+def send_alternative_search(url, alt_format, alt_payload, use_cache=True, deadline=None):
+    """
+    Send a single alternative search request
+    
+    Args:
+        url (str): API endpoint URL
+        alt_format (str): The alternative company name format being tried
+        alt_payload (dict): Search payload using the alternative format
+        use_cache (bool, optional): Set to False to bypass the response cache
+        deadline (Deadline, optional): Time budget of the incoming request
+        
+    Returns:
+        dict: API result with frontend compatibility fields, or None on failure
+    """
+    logger.info(f"Trying alternative company name format: {alt_format}")
+    try:
+        logger.info("Sending alternative search request with payload: %s", LazyJSON(alt_payload), extra=VERBOSE)
+        response = get_client().post(url, alt_payload, use_cache=use_cache, deadline=deadline)
+        return parse_search_response(response, "Alternative")
+    except Exception as e:
+        logger.error(f"Error in alternative search: {str(e)}")
+    
+    return None
+
+def parse_search_response(response, label):
+    """
+    Parse a 200 search response and add the frontend compatibility fields
+    
+    Args:
+        response (ODPResponse): Response from the ODP client
+        label (str): Name of the search for logging, e.g. "Alternative"
+        
+    Returns:
+        dict: API result, or None if the response was not a 200
+    """
+    if response.status_code != 200:
+        return None
+    
+    with span('decode'):
+        result = response.json()
+    results = result.get('patentFileWrapperDataBag', [])
+    
+    logger.info(f"{label} search returned {len(results)} results")
+    mirror_search_results(response, results)
+    
+    # Add a results field for compatibility with frontend
+    result['results'] = results
+    result['metadata'] = {'total': result.get('count', 0)}
+    return result
+
+def try_fallback_search(original_payload, url, use_cache=True, deadline=None):
+    """
+    Try a fallback search when all other searches fail
+    
+    Args:
+        original_payload (dict): Original search payload
+        url (str): API endpoint URL
+        use_cache (bool, optional): Set to False to bypass the response cache
+        deadline (Deadline, optional): Time budget of the incoming request
+        
+    Returns:
+        dict: Search results from the fallback search
+    """
+    fallback_payload = build_fallback_payload(original_payload)
+    count_fallback_search()
+    
+    try:
+        response = get_client().post(url, fallback_payload, use_cache=use_cache, deadline=deadline)
+        return fallback_search_result(parse_search_response(response, "Fallback"), fallback_payload)
+    except Exception as e:
+        logger.error(f"Error in fallback search: {str(e)}")
+    
+    return None
+
+def build_fallback_payload(original_payload):
+    """
+    Build a payload that searches the same date range without the company name constraint
+    
+    Args:
+        original_payload (dict): Original search payload
+        
+    Returns:
+        dict: Fallback payload
+    """
+    fallback_payload = original_payload.copy()
+    
+    # Use a wildcard search to get any patents in the date range
+    fallback_payload["q"] = "*"
+    
+    # Keep the date range filters
+    # The rangeFilters should already be in the original payload
+    
+    # Limit results to avoid overwhelming the user
+    # Copy pagination so the original payload is left untouched
+    if "pagination" in fallback_payload:
+        fallback_payload["pagination"] = dict(fallback_payload["pagination"], limit=20)
+    
+    logger.info("Trying fallback search with payload: %s", LazyJSON(fallback_payload), extra=VERBOSE)
+    return fallback_payload
+
+def fallback_search_result(result, fallback_payload):
+    """Build the success envelope for a fallback search that found something, otherwise None"""
+    if not result or not result['results']:
+        return None
+    return {
+        'success': True,
+        'data': result,
+        'query_payload': fallback_payload,
+        'note': "Used fallback search with date range only. The specific company name was not found."
+    }
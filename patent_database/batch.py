@@ -0,0 +1,133 @@
+"""
+Running many searches from one request, concurrently through the shared client
+"""
+import contextvars
+import functools
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from .cache import make_cache_key
+from .constants import API_ENDPOINTS
+from .local_search import search_local
+from .operations import prepare_search, run_search
+from .utils import get_config_value
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_CONCURRENCY = 4
+DEFAULT_BATCH_MAX_SEARCHES = 100
+
+def check_batch(searches):
+    """
+    Check the shape of a batch before any search in it is run
+
+    Args:
+        searches: The list of search parameters sent by the client
+
+    Returns:
+        str: Error message, or None if the batch can be run
+    """
+    if not isinstance(searches, list):
+        return "Send a list of search parameter objects, or {'searches': [...]}"
+    if not searches:
+        return 'No searches given'
+    max_searches = get_config_value('ODP_BATCH_MAX_SEARCHES', DEFAULT_BATCH_MAX_SEARCHES)
+    if len(searches) > max_searches:
+        return f"At most {max_searches} searches can be sent in one batch, got {len(searches)}"
+    return None
+
+def plan_batch(searches):
+    """
+    Validate and construct the payload of every search, grouping identical ones
+
+    Args:
+        searches (list): Search parameters, as accepted by search_patents
+
+    Returns:
+        tuple: (jobs, done) where jobs maps a canonical request key to
+            (function to run, indexes of the searches it answers) and done maps
+            the index of a search that failed validation to its failure envelope
+    """
+    jobs, done = {}, {}
+    for index, params in enumerate(searches):
+        if not isinstance(params, dict):
+            done[index] = {'success': False, 'error': 'Search parameters must be an object'}
+            continue
+        try:
+            if params.get('source') == 'local':
+                key = 'local:' + json.dumps(params, sort_keys=True, default=str)
+                job = functools.partial(search_local, params)
+            else:
+                query_payload, use_cache, error_result = prepare_search(params)
+                if error_result:
+                    done[index] = error_result
+                    continue
+                key = f"{use_cache}:{make_cache_key('POST', API_ENDPOINTS['patent_search'], query_payload)}"
+                job = functools.partial(run_search, query_payload, use_cache)
+        except Exception as e:
+            logger.exception(f"Could not prepare search {index} of the batch: {str(e)}")
+            done[index] = {'success': False, 'error': str(e)}
+            continue
+        jobs.setdefault(key, (job, []))[1].append(index)
+
+    duplicates = sum(len(indexes) - 1 for _, indexes in jobs.values())
+    if duplicates:
+        logger.info(f"Batch of {len(searches)} searches has {duplicates} duplicates, running {len(jobs)}")
+    return jobs, done
+
+def _run_job(job):
+    """Run one search of a batch; an exception fails that search only"""
+    try:
+        return job()
+    except Exception as e:
+        logger.exception(f"Batch search failed: {str(e)}")
+        return {'success': False, 'error': str(e)}
+
+def iter_search_batch(searches):
+    """
+    Run a batch of searches, at most ODP_BATCH_CONCURRENCY at a time
+
+    Identical searches are sent once and share the result. Each search gets its
+    own ODP_REQUEST_DEADLINE from the moment it starts.
+
+    Args:
+        searches (list): Search parameters, as accepted by search_patents
+
+    Yields:
+        tuple: (index, result) for every search as soon as its result is known;
+            searches that failed validation come first
+    """
+    jobs, done = plan_batch(searches)
+    yield from sorted(done.items())
+    if not jobs:
+        return
+
+    concurrency = get_config_value('ODP_BATCH_CONCURRENCY', DEFAULT_BATCH_CONCURRENCY)
+    executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='odp-batch')
+    futures = {executor.submit(contextvars.copy_context().run, _run_job, job): indexes
+               for job, indexes in jobs.values()}
+    try:
+        for future in as_completed(futures):
+            result = future.result()
+            for index in futures[future]:
+                yield index, result
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+def search_batch(searches):
+    """
+    Run a batch of searches and return their results in request order
+
+    Args:
+        searches (list): Search parameters, as accepted by search_patents
+
+    Returns:
+        list: One result envelope per search, with success and data or error
+    """
+    results = [None] * len(searches)
+    for index, result in iter_search_batch(searches):
+        results[index] = result
+    return results
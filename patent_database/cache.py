@@ -0,0 +1,169 @@
+"""
+Response caching for USPTO ODP API calls
+"""
+import copy
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from .query_parser import canonical_query
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def canonicalize_payload(payload):
+    """
+    Build a canonical copy of a query payload for use in cache keys
+
+    `q` is spelled as by canonical_query, so spacing, grouping and the order of
+    AND/OR clauses do not matter; filter values and the requested fields are
+    sorted, and filters/rangeFilters are ordered by field name, so payloads that
+    differ only in formatting map to the same key. Sort order is left as given
+    because it changes the results.
+
+    Args:
+        payload (dict): Payload as returned by construct_query_payload
+
+    Returns:
+        dict: Canonical payload
+    """
+    if not isinstance(payload, dict):
+        return payload
+
+    canonical = copy.deepcopy(payload)
+
+    if isinstance(canonical.get('q'), str):
+        canonical['q'] = canonical_query(canonical['q'])
+
+    if isinstance(canonical.get('fields'), list):
+        canonical['fields'] = sorted(canonical['fields'])
+
+    if isinstance(canonical.get('filters'), list):
+        filters = []
+        for payload_filter in canonical['filters']:
+            payload_filter = dict(payload_filter)
+            if isinstance(payload_filter.get('value'), list):
+                payload_filter['value'] = sorted(set(map(str, payload_filter['value'])))
+            filters.append(payload_filter)
+        canonical['filters'] = sorted(filters, key=lambda f: json.dumps(f, sort_keys=True))
+
+    if isinstance(canonical.get('rangeFilters'), list):
+        canonical['rangeFilters'] = sorted(canonical['rangeFilters'], key=lambda f: json.dumps(f, sort_keys=True))
+
+    return canonical
+
+def make_cache_key(method, url, payload=None):
+    """
+    Build a stable cache key for an upstream request
+
+    Args:
+        method (str): HTTP method
+        url (str): API endpoint URL
+        payload (dict, optional): JSON payload or query parameters
+
+    Returns:
+        str: Hex digest identifying the request
+    """
+    canonical = json.dumps([method.upper(), url, canonicalize_payload(payload)],
+                           sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+class ResponseCache:
+    """
+    Thread-safe in-process LRU cache with a time-to-live per entry
+
+    Holds at most `max_entries` values; the least recently used entry is evicted
+    first and entries older than their TTL are treated as misses. Expired entries
+    are kept for another `stale_ttl` seconds so they can still be served when the
+    upstream API is unavailable.
+    """
+
+    def __init__(self, max_entries=512, ttl=300, stale_ttl=3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, allow_stale=False):
+        """
+        Look up a cached value
+
+        Args:
+            key (str): Cache key from make_cache_key
+            allow_stale (bool, optional): Also return entries past their TTL
+
+        Returns:
+            any: The cached value, or None on a miss or expired entry
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            expires_at, value = entry
+            now = time.time()
+            if expires_at + self.stale_ttl <= now:
+                del self._entries[key]
+                self.misses += 1
+                return None
+            if expires_at <= now and not allow_stale:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def contains(self, key):
+        """
+        Check for an entry within its TTL without counting a hit or miss
+
+        Unlike get, the entry is not marked as recently used.
+
+        Args:
+            key (str): Cache key from make_cache_key
+
+        Returns:
+            bool: True if get would return the entry
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and entry[0] > time.time()
+
+    def set(self, key, value, ttl=None):
+        """
+        Store a value, evicting the least recently used entries if full
+
+        Args:
+            key (str): Cache key from make_cache_key
+            value (any): Value to cache
+            ttl (float, optional): Overrides the default TTL in seconds
+        """
+        with self._lock:
+            self._entries[key] = (time.time() + (ttl if ttl is not None else self.ttl), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """Remove every entry"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """
+        Get cache counters
+
+        Returns:
+            dict: hits, misses and current number of entries
+        """
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'entries': len(self._entries)}
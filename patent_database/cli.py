@@ -0,0 +1,83 @@
+"""
+Command line interface, e.g. `flask --app run:create_dev_app patent_database sync NAME`
+"""
+import json
+
+import click
+
+from . import patent_database_bp
+from .lookup import lookup_application_numbers, parse_application_numbers
+from .sync import SyncError, save_query, list_queries, run_sync
+
+@patent_database_bp.cli.command('sync-save')
+@click.argument('name')
+@click.option('--query', help='Raw query string, e.g. "applicationMetaData.firstApplicantName:Acme"')
+@click.option('--params', 'params_json', help='Search parameters as JSON, as sent to /api/search')
+def sync_save(name, query, params_json):
+    """Save a search to sync into the local mirror as NAME"""
+    if bool(query) == bool(params_json):
+        raise click.UsageError('Give exactly one of --query and --params')
+    params = json.loads(params_json) if params_json else {
+        'search_type': 'advanced_query', 'query_params': {'raw_query': query}
+    }
+    try:
+        save_query(name, params)
+    except SyncError as e:
+        raise click.ClickException(str(e))
+    click.echo(f"Saved {name}")
+
+@patent_database_bp.cli.command('sync')
+@click.argument('names', nargs=-1)
+@click.option('--all', 'sync_all', is_flag=True, help='Sync every saved query')
+def sync(names, sync_all):
+    """Fetch the records of saved queries changed since their last sync"""
+    try:
+        if sync_all:
+            names = [query['name'] for query in list_queries()]
+        if not names:
+            raise click.UsageError('Give the names of saved queries or --all')
+
+        failed = False
+        for name in names:
+            try:
+                click.echo(json.dumps(run_sync(name)))
+            except SyncError as e:
+                click.echo(f"{name}: {str(e)}", err=True)
+                failed = True
+    except SyncError as e:
+        raise click.ClickException(str(e))
+    if failed:
+        raise click.exceptions.Exit(1)
+
+@patent_database_bp.cli.command('sync-list')
+def sync_list():
+    """List the saved queries and their watermarks"""
+    try:
+        queries = list_queries()
+    except SyncError as e:
+        raise click.ClickException(str(e))
+    for query in queries:
+        click.echo(json.dumps(query))
+
+@patent_database_bp.cli.command('lookup')
+@click.argument('numbers', nargs=-1)
+@click.option('--file', 'numbers_file', type=click.File('r'), help='File with application numbers, - for stdin')
+@click.option('--output', type=click.File('w'), default='-',
+              help='File to write the records found to as JSON lines, stdout by default')
+@click.option('--no-cache', is_flag=True, help='Bypass the response cache')
+def lookup(numbers, numbers_file, output, no_cache):
+    """Fetch the records of many application NUMBERS and report the missing ones"""
+    numbers = list(numbers)
+    if numbers_file:
+        numbers += parse_application_numbers(numbers_file.read())
+    if not numbers:
+        raise click.UsageError('Give application numbers or --file')
+
+    result = lookup_application_numbers(numbers, use_cache=not no_cache)
+    if not result.get('success'):
+        raise click.ClickException(result.get('error'))
+    for record in result['data']['results']:
+        output.write(json.dumps(record) + '\n')
+    click.echo(json.dumps(result['report']), err=True)
+    if result['report']['failed']:
+        raise click.ClickException(f"Lookup of {len(result['report']['failed'])} application numbers failed")
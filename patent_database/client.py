@@ -0,0 +1,423 @@
+"""
+Shared HTTP client for all USPTO ODP API calls
+"""
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+from .constants import API_ENDPOINTS
+from .utils import get_config_value, get_api_key, mask_api_key
+from .ratelimit import create_rate_limiter, parse_retry_after, backoff_delay
+from .cache import ResponseCache, make_cache_key
+from .persistent_cache import SQLiteResponseCache
+from .singleflight import SingleFlight
+from .resilience import CircuitBreaker, CircuitOpenError, Deadline, DeadlineExceeded
+from .metrics import observe_upstream, count_retry, count_cache_lookup, waiting_for_rate_limiter
+from .timing import span, record_span
+from .transport import CassetteAdapter, get_cassette
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Defaults used when config.py does not override them
+DEFAULT_POOL_CONNECTIONS = 4
+DEFAULT_POOL_MAXSIZE = 10
+DEFAULT_CONNECT_TIMEOUT = 5   # seconds
+DEFAULT_READ_TIMEOUT = 30     # seconds
+DEFAULT_RATE_LIMIT_PER_SECOND = 5
+DEFAULT_RATE_LIMIT_BURST = 10
+DEFAULT_MAX_RETRIES = 5
+DEFAULT_RETRY_BASE_DELAY = 0.5  # seconds
+DEFAULT_RETRY_MAX_DELAY = 30    # seconds
+DEFAULT_CACHE_MAX_ENTRIES = 512
+DEFAULT_CACHE_TTL = 300         # seconds
+DEFAULT_CACHE_PATH = 'instance/odp_cache.sqlite3'
+DEFAULT_CACHE_MAX_BYTES = 256 * 1024 * 1024
+DEFAULT_CACHE_STALE_TTL = 3600  # seconds
+DEFAULT_REQUEST_DEADLINE = 45   # seconds
+
+class ODPResponse:
+    """
+    Upstream response detached from its HTTP connection
+
+    Mirrors the parts of requests.Response the operations use (status_code,
+    headers, text, json(), raise_for_status()) so it can be cached and shared.
+    `queue_time` is the time spent waiting for the rate limiter, `retries` the
+    number of 429 retries and `from_cache` tells whether it was served locally;
+    `stale` marks an expired cache entry served while the circuit breaker is open.
+    """
+
+    def __init__(self, status_code, headers, content, url=None, queue_time=0.0, retries=0, from_cache=False):
+        self.status_code = status_code
+        self.headers = CaseInsensitiveDict(headers)
+        self.content = content
+        self.url = url
+        self.queue_time = queue_time
+        self.retries = retries
+        self.from_cache = from_cache
+        self.stale = False
+
+    @property
+    def text(self):
+        return self.content.decode('utf-8', errors='replace')
+
+    def json(self):
+        """Decode the body; every call returns a fresh object so callers may modify it"""
+        return json.loads(self.content)
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.exceptions.HTTPError(f"{self.status_code} Error for url: {self.url}", response=self)
+
+    def to_cache_entry(self):
+        """Plain (status_code, headers, content) tuple stored by the cache backends"""
+        return self.status_code, dict(self.headers), self.content
+
+    @classmethod
+    def from_cache_entry(cls, entry, url=None):
+        """Rebuild a response served from the cache"""
+        status_code, headers, content = entry
+        return cls(status_code, headers, content, url=url, from_cache=True)
+
+# Counter of the job (a sync run, a lookup) the requests of this context are sent for
+_job_calls = contextvars.ContextVar('odp_job_calls', default=None)
+
+class UpstreamCallCounter:
+    """
+    HTTP requests sent to the API for one job
+
+    Requests made from worker threads count too when the threads run in a copy
+    of the job's context (contextvars.copy_context().run). A request coalesced
+    with an identical one in flight for another job is not counted.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def add(self):
+        with self._lock:
+            self.count += 1
+
+@contextmanager
+def count_upstream_calls():
+    """Count the HTTP requests sent to the API inside the block; yields the UpstreamCallCounter"""
+    counter = UpstreamCallCounter()
+    token = _job_calls.set(counter)
+    try:
+        yield counter
+    finally:
+        _job_calls.reset(token)
+
+class ODPClient:
+    """
+    Keep-alive HTTP client for the USPTO ODP API
+
+    Holds a single requests.Session with a pooled adapter so repeated searches
+    reuse open TCP+TLS connections, and builds the request headers once. Every
+    request first takes a token from the shared rate limiter; 429 responses are
+    retried after the Retry-After delay or a jittered exponential backoff.
+    Successful responses are kept in a response cache keyed on the canonical
+    request payload, and identical requests made at the same time are coalesced
+    into one upstream call (counted in `in_flight.deduplicated`). Every HTTP
+    request actually sent, retries included, is counted in `upstream_requests`.
+    With a `cassette` the adapter records the traffic or replays it offline.
+    """
+
+    def __init__(self, api_key, pool_connections=DEFAULT_POOL_CONNECTIONS,
+                 pool_maxsize=DEFAULT_POOL_MAXSIZE, connect_timeout=DEFAULT_CONNECT_TIMEOUT,
+                 read_timeout=DEFAULT_READ_TIMEOUT, rate_limiter=None,
+                 max_retries=DEFAULT_MAX_RETRIES, retry_base_delay=DEFAULT_RETRY_BASE_DELAY,
+                 retry_max_delay=DEFAULT_RETRY_MAX_DELAY, cache=None, circuit_breaker=None, cassette=None):
+        self.api_key = api_key
+        self.masked_key = mask_api_key(api_key)
+        self.timeout = (connect_timeout, read_timeout)
+        self.rate_limiter = rate_limiter or create_rate_limiter(
+            DEFAULT_RATE_LIMIT_PER_SECOND, DEFAULT_RATE_LIMIT_BURST)
+        self.max_retries = max_retries
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+        self.cache = cache
+        self.in_flight = SingleFlight()
+        self.circuit_breaker = circuit_breaker or CircuitBreaker()
+        self.upstream_requests = 0
+        self._counter_lock = threading.Lock()
+        self.cassette = cassette
+
+        if cassette is not None:
+            adapter = CassetteAdapter(cassette, pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+        else:
+            adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+        self.session = requests.Session()
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update({
+            'X-API-KEY': api_key,
+            'Content-Type': 'application/json'
+        })
+
+    def post(self, url, payload, timeout=None, use_cache=True, deadline=None):
+        """
+        POST a JSON payload to an ODP endpoint
+
+        Args:
+            url (str): API endpoint URL
+            payload (dict): Request payload
+            timeout (float or tuple, optional): Overrides the default (connect, read) timeout
+            use_cache (bool, optional): Set to False to bypass the response cache
+            deadline (Deadline, optional): Time budget of the incoming request
+
+        Returns:
+            ODPResponse: The upstream or cached response
+        """
+        return self.request('POST', url, payload, timeout=timeout, use_cache=use_cache, deadline=deadline)
+
+    def get(self, url, params=None, timeout=None, use_cache=True, deadline=None):
+        """
+        GET an ODP endpoint
+
+        Args:
+            url (str): API endpoint URL
+            params (dict, optional): Query string parameters
+            timeout (float or tuple, optional): Overrides the default (connect, read) timeout
+            use_cache (bool, optional): Set to False to bypass the response cache
+            deadline (Deadline, optional): Time budget of the incoming request
+
+        Returns:
+            ODPResponse: The upstream or cached response
+        """
+        return self.request('GET', url, params, timeout=timeout, use_cache=use_cache, deadline=deadline)
+
+    def search(self, payload, timeout=None, use_cache=True, deadline=None):
+        """POST a query payload to the patent search endpoint"""
+        return self.post(API_ENDPOINTS['patent_search'], payload, timeout=timeout,
+                         use_cache=use_cache, deadline=deadline)
+
+    def request(self, method, url, payload=None, timeout=None, use_cache=True, deadline=None):
+        """
+        Serve a request from the cache, or send it upstream and cache a 200 response
+
+        Concurrent calls with the same canonical request share one upstream call.
+        While the circuit breaker is open the request fails fast, or is answered
+        with a stale cached response when one is available.
+
+        Args:
+            method (str): 'GET' or 'POST'
+            url (str): API endpoint URL
+            payload (dict, optional): JSON body for POST, query parameters for GET
+            timeout (float or tuple, optional): Overrides the default (connect, read) timeout
+            use_cache (bool, optional): Set to False to bypass the response cache
+            deadline (Deadline, optional): Time budget of the incoming request
+
+        Returns:
+            ODPResponse: The upstream or cached response
+
+        Raises:
+            DeadlineExceeded: The deadline ran out before a response arrived
+            CircuitOpenError: The breaker is open and nothing is cached
+        """
+        key = make_cache_key(method, url, payload)
+        if use_cache and self.cache is not None:
+            with span('cache'):
+                cached = self.cache.get(key)
+            count_cache_lookup('miss' if cached is None else 'hit')
+            if cached is not None:
+                logger.info(f"Serving {method} {url} from response cache")
+                return ODPResponse.from_cache_entry(cached, url=url)
+
+        if deadline is not None:
+            deadline.check(f"{method} {url}")
+
+        def send():
+            if not self.circuit_breaker.allow_request():
+                return self._serve_stale(key, method, url)
+            try:
+                if method == 'GET':
+                    response = self._send(method, url, timeout=timeout, deadline=deadline, params=payload)
+                else:
+                    response = self._send(method, url, timeout=timeout, deadline=deadline, json=payload)
+            finally:
+                # No-op once the request recorded a success or failure
+                self.circuit_breaker.release_probe()
+            if self.cache is not None and response.status_code == 200:
+                self.cache.set(key, response.to_cache_entry())
+            return response
+
+        try:
+            response, shared = self.in_flight.do(key, send, timeout=deadline.remaining() if deadline else None)
+        except TimeoutError:
+            raise DeadlineExceeded(f"{method} {url} did not finish within the request deadline")
+        if shared:
+            logger.info(f"Shared in-flight {method} {url} response with an identical request")
+        return response
+
+    def _serve_stale(self, key, method, url):
+        """Answer from an expired cache entry while the circuit breaker is open"""
+        stale = self.cache.get(key, allow_stale=True) if self.cache is not None else None
+        if stale is None:
+            raise CircuitOpenError(f"USPTO API circuit breaker is open; {method} {url} was not sent")
+        count_cache_lookup('stale')
+        logger.warning(f"Circuit breaker open. Serving stale cached response for {method} {url}")
+        response = ODPResponse.from_cache_entry(stale, url=url)
+        response.stale = True
+        return response
+
+    def count_upstream_request(self):
+        """Count one HTTP request sent to the API, also for the job it was sent for, if any"""
+        with self._counter_lock:
+            self.upstream_requests += 1
+        counter = _job_calls.get()
+        if counter is not None:
+            counter.add()
+
+    def _send(self, method, url, timeout=None, deadline=None, **kwargs):
+        """
+        Send a request through the rate limiter, retrying on 429
+
+        Connection errors, timeouts and 5xx responses count as failures for the
+        circuit breaker.
+
+        Returns:
+            ODPResponse: Response with `queue_time` and `retries` filled in
+        """
+        queue_time = 0.0
+        attempt = 0
+        while True:
+            wait = self.rate_limiter.reserve()
+            if deadline is not None and wait > deadline.remaining():
+                raise DeadlineExceeded(f"Rate limit wait of {wait:.2f}s exceeds the request deadline")
+            if wait > 0:
+                with waiting_for_rate_limiter(), span('ratelimit'):
+                    time.sleep(wait)
+            queue_time += wait
+
+            request_timeout = timeout or self.timeout
+            if deadline is not None:
+                request_timeout = deadline.timeout(request_timeout if isinstance(request_timeout, tuple)
+                                                   else (request_timeout, request_timeout))
+            self.count_upstream_request()
+            started = time.perf_counter()
+            try:
+                response = self.session.request(method, url, timeout=request_timeout, **kwargs)
+            except requests.exceptions.RequestException as e:
+                observe_upstream(url, started)
+                record_span('upstream', time.perf_counter() - started)
+                self.circuit_breaker.record_failure()
+                if isinstance(e, requests.exceptions.Timeout) and deadline is not None and deadline.expired():
+                    raise DeadlineExceeded(f"{method} {url} did not finish within the request deadline") from e
+                raise
+            observe_upstream(url, started, response.status_code)
+            record_span('upstream', time.perf_counter() - started)
+
+            if response.status_code >= 500:
+                self.circuit_breaker.record_failure()
+            else:
+                self.circuit_breaker.record_success()
+            if response.status_code != 429 or attempt >= self.max_retries:
+                break
+
+            retry_after = parse_retry_after(response.headers.get('Retry-After'))
+            if retry_after is not None:
+                # Hold back every caller sharing the bucket, then add a little jitter
+                # so the waiting requests do not all fire at the same instant
+                self.rate_limiter.pause(retry_after)
+                delay = backoff_delay(0, self.retry_base_delay, self.retry_max_delay)
+            else:
+                delay = backoff_delay(attempt, self.retry_base_delay, self.retry_max_delay)
+            if deadline is not None and max(delay, retry_after or 0) >= deadline.remaining():
+                logger.warning("Rate limit exceeded (429) and no time left in the request deadline to retry")
+                break
+            attempt += 1
+            count_retry(url)
+            logger.warning(f"Rate limit exceeded (429). Retry-After: {retry_after}. "
+                           f"Retrying in {delay:.2f} seconds. Attempt {attempt}/{self.max_retries}")
+            with span('backoff'):
+                time.sleep(delay)
+
+        if queue_time > 0:
+            logger.info(f"Request to {url} waited {queue_time:.3f} seconds for the rate limiter")
+        return ODPResponse(response.status_code, response.headers, response.content, url=url,
+                           queue_time=queue_time, retries=attempt)
+
+    def close(self):
+        """Close all pooled connections"""
+        self.session.close()
+
+# One client per worker process; rebuilt after a fork so pooled sockets are never shared
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+def get_client():
+    """
+    Get the shared ODP client for the current worker process
+
+    Returns:
+        ODPClient: Client configured from config.py
+    """
+    global _client, _client_pid
+
+    pid = os.getpid()
+    with _client_lock:
+        if _client is None or _client_pid != pid:
+            _client = ODPClient(
+                get_api_key(),
+                pool_connections=get_config_value('ODP_POOL_CONNECTIONS', DEFAULT_POOL_CONNECTIONS),
+                pool_maxsize=get_config_value('ODP_POOL_MAXSIZE', DEFAULT_POOL_MAXSIZE),
+                connect_timeout=get_config_value('ODP_CONNECT_TIMEOUT', DEFAULT_CONNECT_TIMEOUT),
+                read_timeout=get_config_value('ODP_READ_TIMEOUT', DEFAULT_READ_TIMEOUT),
+                rate_limiter=create_rate_limiter(
+                    get_config_value('ODP_RATE_LIMIT_PER_SECOND', DEFAULT_RATE_LIMIT_PER_SECOND),
+                    get_config_value('ODP_RATE_LIMIT_BURST', DEFAULT_RATE_LIMIT_BURST),
+                    get_config_value('ODP_RATE_LIMIT_STATE_FILE')
+                ),
+                max_retries=get_config_value('ODP_MAX_RETRIES', DEFAULT_MAX_RETRIES),
+                retry_base_delay=get_config_value('ODP_RETRY_BASE_DELAY', DEFAULT_RETRY_BASE_DELAY),
+                retry_max_delay=get_config_value('ODP_RETRY_MAX_DELAY', DEFAULT_RETRY_MAX_DELAY),
+                cache=create_response_cache(),
+                circuit_breaker=CircuitBreaker(
+                    error_threshold=get_config_value('ODP_BREAKER_ERROR_THRESHOLD', 0.5),
+                    min_requests=get_config_value('ODP_BREAKER_MIN_REQUESTS', 10),
+                    window=get_config_value('ODP_BREAKER_WINDOW', 60),
+                    recovery_timeout=get_config_value('ODP_BREAKER_RECOVERY_TIMEOUT', 30)
+                ),
+                cassette=get_cassette()
+            )
+            _client_pid = pid
+            logger.info(f"Created ODP client for process {pid}")
+        return _client
+
+def create_response_cache():
+    """
+    Create the response cache configured in config.py
+
+    Returns:
+        ResponseCache or SQLiteResponseCache: The cache, or None when ODP_CACHE_ENABLED is off
+    """
+    if not get_config_value('ODP_CACHE_ENABLED', True):
+        return None
+    if get_config_value('ODP_CACHE_BACKEND', 'memory') == 'sqlite':
+        return SQLiteResponseCache(
+            get_config_value('ODP_CACHE_PATH', DEFAULT_CACHE_PATH),
+            max_bytes=get_config_value('ODP_CACHE_MAX_BYTES', DEFAULT_CACHE_MAX_BYTES),
+            ttl=get_config_value('ODP_CACHE_TTL', DEFAULT_CACHE_TTL),
+            stale_ttl=get_config_value('ODP_CACHE_STALE_TTL', DEFAULT_CACHE_STALE_TTL)
+        )
+    return ResponseCache(
+        max_entries=get_config_value('ODP_CACHE_MAX_ENTRIES', DEFAULT_CACHE_MAX_ENTRIES),
+        ttl=get_config_value('ODP_CACHE_TTL', DEFAULT_CACHE_TTL),
+        stale_ttl=get_config_value('ODP_CACHE_STALE_TTL', DEFAULT_CACHE_STALE_TTL)
+    )
+
+def create_deadline():
+    """Start the upstream time budget for one incoming request, from ODP_REQUEST_DEADLINE"""
+    return Deadline(get_config_value('ODP_REQUEST_DEADLINE', DEFAULT_REQUEST_DEADLINE))
@@ -112,6 +112,15 @@ VALID_FIELDS = {
     ]
 }
 
+# Fields with a fixed set of values; a q clause on one is dropped when a filter already requires it
+ENUMERATED_FIELDS = [
+    'applicationMetaData.applicationTypeLabelName',
+    'applicationMetaData.applicationStatusDescriptionText',
+    'applicationMetaData.applicationStatusCode',
+    'applicationMetaData.entityStatusData.businessEntityStatusCategory',
+    'applicationMetaData.entityStatusData.smallEntityStatusIndicator'
+]
+
 # Display names for fields (used in UI)
 FIELD_DISPLAY_NAMES = {
     'inventionTitle': 'Invention Title',
@@ -135,6 +144,9 @@ FIELD_DISPLAY_NAMES = {
     'applicationMetaData.subclass': 'USPTO Subclass'
 }
 
+# Company name suffixes recognised when expanding applicant names
+COMPANY_SUFFIXES = ['LLC', 'INC', 'CORP', 'CORPORATION', 'CO', 'LTD', 'LIMITED', 'LP', 'LLP']
+
 # Boolean Operators
 BOOLEAN_OPERATORS = ['AND', 'OR', 'NOT']
 
@@ -0,0 +1,301 @@
+"""
+Streaming export of every page of a search
+"""
+import contextvars
+import copy
+import csv
+import io
+import itertools
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from .client import get_client
+from .constants import API_ENDPOINTS, MAX_RESULTS_PER_PAGE, CSV_EXPORT_FIELDS
+from .extractors import extract_rows
+from .operations import prepare_search, handle_search_response, search_error_result
+from .query_rewriter import matches_nothing
+from .resilience import Deadline
+from .utils import get_config_value, get_csv_header
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DEFAULT_EXPORT_MAX_ROWS = 10000
+DEFAULT_EXPORT_DEADLINE = 300  # seconds
+DEFAULT_PAGE_FETCH_CONCURRENCY = 4
+
+# First cell of the last row of a CSV export that stopped before its last page
+EXPORT_INCOMPLETE_MARKER = '# EXPORT INCOMPLETE'
+
+class PageFetchError(Exception):
+    """A page of a multi-page fetch failed; carries that page's failure envelope"""
+
+    def __init__(self, result):
+        super().__init__(result.get('error'))
+        self.result = result
+
+def get_export_search_params(data):
+    """
+    Get the search parameters of an export request
+
+    Accepts {'search_params': {...}} as well as the search parameters sent
+    directly, which is how the Export to Excel button posts them.
+
+    Returns:
+        dict: Search parameters, or None if the request has none
+    """
+    if 'search_params' in data:
+        return data['search_params']
+    if 'search_type' in data:
+        return {key: value for key, value in data.items()
+                if key not in ('format', 'all_pages', 'max_rows')}
+    return None
+
+def get_export_row_limit(requested=None):
+    """
+    Rows an export may contain: the requested number capped by ODP_EXPORT_MAX_ROWS
+
+    Args:
+        requested (int, optional): Row limit asked for by the client
+
+    Returns:
+        int: Row limit
+    """
+    ceiling = get_config_value('ODP_EXPORT_MAX_ROWS', DEFAULT_EXPORT_MAX_ROWS)
+    if requested:
+        return max(1, min(int(requested), ceiling))
+    return ceiling
+
+def create_export_deadline():
+    """Start the time budget for the upstream calls of one export (ODP_EXPORT_DEADLINE)"""
+    return Deadline(get_config_value('ODP_EXPORT_DEADLINE', DEFAULT_EXPORT_DEADLINE))
+
+def plan_pages(params, max_rows=None):
+    """
+    Set up the pagination for fetching a search page by page
+
+    Args:
+        params (dict): Search parameters; pagination.offset is the first row fetched
+        max_rows (int, optional): Stop after this many results
+
+    Returns:
+        tuple: (params, start, page_size) with params a copy using the largest
+            page size the API allows
+    """
+    params = copy.deepcopy(params)
+    pagination = params.get('pagination') or {}
+    start = int(pagination.get('offset', 0))
+    page_size = MAX_RESULTS_PER_PAGE
+    if max_rows is not None:
+        page_size = max(1, min(page_size, max_rows))
+    params['pagination'] = dict(pagination, offset=start, limit=page_size)
+    return params, start, page_size
+
+def plan_page_offsets(start, page_size, total, max_rows=None):
+    """
+    Offsets of the pages after the first one
+
+    Returns:
+        tuple: (end, offsets) where end is the row after the last one to fetch
+    """
+    end = max(start, total if max_rows is None else min(total, start + max_rows))
+    return end, range(start + page_size, end, page_size)
+
+def build_page_payload(query_payload, offset, page_size):
+    """Copy a query payload with its pagination moved to `offset`"""
+    return dict(query_payload, pagination=dict(query_payload.get('pagination', {}),
+                                               offset=offset, limit=page_size))
+
+def open_search_pages(params, max_rows=None, deadline=None):
+    """
+    Fetch the first page of a search and return an iterator over all its pages
+
+    The first page is fetched before returning so a failed search can still be
+    reported as an error response. The remaining pages are fetched concurrently
+    (at most ODP_PAGE_FETCH_CONCURRENCY ahead of the consumer) and yielded in
+    order, so memory use does not grow with the size of the result set.
+
+    Args:
+        params (dict): Search parameters as accepted by search_patents
+        max_rows (int, optional): Stop after this many results
+        deadline (Deadline, optional): Time budget shared by every page request
+
+    Returns:
+        tuple: (pages, total, error_result) where pages yields lists of records
+            and error_result is a failure envelope if the search failed
+    """
+    params, start, page_size = plan_pages(params, max_rows)
+    query_payload, use_cache, error_result = prepare_search(params)
+    if error_result:
+        return None, 0, error_result
+    return open_payload_pages(query_payload, use_cache=use_cache, max_rows=max_rows, deadline=deadline)
+
+def open_payload_pages(query_payload, use_cache=True, max_rows=None, deadline=None, mirror=True):
+    """
+    Fetch the first page of a query payload and return an iterator over all its pages
+
+    Like open_search_pages, for a payload that is already built; its pagination
+    gives the first row and the page size.
+
+    Args:
+        query_payload (dict): Payload as returned by construct_query_payload
+        use_cache (bool, optional): Set to False to bypass the response cache
+        max_rows (int, optional): Stop after this many results
+        deadline (Deadline, optional): Time budget shared by every page request
+        mirror (bool, optional): Set to False to leave the records out of the local mirror
+
+    Returns:
+        tuple: (pages, total, error_result) as returned by open_search_pages
+    """
+    deadline = deadline or create_export_deadline()
+    pagination = query_payload.get('pagination') or {}
+    start = int(pagination.get('offset', 0))
+    page_size = int(pagination.get('limit') or MAX_RESULTS_PER_PAGE)
+    if matches_nothing(query_payload):
+        return iter([[]]), 0, None
+
+    try:
+        response = get_client().post(API_ENDPOINTS['patent_search'], query_payload,
+                                     use_cache=use_cache, deadline=deadline)
+    except Exception as e:
+        return None, 0, search_error_result(e, query_payload)
+
+    first_result = handle_search_response(response, query_payload, mirror=mirror)
+    if not first_result.get('success'):
+        return None, 0, first_result
+
+    total = first_result['data']['metadata']['total']
+    end, offsets = plan_page_offsets(start, page_size, total, max_rows)
+    logger.info(f"Fetching {end - start} of {total} results in {len(offsets) + 1} pages of {page_size}")
+
+    first_page = first_result['data']['results'][:end - start]
+    pages = _iter_pages(first_page, query_payload, offsets, page_size, end, use_cache, deadline, mirror)
+    return pages, total, None
+
+def _iter_pages(first_page, query_payload, offsets, page_size, end, use_cache, deadline, mirror):
+    """
+    Yield the first page, then fetch and yield the pages at `offsets` in order
+
+    Raises:
+        PageFetchError: A page came back with an error response
+    """
+    yield first_page
+    if not offsets:
+        return
+
+    client = get_client()
+    url = API_ENDPOINTS['patent_search']
+
+    def fetch_page(offset):
+        page_payload = build_page_payload(query_payload, offset, page_size)
+        response = client.post(url, page_payload, use_cache=use_cache, deadline=deadline)
+        page_result = handle_search_response(response, page_payload, mirror=mirror)
+        if not page_result.get('success'):
+            raise PageFetchError(page_result)
+        return page_result['data']['results'][:end - offset]
+
+    concurrency = get_config_value('ODP_PAGE_FETCH_CONCURRENCY', DEFAULT_PAGE_FETCH_CONCURRENCY)
+    executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='odp-export')
+    offsets = iter(offsets)
+
+    def submit(offset):
+        # Each page runs in a copy of the caller's context so its spans reach the request's timings
+        return executor.submit(contextvars.copy_context().run, fetch_page, offset)
+
+    window = deque(submit(offset) for offset in itertools.islice(offsets, concurrency))
+    try:
+        while window:
+            page = window.popleft().result()
+            next_offset = next(offsets, None)
+            if next_offset is not None:
+                window.append(submit(next_offset))
+            yield page
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+def iter_csv(pages):
+    """
+    Write pages of search results as CSV, one chunk per page
+
+    Args:
+        pages (iterable): Lists of records, e.g. from open_search_pages
+
+    Yields:
+        str: CSV text, starting with the header row. If a page fails, the last
+            row starts with EXPORT_INCOMPLETE_MARKER and gives the error
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(get_csv_header())
+    rows = 0
+    try:
+        for page in pages:
+            writer.writerows(extract_rows(page, CSV_EXPORT_FIELDS))
+            rows += len(page)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    except Exception as e:
+        # Headers are already sent, so a trailer row is the only way to tell the export is cut short
+        logger.error(f"Export stopped before the last page: {str(e)}")
+        writer.writerow([EXPORT_INCOMPLETE_MARKER, f"Stopped after {rows} rows: {str(e)}"])
+        yield buffer.getvalue()
+
+def open_export_pages(data, deadline=None):
+    """
+    Get the pages of records an export request asks for
+
+    Args:
+        data (dict): Export request with search parameters (see
+            get_export_search_params) or the results to export, and optional max_rows
+        deadline (Deadline, optional): Time budget of the export
+
+    Returns:
+        tuple: (pages, total, error_result) as returned by open_search_pages
+    """
+    search_params = get_export_search_params(data)
+    if search_params is None:
+        if 'results' in data:
+            results = data.get('results') or []
+            return [results[:get_export_row_limit()]], len(results), None
+        return None, 0, {
+            'success': False,
+            'error': 'No results or search parameters provided for export'
+        }
+
+    # Export the whole result set, not just from the page the user is on
+    search_params = dict(search_params, pagination=dict(search_params.get('pagination') or {}, offset=0))
+    max_rows = get_export_row_limit(data.get('max_rows'))
+    pages, total, error_result = open_search_pages(search_params, max_rows=max_rows, deadline=deadline)
+    if error_result:
+        return None, 0, {
+            'success': False,
+            'error': error_result.get('error', 'Failed to retrieve results for export')
+        }
+
+    if total > max_rows:
+        logger.warning(f"Export limited to {max_rows} of {total} results")
+    return pages, total, None
+
+def stream_csv_export(data, deadline=None):
+    """
+    Export every page of a search as a stream of CSV chunks
+
+    Args:
+        data (dict): Export request, see open_export_pages
+        deadline (Deadline, optional): Time budget of the export
+
+    Returns:
+        dict: Success flag and csv_stream generator, or failure envelope with error
+    """
+    pages, total, error_result = open_export_pages(data, deadline=deadline)
+    if error_result:
+        return error_result
+
+    return {
+        'success': True,
+        'csv_stream': iter_csv(pages),
+        'total': total
+    }
@@ -0,0 +1,155 @@
+"""
+Precompiled accessors for pulling dot-separated fields out of search results
+"""
+from functools import lru_cache
+from itertools import repeat
+from operator import itemgetter
+
+# Default for callers that need to tell a missing field from any stored value
+MISSING = object()
+
+# Stands in for a missing record or parent object when reading fields; never modified
+EMPTY = {}
+
+@lru_cache(maxsize=1024)
+def compile_extractor(path, default=""):
+    """
+    Compile a dot-separated field path into an accessor function
+
+    The path is split once, here, instead of on every record. The accessor
+    returns the value at the path, or `default` as soon as a step is missing or
+    is not a dict.
+
+    Args:
+        path (str): Dot-separated path, e.g. 'applicationMetaData.filingDate'
+        default (any, optional): Value for missing fields; must be hashable
+
+    Returns:
+        callable: Function taking a record and returning the field value
+    """
+    parts = tuple(path.split('.'))
+
+    if len(parts) == 1:
+        key = parts[0]
+
+        def extract(record):
+            if isinstance(record, dict):
+                return record.get(key, default)
+            return default
+    elif len(parts) == 2:
+        first, second = parts
+
+        def extract(record):
+            if isinstance(record, dict):
+                value = record.get(first)
+                if isinstance(value, dict):
+                    return value.get(second, default)
+            return default
+    else:
+        def extract(record):
+            value = record
+            for part in parts:
+                if isinstance(value, dict) and part in value:
+                    value = value[part]
+                else:
+                    return default
+            return value
+
+    return extract
+
+@lru_cache(maxsize=128)
+def _compile_row_extractor(fields, default):
+    # Every field is read with dict.get(key, default) from the record (scope 0) or
+    # from the object at its parent path, e.g. applicationMetaData (scope 1 and up)
+    parents = []
+    scopes, keys = [], []
+    for field in fields:
+        parent, _, key = field.rpartition('.')
+        if parent and parent not in parents:
+            parents.append(parent)
+        scopes.append(parents.index(parent) + 1 if parent else 0)
+        keys.append(key)
+    read_parents = tuple(compile_extractor(parent, None) for parent in parents)
+    # Picks the object each field is read from out of extract_row's `objects`
+    field_scopes = itemgetter(*scopes) if len(scopes) > 1 else lambda objects: tuple(objects[scope] for scope in scopes)
+    keys, defaults = tuple(keys), (default,) * len(fields)
+
+    def extract_row(record):
+        if not isinstance(record, dict):
+            return defaults
+        # Look each parent object up once per record, however many of its fields are read
+        objects = [record]
+        for read_parent in read_parents:
+            parent = read_parent(record)
+            objects.append(parent if isinstance(parent, dict) else EMPTY)
+        return tuple(map(dict.get, field_scopes(objects), keys, defaults))
+
+    return extract_row
+
+def compile_row_extractor(fields, default=""):
+    """
+    Compile a list of field paths, e.g. CSV_EXPORT_FIELDS, into one row accessor
+
+    The paths are split once, here. The accessor reads every field of a record
+    and returns them as a tuple, fetching shared parent objects such as
+    applicationMetaData only once. Same results as calling compile_extractor's
+    accessors one by one.
+
+    Args:
+        fields (iterable): Dot-separated field paths
+        default (any, optional): Value for missing fields; must be hashable
+
+    Returns:
+        callable: Function taking a record and returning a tuple of field values
+    """
+    return _compile_row_extractor(tuple(fields), default)
+
+def extract_rows(records, fields, default=""):
+    """
+    Pull the given fields of a batch of records into rows, e.g. for csv.writer.writerows
+
+    Args:
+        records (iterable): Search result records
+        fields (iterable): Dot-separated field paths
+        default (any, optional): Value for missing fields
+
+    Returns:
+        iterator: One tuple of field values per record
+    """
+    records = list(records)
+    columns = extract_columns(records, fields, default)
+    return zip(*columns) if columns else iter([()] * len(records))
+
+def extract_columns(records, fields, default=""):
+    """
+    Pull the given fields of a batch of records into column arrays
+
+    Each column is read with one map() over the records, so the per-record
+    lookups run in C; a shared parent object such as applicationMetaData is
+    looked up once per record for all of its fields. Same results as
+    compile_row_extractor's accessor.
+
+    Args:
+        records (iterable): Search result records
+        fields (iterable): Dot-separated field paths
+        default (any, optional): Value for missing fields
+
+    Returns:
+        list: One list of values per field, each as long as `records`
+    """
+    records = [record if isinstance(record, dict) else EMPTY for record in records]
+    parents = {}
+    columns = []
+    for field in fields:
+        parts = field.split('.')
+        if len(parts) == 1:
+            columns.append(list(map(dict.get, records, repeat(parts[0]), repeat(default))))
+        elif len(parts) == 2:
+            scope = parents.get(parts[0])
+            if scope is None:
+                scope = parents[parts[0]] = [value if isinstance(value, dict) else EMPTY
+                                             for value in map(dict.get, records, repeat(parts[0]))]
+            columns.append(list(map(dict.get, scope, repeat(parts[1]), repeat(default))))
+        else:
+            columns.append(list(map(compile_extractor(field, default), records)))
+    return columns
@@ -0,0 +1,340 @@
+"""
+Answering searches from the local mirror instead of the ODP API
+"""
+import json
+import logging
+import sqlite3
+import time
+from functools import lru_cache
+
+from .mirror import get_mirror
+from .query_executor import LocalIndexFull, answered_exactly, get_local_index, project_record
+from .query_parser import (QuerySyntaxError, BooleanQuery, MatchAll, Not, Range, Required, Term, parse_query,
+                           canonical_query, to_query_string)
+from .utils import validate_search_params, get_config_value
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DEFAULT_LOCAL_MAX_AGE = 86400
+
+# Query fields the mirror's SQLite tables answer, mapped to their columns
+MIRROR_TEXT_FIELDS = {
+    'inventionTitle': 'invention_title',
+    'applicationMetaData.inventionTitle': 'invention_title',
+    'applicationMetaData.firstNamedApplicant': 'applicant_name',
+    'applicationMetaData.firstApplicantName': 'applicant_name',
+    'inventorNameText': 'inventor_names',
+    'applicationMetaData.firstNamedInventor': 'inventor_names',
+    'applicationMetaData.firstInventorName': 'inventor_names',
+    'applicationMetaData.examinerNameText': 'examiner_name',
+}
+MIRROR_EXACT_FIELDS = {
+    'applicationNumberText': 'application_number',
+    'applicationMetaData.applicationNumberText': 'application_number',
+    'applicationMetaData.applicationStatusDescriptionText': 'status',
+    'applicationMetaData.applicationTypeLabelName': 'application_type',
+}
+MIRROR_RANGE_FIELDS = {
+    'filingDate': 'filing_date',
+    'applicationMetaData.filingDate': 'filing_date',
+    'applicationMetaData.applicationStatusDate': 'status_date',
+}
+MIRROR_SORT_FIELDS = dict(MIRROR_RANGE_FIELDS, applicationNumberText='application_number')
+
+class UnsupportedMirrorQuery(ValueError):
+    """The payload needs something the mirror's SQLite tables cannot answer"""
+
+def conjunction_clauses(node):
+    """
+    Yield the clauses a query requires all of
+
+    Clauses separated by spaces only are ANDed or ORed as the API decides, so
+    such a group is a single clause unless it has only one; +clause is clause.
+    """
+    if isinstance(node, Required):
+        yield from conjunction_clauses(node.clause)
+    elif isinstance(node, BooleanQuery) and (node.operator == 'AND' or len(node.clauses) == 1):
+        for clause in node.clauses:
+            yield from conjunction_clauses(clause)
+    elif not isinstance(node, MatchAll):
+        yield node
+
+def fts_phrase(term):
+    """FTS5 phrase for a term, a phrase or a word ending in '*'"""
+    value = term.value.replace('\\', '')
+    if term.kind == 'wildcard':
+        if '*' in value[:-1] or '?' in value or not value.endswith('*'):
+            raise UnsupportedMirrorQuery(f"wildcard {term.value}")
+        return '"' + value[:-1].replace('"', '""') + '" *'
+    return '"' + value.replace('"', '""') + '"'
+
+def fts_expression(node):
+    """
+    FTS5 expression for a term or an OR of terms on one full-text field (any field without a name)
+
+    Raises:
+        UnsupportedMirrorQuery: The clause is not such a term or group
+    """
+    terms = node.clauses if isinstance(node, BooleanQuery) and node.operator == 'OR' else (node,)
+    field = getattr(terms[0], 'field', None)
+    if (field is not None and field not in MIRROR_TEXT_FIELDS) or not all(
+            isinstance(term, Term) and term.field == field and not term.suffix for term in terms):
+        raise UnsupportedMirrorQuery(f"clause {to_query_string(node)}")
+    expression = ' OR '.join(fts_phrase(term) for term in terms)
+    return f"{MIRROR_TEXT_FIELDS[field]} : ({expression})" if field else f"({expression})"
+
+def build_mirror_query(payload):
+    """
+    Translate a query payload into arguments for LocalMirror.search
+
+    Supports a `q` of ANDed clauses, each a term, phrase or prefix* (or an OR
+    of them) on a full-text field or without a field name, NOT of such a
+    clause, values of an exact field, or an inclusive range; plus filters,
+    rangeFilters and sort on the fields in MIRROR_*_FIELDS.
+
+    Args:
+        payload (dict): Payload as returned by construct_query_payload
+
+    Returns:
+        dict: match, exclude, equals, ranges and order_by arguments
+
+    Raises:
+        QuerySyntaxError: `q` cannot be parsed
+        UnsupportedMirrorQuery: The payload needs something the mirror cannot answer
+    """
+    match, exclude, equals, ranges = [], [], {}, {}
+
+    def add_range(column, value_from, value_to):
+        current_from, current_to = ranges.get(column, (None, None))
+        if value_from is not None and (current_from is None or value_from > current_from):
+            current_from = value_from
+        if value_to is not None and (current_to is None or value_to < current_to):
+            current_to = value_to
+        ranges[column] = (current_from, current_to)
+
+    def add_equals(column, values):
+        values = [str(value) for value in values]
+        if column in equals:
+            values = [value for value in equals[column] if value.lower() in {v.lower() for v in values}]
+        equals[column] = values
+
+    for clause in conjunction_clauses(parse_query(payload.get('q') or '*')):
+        terms = clause.clauses if isinstance(clause, BooleanQuery) and clause.operator == 'OR' else (clause,)
+        field = getattr(terms[0], 'field', None)
+        if isinstance(clause, Not):
+            exclude.append(fts_expression(clause.clause))
+        elif isinstance(clause, Range) and clause.field in MIRROR_RANGE_FIELDS:
+            if not (clause.include_low and clause.include_high):
+                raise UnsupportedMirrorQuery(f"exclusive range {to_query_string(clause)}")
+            add_range(MIRROR_RANGE_FIELDS[clause.field], clause.low, clause.high)
+        elif field in MIRROR_EXACT_FIELDS and all(isinstance(term, Term) and term.field == field and
+                                                  term.kind in ('term', 'phrase') and not term.suffix
+                                                  for term in terms):
+            add_equals(MIRROR_EXACT_FIELDS[field], [term.value for term in terms])
+        else:
+            match.append(fts_expression(clause))
+
+    for payload_filter in payload.get('filters') or []:
+        if payload_filter.get('name') not in MIRROR_EXACT_FIELDS:
+            raise UnsupportedMirrorQuery(f"filter on {payload_filter.get('name')}")
+        add_equals(MIRROR_EXACT_FIELDS[payload_filter['name']], payload_filter.get('value') or [])
+
+    for range_filter in payload.get('rangeFilters') or []:
+        if range_filter.get('field') not in MIRROR_RANGE_FIELDS:
+            raise UnsupportedMirrorQuery(f"range filter on {range_filter.get('field')}")
+        add_range(MIRROR_RANGE_FIELDS[range_filter['field']],
+                  range_filter.get('valueFrom') or None, range_filter.get('valueTo') or None)
+
+    order_by = []
+    for sort in payload.get('sort') or []:
+        if sort.get('field') not in MIRROR_SORT_FIELDS:
+            raise UnsupportedMirrorQuery(f"sort on {sort.get('field')}")
+        order_by.append((MIRROR_SORT_FIELDS[sort['field']], 'asc' if sort.get('order') == 'asc' else 'desc'))
+
+    return {
+        'match': ' AND '.join(match) or None,
+        'exclude': exclude,
+        'equals': equals,
+        'ranges': ranges,
+        'order_by': order_by
+    }
+
+def search_mirror_tables(mirror, payload):
+    """
+    Run a search payload on the mirror's SQLite indexes, for a mirror too large for LocalIndex
+
+    Returns:
+        tuple: (total, records) like LocalIndex.execute
+
+    Raises:
+        QuerySyntaxError: `q` cannot be parsed
+        UnsupportedMirrorQuery: The payload needs something the mirror cannot answer
+    """
+    pagination = payload.get('pagination') or {}
+    query = build_mirror_query(payload)
+    logger.info(f"Local mirror SQLite query: {json.dumps(query)}")
+    total, records = mirror.search(offset=int(pagination.get('offset', 0)), limit=int(pagination.get('limit', 50)),
+                                   **query)
+    return total, [project_record(record, payload.get('fields')) for record in records]
+
+def payload_conditions(payload):
+    """
+    The conditions a payload requires all of, spelled canonically
+
+    Args:
+        payload (dict): Payload as returned by construct_query_payload
+
+    Returns:
+        set: One string per clause of `q`, filter and range filter
+    """
+    tree = parse_query(canonical_query(payload.get('q') or '*'))
+    conditions = {to_query_string(clause) for clause in conjunction_clauses(tree)}
+    for payload_filter in payload.get('filters') or []:
+        values = sorted(str(value).lower() for value in payload_filter.get('value') or [])
+        conditions.add(json.dumps({'name': payload_filter.get('name'), 'value': values}))
+    for range_filter in payload.get('rangeFilters') or []:
+        conditions.add(json.dumps(range_filter, sort_keys=True))
+    return conditions
+
+def find_covering_query(payload):
+    """
+    Find a synced saved query whose results include every result of a payload
+
+    A saved query covers the payload when the payload requires every condition
+    the saved query does, and its last sync finished at most ODP_LOCAL_MAX_AGE
+    seconds ago. Records that stopped matching the saved query after they were
+    synced are not noticed. Queries the local index would answer differently
+    from the API, such as terms without a field name, are never covered.
+
+    Args:
+        payload (dict): Payload as returned by construct_query_payload
+
+    Returns:
+        str: Name of the saved query, or None
+    """
+    from .sync import list_queries
+
+    if not answered_exactly(parse_query(payload.get('q') or '*')):
+        return None
+    conditions = payload_conditions(payload)
+    oldest = time.time() - get_config_value('ODP_LOCAL_MAX_AGE', DEFAULT_LOCAL_MAX_AGE)
+    for query in list_queries():
+        last_run = query['last_run'] or {}
+        if query['resume_number'] is not None or last_run.get('error') or last_run.get('finished_at', 0) < oldest:
+            continue
+        if saved_query_conditions(json.dumps(query['params'], sort_keys=True)) <= conditions:
+            return query['name']
+    return None
+
+@lru_cache(maxsize=128)
+def saved_query_conditions(params_json):
+    """payload_conditions of a saved query's search parameters, given as JSON"""
+    from .operations import construct_query_payload
+
+    return frozenset(payload_conditions(construct_query_payload(validate_search_params(json.loads(params_json)))))
+
+def run_local_search(query_payload):
+    """
+    Answer a query payload from the mirror's in-memory index
+
+    A mirror with more than ODP_LOCAL_INDEX_MAX_RECORDS records is searched
+    through its SQLite indexes instead, which answer fewer kinds of query.
+
+    Args:
+        query_payload (dict): Payload as returned by construct_query_payload
+
+    Returns:
+        dict: Search results from the mirror, or failure envelope with error
+    """
+    index = get_local_index()
+    if index is None:
+        return {
+            'success': False,
+            'error': 'The local mirror is not enabled (ODP_MIRROR_ENABLED in config.py)',
+            'query_payload': query_payload
+        }
+
+    started = time.perf_counter()
+    try:
+        try:
+            total, records = index.execute(query_payload)
+        except LocalIndexFull as e:
+            logger.info(f"{str(e)}; searching the mirror's SQLite indexes instead")
+            total, records = search_mirror_tables(index.mirror, query_payload)
+    except QuerySyntaxError as e:
+        return {
+            'success': False,
+            'error': f"Invalid query syntax: {str(e)}",
+            'query_payload': query_payload
+        }
+    except UnsupportedMirrorQuery as e:
+        logger.warning(f"Query is not supported by the local mirror: {str(e)}")
+        return {
+            'success': False,
+            'error': f"Query is not supported by the local mirror: {str(e)}",
+            'query_payload': query_payload
+        }
+    except sqlite3.Error as e:
+        logger.error(f"Local mirror search failed: {str(e)}")
+        return {
+            'success': False,
+            'error': f"Local mirror search failed: {str(e)}",
+            'query_payload': query_payload
+        }
+
+    logger.info(f"Local mirror returned {len(records)} results out of {total} total "
+                f"in {(time.perf_counter() - started) * 1000:.1f} ms")
+    return {
+        'success': True,
+        'data': {
+            'count': total,
+            'patentFileWrapperDataBag': records,
+            'results': records,
+            'metadata': {'total': total}
+        },
+        'query_payload': query_payload,
+        'source': 'local'
+    }
+
+def search_local(params):
+    """
+    Search the local mirror; same parameters and result envelope as search_patents
+
+    Args:
+        params (dict): Search parameters with source='local'
+
+    Returns:
+        dict: Search results from the mirror, or failure envelope with error
+    """
+    from .operations import construct_query_payload
+
+    return run_local_search(construct_query_payload(validate_search_params(params)))
+
+def search_covered_locally(query_payload):
+    """
+    Answer a payload from the mirror if a synced saved query covers it
+
+    Args:
+        query_payload (dict): Payload as returned by construct_query_payload
+
+    Returns:
+        dict: Search results from the mirror, or None if the API has to be asked
+    """
+    if get_mirror() is None:
+        return None
+    try:
+        name = find_covering_query(query_payload)
+    except (sqlite3.Error, QuerySyntaxError) as e:
+        logger.error(f"Could not check the local mirror's saved queries: {str(e)}")
+        return None
+    if not name:
+        return None
+
+    result = run_local_search(query_payload)
+    if not result.get('success'):
+        return None
+    logger.info(f"Answered from the local mirror, covered by saved query {name}")
+    result['note'] = f"Answered from the local mirror (saved query {name})"
+    return result
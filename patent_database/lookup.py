@@ -0,0 +1,214 @@
+"""
+Bulk lookup of known application numbers
+"""
+import contextvars
+import logging
+import re
+from concurrent.futures import CancelledError, ThreadPoolExecutor, as_completed
+
+from .cache import make_cache_key
+from .client import count_upstream_calls, get_client
+from .constants import API_ENDPOINTS, MAX_RESULTS_PER_PAGE
+from .operations import construct_query_payload, handle_search_response
+from .resilience import CircuitOpenError, Deadline, DeadlineExceeded
+from .utils import validate_search_params, get_config_value, get_nested_value
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DEFAULT_LOOKUP_CONCURRENCY = 4
+DEFAULT_LOOKUP_MAX_NUMBERS = 20000
+DEFAULT_LOOKUP_DEADLINE = 600  # seconds
+
+# 16/123,456 as written on documents, or the bare digits
+APPLICATION_NUMBER_PATTERN = re.compile(r'\b\d{2}/\d{3},\d{3}\b|\b\d{6,12}\b')
+
+# Statuses every later call of the lookup would get too
+FATAL_STATUS_CODES = (401, 403)
+
+class LookupFailed(Exception):
+    """An upstream call of a bulk lookup returned an error"""
+
+class LookupAborted(LookupFailed):
+    """An upstream error that ends the whole lookup, e.g. a rejected API key"""
+
+# Errors after which no further call of the lookup is sent
+FATAL_ERRORS = (LookupAborted, DeadlineExceeded, CircuitOpenError)
+
+def parse_application_numbers(text):
+    """
+    Find the application numbers in free text, e.g. an uploaded list or CSV file
+
+    Args:
+        text (str): Text with application numbers separated by anything
+
+    Returns:
+        list: Numbers as bare digits, in order of first appearance, without duplicates
+    """
+    return list(dict.fromkeys(re.sub(r'\D', '', match) for match in APPLICATION_NUMBER_PATTERN.findall(text)))
+
+def normalize_numbers(values):
+    """
+    Split requested values into bare-digit application numbers and invalid entries
+
+    Returns:
+        tuple: (numbers without duplicates, invalid values)
+    """
+    numbers, invalid = [], []
+    for value in values:
+        found = parse_application_numbers(str(value))
+        if len(found) == 1:
+            numbers.append(found[0])
+        else:
+            invalid.append(value)
+    return list(dict.fromkeys(numbers)), invalid
+
+def record_number(record):
+    """Bare-digit application number of a search result"""
+    number = record.get('applicationNumberText') or get_nested_value(record, 'applicationMetaData.applicationNumberText')
+    return re.sub(r'\D', '', str(number or ''))
+
+def detail_url(number):
+    return f"{API_ENDPOINTS['patent_details']}/{number}"
+
+def build_lookup_payload(numbers):
+    """
+    Search payload matching every application number of a chunk on one page
+
+    The payload has no `fields`, so searches return the same full records as
+    the detail endpoint.
+    """
+    payload = construct_query_payload(validate_search_params({
+        'search_type': 'advanced_query',
+        'query_params': {'raw_query': f"applicationNumberText:({' OR '.join(numbers)})"},
+        'pagination': {'offset': 0, 'limit': len(numbers)}
+    }))
+    payload.pop('fields', None)
+    return payload
+
+def check_status(response, description):
+    """Raise the lookup error matching an unsuccessful upstream status"""
+    if response.status_code in FATAL_STATUS_CODES:
+        raise LookupAborted(f"API error: {response.status_code} for {description}")
+    if response.status_code != 200:
+        raise LookupFailed(f"API error: {response.status_code} for {description}")
+
+def plan_lookup(numbers, cache, chunk_size=MAX_RESULTS_PER_PAGE):
+    """
+    Decide how to fetch each application number with the fewest upstream calls
+
+    Numbers whose detail response is already cached are read from it; the
+    cache is only probed, so planning counts no cache hits or misses. The
+    others are packed into searches of up to `chunk_size` numbers; a chunk of
+    a single number is fetched from the detail endpoint instead, which costs
+    the same one call and shares its cache entry with single lookups.
+
+    Returns:
+        tuple: (lists of numbers to search for, numbers to fetch details of)
+    """
+    details, remaining = [], []
+    for number in numbers:
+        if cache is not None and cache.contains(make_cache_key('GET', detail_url(number), None)):
+            details.append(number)
+        else:
+            remaining.append(number)
+    chunks = [remaining[start:start + chunk_size] for start in range(0, len(remaining), chunk_size)]
+    details.extend(chunk[0] for chunk in chunks if len(chunk) == 1)
+    return [chunk for chunk in chunks if len(chunk) > 1], details
+
+def lookup_application_numbers(values, use_cache=True, deadline=None):
+    """
+    Fetch the records of many application numbers
+
+    Args:
+        values (list): Application numbers, as bare digits or written like 16/123,456
+        use_cache (bool, optional): Set to False to bypass the response cache
+        deadline (Deadline, optional): Time budget of the lookup; started from
+            ODP_LOOKUP_DEADLINE if not given
+
+    Calls that fail leave their numbers in the report's `failed` list while the
+    records of the other calls are kept. An error every later call would hit
+    too, such as a rejected API key, an open circuit or the deadline, cancels
+    the calls not sent yet and is reported as `error`.
+
+    Returns:
+        dict: Success envelope with the records found and a report of the
+            numbers requested, found, missing, failed and invalid and the
+            upstream calls made, or failure envelope with error
+    """
+    numbers, invalid = normalize_numbers(values)
+    max_numbers = get_config_value('ODP_LOOKUP_MAX_NUMBERS', DEFAULT_LOOKUP_MAX_NUMBERS)
+    if not numbers:
+        return {'success': False, 'error': 'No valid application numbers given', 'invalid': invalid}
+    if len(numbers) > max_numbers:
+        return {'success': False, 'error': f"At most {max_numbers} application numbers can be looked up at once"}
+
+    client = get_client()
+    if not client.api_key:
+        return {'success': False, 'error': 'API key is empty or not set in config.py'}
+    deadline = deadline or Deadline(get_config_value('ODP_LOOKUP_DEADLINE', DEFAULT_LOOKUP_DEADLINE))
+    chunks, details = plan_lookup(numbers, client.cache if use_cache else None)
+    logger.info(f"Looking up {len(numbers)} application numbers with {len(chunks)} searches "
+                f"and {len(details)} detail calls")
+
+    def search_chunk(chunk):
+        payload = build_lookup_payload(chunk)
+        response = client.post(API_ENDPOINTS['patent_search'], payload, use_cache=use_cache, deadline=deadline)
+        # A 404 means none of the numbers exist
+        if response.status_code == 404:
+            return []
+        check_status(response, f"a search of {len(chunk)} applications")
+        return handle_search_response(response, payload)['data']['results']
+
+    def fetch_detail(number):
+        response = client.get(detail_url(number), use_cache=use_cache, deadline=deadline)
+        if response.status_code == 404:
+            return []
+        check_status(response, f"application {number}")
+        return response.json().get('patentFileWrapperDataBag') or []
+
+    concurrency = get_config_value('ODP_LOOKUP_CONCURRENCY', DEFAULT_LOOKUP_CONCURRENCY)
+    records, failed, error = {}, set(), None
+    # Workers run in a copy of this context so their requests count for this lookup only
+    with count_upstream_calls() as calls, \
+            ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='odp-lookup') as executor:
+        batches = {executor.submit(contextvars.copy_context().run, search_chunk, chunk): chunk
+                   for chunk in chunks}
+        batches.update({executor.submit(contextvars.copy_context().run, fetch_detail, number): [number]
+                        for number in details})
+        for batch in as_completed(batches):
+            try:
+                for record in batch.result():
+                    records.setdefault(record_number(record), record)
+            except CancelledError:
+                failed.update(batches[batch])
+            except FATAL_ERRORS as e:
+                failed.update(batches[batch])
+                if error is None:
+                    error = str(e)
+                    logger.error(f"Application number lookup aborted: {error}")
+                    for pending in batches:
+                        pending.cancel()
+            except Exception as e:
+                logger.warning(f"Lookup of {len(batches[batch])} application numbers failed: {str(e)}")
+                failed.update(batches[batch])
+
+    found = [records[number] for number in numbers if number in records]
+    missing = [number for number in numbers if number not in records and number not in failed]
+    report = {
+        'requested': len(numbers),
+        'found': len(found),
+        'missing': missing,
+        'failed': [number for number in numbers if number in failed],
+        'invalid': invalid,
+        'searches': len(chunks),
+        'detail_calls': len(details),
+        'upstream_calls': calls.count
+    }
+    if error:
+        report['error'] = error
+    logger.info(f"Found {report['found']} of {report['requested']} application numbers "
+                f"in {report['upstream_calls']} upstream calls, {len(missing)} missing, "
+                f"{len(report['failed'])} failed")
+    return {'success': True, 'data': {'results': found}, 'report': report}
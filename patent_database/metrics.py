@@ -0,0 +1,160 @@
+"""
+Prometheus metrics for upstream latency, retries, cache behaviour and search timing
+
+With several worker processes set ODP_METRICS_MULTIPROC_DIR in config.py (or the
+PROMETHEUS_MULTIPROC_DIR environment variable) to a directory shared by the
+workers and emptied when the server starts. register() passes it on through
+setup_metrics(), and each process then writes its samples there and /metrics
+adds up the samples of every process. A server that recycles workers should
+drop the samples of the ones that exit; under gunicorn, add to its config file:
+
+    from patent_database.metrics import child_exit
+
+The metrics are created on first use, so importing this module changes nothing.
+"""
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram,
+                               generate_latest, multiprocess, values)
+
+from .constants import API_ENDPOINTS, SEARCH_TYPES
+from .utils import get_config_value
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+UPSTREAM_OUTCOMES = ('200', '403', '404', '429')
+
+_metrics = None
+_metrics_lock = threading.Lock()
+
+def setup_metrics():
+    """
+    Keep the metric samples in ODP_METRICS_MULTIPROC_DIR, if set, for every process of the server
+
+    Must run before the first metric is used; a PROMETHEUS_MULTIPROC_DIR
+    already set in the environment is left alone.
+    """
+    directory = get_config_value('ODP_METRICS_MULTIPROC_DIR', None)
+    if not directory or os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        return
+    if _metrics is not None:
+        logger.warning("Metrics are already in use; ODP_METRICS_MULTIPROC_DIR is ignored")
+        return
+    os.makedirs(directory, exist_ok=True)
+    os.environ['PROMETHEUS_MULTIPROC_DIR'] = directory
+    # prometheus_client picks how samples are stored when it is imported
+    values.ValueClass = values.get_value_class()
+
+def get_metrics():
+    """The metrics of this server, created on first use"""
+    global _metrics
+
+    if _metrics is None:
+        with _metrics_lock:
+            if _metrics is None:
+                _metrics = SimpleNamespace(
+                    upstream_latency=Histogram(
+                        'odp_upstream_request_seconds', 'Latency of HTTP requests sent to the ODP API',
+                        ['endpoint', 'outcome'], buckets=LATENCY_BUCKETS),
+                    search_latency=Histogram(
+                        'patent_search_request_seconds', 'Time to answer /api/search, by search type',
+                        ['search_type'], buckets=LATENCY_BUCKETS),
+                    retries=Counter('odp_upstream_retries_total', 'Requests retried after a 429 response',
+                                    ['endpoint']),
+                    fallback_searches=Counter('patent_fallback_searches_total',
+                                              'Fallback searches run after a failed search'),
+                    alternative_searches=Counter(
+                        'patent_alternative_searches_total', 'Searches retried with alternative applicant names'),
+                    cache_lookups=Counter('odp_cache_lookups_total', 'Response cache lookups', ['result']),
+                    response_bytes=Counter('patent_response_bytes_total', 'Bytes of response bodies serialized',
+                                           ['endpoint']),
+                    rate_limiter_waiting=Gauge(
+                        'odp_rate_limiter_waiting', 'Requests waiting for the rate limiter',
+                        multiprocess_mode='livesum'),
+                )
+    return _metrics
+
+def endpoint_name(url):
+    """Name of the API_ENDPOINTS entry a URL belongs to, the longest matching prefix; 'other' if none"""
+    matches = [name for name, endpoint in API_ENDPOINTS.items() if url.startswith(endpoint)]
+    return max(matches, key=lambda name: len(API_ENDPOINTS[name]), default='other')
+
+def upstream_outcome(status_code):
+    """Outcome label of an upstream response: the status code for 200/403/404/429, else 'error' or 'other'"""
+    if status_code is None or status_code >= 500:
+        return 'error'
+    return str(status_code) if str(status_code) in UPSTREAM_OUTCOMES else 'other'
+
+def observe_upstream(url, started, status_code=None):
+    """
+    Record the latency of one upstream request
+
+    Args:
+        url (str): Requested URL
+        started (float): time.perf_counter() when the request was sent
+        status_code (int, optional): Response status; None if no response arrived
+    """
+    get_metrics().upstream_latency.labels(endpoint_name(url), upstream_outcome(status_code)).observe(
+        time.perf_counter() - started)
+
+def count_retry(url):
+    get_metrics().retries.labels(endpoint_name(url)).inc()
+
+def count_alternative_search():
+    get_metrics().alternative_searches.inc()
+
+def count_fallback_search():
+    get_metrics().fallback_searches.inc()
+
+def count_cache_lookup(result):
+    """Count a response cache lookup; result is 'hit', 'miss' or 'stale'"""
+    get_metrics().cache_lookups.labels(result).inc()
+
+def count_response_bytes(endpoint, size):
+    get_metrics().response_bytes.labels(endpoint).inc(size)
+
+@contextmanager
+def waiting_for_rate_limiter():
+    """Count the caller as queued at the rate limiter while the block runs"""
+    waiting = get_metrics().rate_limiter_waiting
+    waiting.inc()
+    try:
+        yield
+    finally:
+        waiting.dec()
+
+def observe_search(search_type, started):
+    """Record the time taken to answer one /api/search request"""
+    label = search_type if search_type in SEARCH_TYPES else 'other'
+    get_metrics().search_latency.labels(label).observe(time.perf_counter() - started)
+
+def render_metrics():
+    """
+    Current metrics in the Prometheus text format
+
+    Returns:
+        tuple: (body bytes, content type)
+    """
+    get_metrics()
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+
+def mark_worker_dead(pid):
+    """Drop the live gauge samples of a worker process that exited"""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        multiprocess.mark_process_dead(pid)
+
+def child_exit(server, worker):
+    """gunicorn server hook, called in the master when a worker exits"""
+    mark_worker_dead(worker.pid)
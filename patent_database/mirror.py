@@ -0,0 +1,311 @@
+"""
+Local SQLite mirror of patentFileWrapperDataBag records returned by the ODP API
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from .extractors import compile_extractor
+from .utils import get_config_value
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DEFAULT_MIRROR_PATH = 'instance/odp_mirror.sqlite3'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS applications (
+    application_number TEXT PRIMARY KEY,
+    record TEXT NOT NULL,
+    invention_title TEXT,
+    applicant_name TEXT,
+    inventor_names TEXT,
+    examiner_name TEXT,
+    filing_date TEXT,
+    status TEXT COLLATE NOCASE,
+    application_type TEXT COLLATE NOCASE,
+    status_date TEXT,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS applications_filing_date ON applications (filing_date);
+CREATE INDEX IF NOT EXISTS applications_status ON applications (status);
+CREATE INDEX IF NOT EXISTS applications_type ON applications (application_type);
+CREATE INDEX IF NOT EXISTS applications_status_date ON applications (status_date);
+CREATE INDEX IF NOT EXISTS applications_updated_at ON applications (updated_at);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS applications_fts USING fts5(
+    invention_title, applicant_name, inventor_names, examiner_name,
+    content='applications', content_rowid='rowid'
+);
+CREATE TRIGGER IF NOT EXISTS applications_fts_insert AFTER INSERT ON applications BEGIN
+    INSERT INTO applications_fts (rowid, invention_title, applicant_name, inventor_names, examiner_name)
+    VALUES (new.rowid, new.invention_title, new.applicant_name, new.inventor_names, new.examiner_name);
+END;
+CREATE TRIGGER IF NOT EXISTS applications_fts_delete AFTER DELETE ON applications BEGIN
+    INSERT INTO applications_fts (applications_fts, rowid, invention_title, applicant_name, inventor_names, examiner_name)
+    VALUES ('delete', old.rowid, old.invention_title, old.applicant_name, old.inventor_names, old.examiner_name);
+END;
+CREATE TRIGGER IF NOT EXISTS applications_fts_update AFTER UPDATE ON applications BEGIN
+    INSERT INTO applications_fts (applications_fts, rowid, invention_title, applicant_name, inventor_names, examiner_name)
+    VALUES ('delete', old.rowid, old.invention_title, old.applicant_name, old.inventor_names, old.examiner_name);
+    INSERT INTO applications_fts (rowid, invention_title, applicant_name, inventor_names, examiner_name)
+    VALUES (new.rowid, new.invention_title, new.applicant_name, new.inventor_names, new.examiner_name);
+END;
+"""
+
+# Indexed columns and the record fields they are filled from, first non-empty value wins
+MIRROR_COLUMNS = {
+    'application_number': ['applicationNumberText', 'applicationMetaData.applicationNumberText'],
+    'invention_title': ['applicationMetaData.inventionTitle', 'inventionTitle'],
+    'applicant_name': ['applicationMetaData.firstApplicantName', 'applicationMetaData.firstNamedApplicant'],
+    'examiner_name': ['applicationMetaData.examinerNameText'],
+    'filing_date': ['applicationMetaData.filingDate', 'filingDate'],
+    'status': ['applicationMetaData.applicationStatusDescriptionText'],
+    'application_type': ['applicationMetaData.applicationTypeLabelName'],
+    'status_date': ['applicationMetaData.applicationStatusDate'],
+}
+
+# Fields holding inventor names; all of them are indexed together
+INVENTOR_FIELDS = ['applicationMetaData.firstInventorName', 'inventorNameText']
+INVENTOR_BAG_FIELD = 'applicationMetaData.inventorBag'
+
+def get_record_columns(record):
+    """
+    Pull the indexed column values out of a search result record
+
+    Args:
+        record (dict): One record from patentFileWrapperDataBag
+
+    Returns:
+        dict: Column values, or None if the record has no application number
+    """
+    columns = {}
+    for column, fields in MIRROR_COLUMNS.items():
+        columns[column] = next((value for value in (compile_extractor(field, None)(record) for field in fields)
+                                if value not in (None, "")), None)
+    if not columns['application_number']:
+        return None
+
+    inventors = [compile_extractor(field, None)(record) for field in INVENTOR_FIELDS]
+    for inventor in compile_extractor(INVENTOR_BAG_FIELD, None)(record) or []:
+        if isinstance(inventor, dict):
+            inventors.append(inventor.get('inventorNameText'))
+    names = []
+    for value in inventors:
+        for name in (value if isinstance(value, list) else [value]):
+            if name and str(name) not in names:
+                names.append(str(name))
+    columns['inventor_names'] = '; '.join(names) or None
+    columns['application_number'] = str(columns['application_number'])
+    return columns
+
+class LocalMirror:
+    """
+    Search result records stored in SQLite, indexed for local queries
+
+    Each record is kept as returned by the API and keyed by application number;
+    a newer copy of a record is merged over the stored one. Title, applicant,
+    inventor and examiner names are full-text indexed with FTS5, and filing date,
+    status, type and status date have ordinary indexes; search() uses them when
+    the mirror is too large for LocalIndex. updated_at lets LocalIndex load only
+    what changed. Runs in WAL mode with one connection per thread, like
+    SQLiteResponseCache.
+    """
+
+    def __init__(self, path):
+        self.path = os.path.abspath(path)
+        self._local = threading.local()
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        connection = self.connect()
+        has_fts = connection.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'applications_fts'").fetchone()
+        connection.executescript(SCHEMA)
+        if not has_fts:
+            # Index the records of a mirror created while the FTS table was not part of the schema
+            connection.execute("INSERT INTO applications_fts (applications_fts) VALUES ('rebuild')")
+        logger.info(f"Using local mirror at {self.path}")
+
+    def connect(self):
+        """Get this thread's connection, opening it on first use"""
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+        return connection
+
+    def upsert(self, records):
+        """
+        Store records, merging them over stored copies of the same application
+
+        Args:
+            records (list): Records from patentFileWrapperDataBag
+
+        Returns:
+            dict: Number of records added, changed and unchanged
+        """
+        counts = {'added': 0, 'changed': 0, 'unchanged': 0}
+        incoming = {}
+        for record in records:
+            columns = get_record_columns(record)
+            if columns is None:
+                continue
+            previous = incoming.get(columns['application_number'])
+            incoming[columns['application_number']] = dict(previous, **record) if previous else record
+
+        if not incoming:
+            return counts
+
+        connection = self.connect()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            placeholders = ','.join('?' * len(incoming))
+            stored = dict(connection.execute(
+                f'SELECT application_number, record FROM applications WHERE application_number IN ({placeholders})',
+                list(incoming)
+            ).fetchall())
+
+            now = time.time()
+            for application_number, record in incoming.items():
+                if application_number in stored:
+                    record = dict(json.loads(stored[application_number]), **record)
+                serialized = json.dumps(record, sort_keys=True)
+                if stored.get(application_number) == serialized:
+                    counts['unchanged'] += 1
+                    continue
+                counts['changed' if application_number in stored else 'added'] += 1
+
+                columns = get_record_columns(record)
+                columns.update(record=serialized, updated_at=now)
+                names = ', '.join(columns)
+                updates = ', '.join(f'{name} = excluded.{name}' for name in columns if name != 'application_number')
+                connection.execute(
+                    f'INSERT INTO applications ({names}) VALUES ({", ".join("?" * len(columns))}) '
+                    f'ON CONFLICT (application_number) DO UPDATE SET {updates}',
+                    list(columns.values())
+                )
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+
+        return counts
+
+    def get(self, application_number):
+        """Get the stored record of one application, or None"""
+        row = self.connect().execute(
+            'SELECT record FROM applications WHERE application_number = ?', (str(application_number),)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def count(self):
+        """Number of stored applications"""
+        return self.connect().execute('SELECT COUNT(*) FROM applications').fetchone()[0]
+
+    def search(self, match=None, exclude=None, equals=None, ranges=None, order_by=None, offset=0, limit=50):
+        """
+        Query the stored records
+
+        Args:
+            match (str, optional): FTS5 match expression over the full-text columns
+            exclude (list, optional): FTS5 match expressions the records must not match
+            equals (dict, optional): Column name -> list of accepted values
+            ranges (dict, optional): Column name -> (from, to), either end may be None
+            order_by (list, optional): (column, 'asc' | 'desc') pairs
+            offset (int, optional): Rows to skip
+            limit (int, optional): Rows to return
+
+        Returns:
+            tuple: (total, records) with total the number of matching records
+        """
+        where, args = [], []
+        if match:
+            where.append('rowid IN (SELECT rowid FROM applications_fts WHERE applications_fts MATCH ?)')
+            args.append(match)
+        for expression in exclude or []:
+            where.append('rowid NOT IN (SELECT rowid FROM applications_fts WHERE applications_fts MATCH ?)')
+            args.append(expression)
+        for column, values in (equals or {}).items():
+            where.append(f'{column} IN ({",".join("?" * len(values))})')
+            args.extend(values)
+        for column, (value_from, value_to) in (ranges or {}).items():
+            if value_from is not None:
+                where.append(f'{column} >= ?')
+                args.append(value_from)
+            if value_to is not None:
+                where.append(f'{column} <= ?')
+                args.append(value_to)
+        where_sql = f" WHERE {' AND '.join(where)}" if where else ''
+        order_sql = ', '.join(f'{column} {direction.upper()}' for column, direction in (order_by or []))
+        order_sql = f' ORDER BY {order_sql}, application_number' if order_sql else ' ORDER BY application_number'
+
+        connection = self.connect()
+        total = connection.execute(f'SELECT COUNT(*) FROM applications{where_sql}', args).fetchone()[0]
+        rows = connection.execute(f'SELECT record FROM applications{where_sql}{order_sql} LIMIT ? OFFSET ?',
+                                  args + [limit, offset]).fetchall()
+        return total, [json.loads(row[0]) for row in rows]
+
+    def records_updated_since(self, timestamp):
+        """
+        Get the records stored or changed after a time
+
+        Args:
+            timestamp (float): Time as stored in updated_at; 0 returns every record
+
+        Returns:
+            list: (application_number, record, updated_at) tuples, oldest change first
+        """
+        rows = self.connect().execute(
+            'SELECT application_number, record, updated_at FROM applications WHERE updated_at > ? '
+            'ORDER BY updated_at', (timestamp,)
+        ).fetchall()
+        return [(application_number, json.loads(record), updated_at) for application_number, record, updated_at in rows]
+
+_mirror = None
+_mirror_pid = None
+_mirror_lock = threading.Lock()
+
+def get_mirror():
+    """
+    Get the local mirror for the current worker process
+
+    Returns:
+        LocalMirror: Mirror at ODP_MIRROR_PATH, or None if ODP_MIRROR_ENABLED is off
+    """
+    global _mirror, _mirror_pid
+
+    if not get_config_value('ODP_MIRROR_ENABLED', False):
+        return None
+
+    pid = os.getpid()
+    with _mirror_lock:
+        if _mirror is None or _mirror_pid != pid:
+            _mirror = LocalMirror(get_config_value('ODP_MIRROR_PATH', DEFAULT_MIRROR_PATH))
+            _mirror_pid = pid
+        return _mirror
+
+def mirror_search_results(response, results):
+    """
+    Store the records of a fresh search response in the local mirror, if enabled
+
+    Args:
+        response (ODPResponse): Response the records came from; cached responses are skipped
+        results (list): Records from patentFileWrapperDataBag
+    """
+    if response.from_cache or not results:
+        return
+    mirror = get_mirror()
+    if mirror is None:
+        return
+    try:
+        counts = mirror.upsert(results)
+        logger.info(f"Local mirror: {counts['added']} added, {counts['changed']} changed, "
+                    f"{counts['unchanged']} unchanged")
+    except sqlite3.Error as e:
+        logger.error(f"Failed to store search results in the local mirror: {str(e)}")
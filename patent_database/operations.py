@@ -1,18 +1,23 @@
 import requests
-import json
 import logging
 import time
-from .utils import validate_search_params, format_results_for_csv
-from .constants import API_ENDPOINTS
+from .utils import validate_search_params, format_results_for_csv, get_api_key
+from .constants import API_ENDPOINTS, COMPANY_SUFFIXES
+from .client import get_client, create_deadline
+from .mirror import mirror_search_results
+from .local_search import search_local, search_covered_locally
+from .resilience import CircuitOpenError, DeadlineExceeded
+from .alternative_search import needs_alternative_search, try_alternative_company_search
+from .query_expansion import APPLICANT_FIELD
+from .query_parser import QuerySyntaxError, parse_query, rename_fields
+from .query_rewriter import optimize_payload, matches_nothing
+from .timing import span
+from .structured_logging import LazyJSON, VERBOSE
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Constants for rate limiting
-MAX_RETRIES = 5
-RETRY_DELAY = 0.5  # seconds
-
 def run_operation(data):
     """
     Main function to process operation requests from the frontend
@@ -29,7 +34,7 @@ def run_operation(data):
     else:
         raise ValueError(f"Unknown operation type: {operation_type}")
 
-def search_patents(params):
+def search_patents(params, deadline=None):
     """
     Search patents using the USPTO ODP API
     
@@ -39,372 +44,261 @@ def search_patents(params):
             - query_params: Parameters specific to the search type
             - pagination: Offset and limit
             - sort: Sorting criteria
+            - bypass_cache: Skip the response cache and always call the API
+            - source: 'local' to answer from the local mirror without calling the API
+        deadline (Deadline, optional): Time budget shared by every upstream call of
+            this search; started from ODP_REQUEST_DEADLINE if not given
     
     Returns:
         dict: API response with search results
     """
-    # Validate search parameters
-    validated_params = validate_search_params(params)
+    if params.get('source') == 'local':
+        return search_local(params)
     
-    # Construct query based on search type
-    query_payload = construct_query_payload(validated_params)
+    deadline = deadline or create_deadline()
+    query_payload, use_cache, error_result = prepare_search(params)
+    if error_result:
+        return error_result
     
-    # Log the constructed query for debugging
-    logger.info(f"Constructed query payload: {json.dumps(query_payload, indent=2)}")
+    return run_search(query_payload, use_cache, deadline)
+
+def run_search(query_payload, use_cache=True, deadline=None):
+    """
+    Answer a payload built by prepare_search from the local mirror or the API
     
-    # Get API key
-    api_key = get_api_key()
-    if not api_key:
-        logger.error("API key is empty or not set in config.py")
-        return {
-            'success': False,
-            'error': 'API key is empty or not set in config.py',
-            'query_payload': query_payload
-        }
+    A company-name search that finds nothing is retried with alternative
+    spellings of the name.
     
-    # Log API key for debugging (mask most of it)
-    masked_key = api_key[:4] + '*' * (len(api_key) - 8) + api_key[-4:] if len(api_key) > 8 else '****'
-    logger.info(f"Using API key: {masked_key}")
+    Args:
+        query_payload (dict): Payload as returned by prepare_search
+        use_cache (bool, optional): Set to False to bypass the response cache and the mirror
+        deadline (Deadline, optional): Time budget of the search; started from
+            ODP_REQUEST_DEADLINE if not given
     
-    # Use the same URL as in the working test script
-    url = 'https://api.uspto.gov/api/v1/patent/applications/search'
+    Returns:
+        dict: API response with search results
+    """
+    deadline = deadline or create_deadline()
     
-    # Set up headers exactly like in test.py
-    headers = {
-        'X-API-KEY': api_key,
-        'Content-Type': 'application/json'
-    }
+    if matches_nothing(query_payload):
+        logger.info("Range filters of the search do not overlap. Answering without an upstream call")
+        return empty_search_result(query_payload)
     
-    # Log the request details
-    logger.info(f"Making API request to: {url}")
-    logger.info(f"Headers: {json.dumps({k: (v if k != 'X-API-KEY' else masked_key) for k, v in headers.items()})}")
-    logger.info(f"Query payload: {json.dumps(query_payload)}")
+    # Saved queries kept in sync in the local mirror answer narrower searches without an upstream call
+    if use_cache:
+        with span('local'):
+            local_result = search_covered_locally(query_payload)
+        if local_result:
+            return local_result
+    
+    url = API_ENDPOINTS['patent_search']
     
-    # Make direct request similar to test.py
     try:
         logger.info("Sending POST request to USPTO API...")
-        response = requests.post(url, headers=headers, json=query_payload)
+        response = get_client().post(url, query_payload, use_cache=use_cache, deadline=deadline)
+        search_result = handle_search_response(response, query_payload)
         
-        # Log the response status
-        logger.info(f"API response status: {response.status_code}")
-        
-        # Handle response based on status code
-        if response.status_code == 200:
-            result = response.json()
-            
-            # Handle the actual API response structure
-            results = result.get('patentFileWrapperDataBag', [])
-            result_count = len(results)
-            total_count = result.get('count', 0)
-            
-            # Add a results field for compatibility with frontend
-            result['results'] = results
-            result['metadata'] = {'total': total_count}
-            
-            logger.info(f"Retrieved {result_count} results out of {total_count} total")
+        # If no results and we're searching for a company name, try alternative formats
+        if needs_alternative_search(search_result, query_payload):
+            logger.info("No results found for company name search. Trying alternative formats...")
             
-            # If no results and we're searching for a company name, try alternative formats
-            if result_count == 0 and query_payload.get("q") and "applicationMetaData.firstNamedApplicant:" in query_payload.get("q", ""):
-                logger.info("No results found for company name search. Trying alternative formats...")
-                
-                # Try alternative search formats
-                alternative_results = try_alternative_company_search(query_payload, url, headers)
-                
-                if alternative_results and alternative_results.get('success'):
-                    logger.info(f"Alternative search successful! Found {len(alternative_results.get('data', {}).get('results', []))} results.")
-                    return alternative_results
+            # Try alternative search formats
+            with span('alternative'):
+                alternative_results = try_alternative_company_search(query_payload, url, use_cache=use_cache,
+                                                                     deadline=deadline)
             
-            # Always include the query_payload in the response for debugging
-            return {
-                'success': True,
-                'data': result,
-                'query_payload': query_payload
-            }
-        elif response.status_code == 404:
-            logger.error("No matching records found or invalid endpoint")
-            logger.error(f"Response text: {response.text}")
-            return {
-                'success': False,
-                'error': 'No matching records found or invalid endpoint',
-                'query_payload': query_payload
-            }
-        elif response.status_code == 403:
-            logger.error("API Key is invalid or unauthorized")
-            logger.error(f"Response text: {response.text}")
-            return {
-                'success': False,
-                'error': 'API Key is invalid or unauthorized',
-                'query_payload': query_payload
-            }
-        else:
-            error_message = f"API error: {response.status_code}"
-            if hasattr(response, 'text'):
-                error_message += f" - {response.text}"
-            logger.error(error_message)
-            return {
-                'success': False,
-                'error': error_message,
-                'query_payload': query_payload
-            }
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Request error: {str(e)}")
-        return {
+            if alternative_results and alternative_results.get('success'):
+                logger.info(f"Alternative search successful! Found {len(alternative_results.get('data', {}).get('results', []))} results.")
+                return alternative_results
+        
+        return search_result
+    except Exception as e:
+        return search_error_result(e, query_payload)
+
+def prepare_search(params):
+    """
+    Validate search parameters and build the query payload
+    
+    Args:
+        params (dict): Search parameters as accepted by search_patents
+    
+    Returns:
+        tuple: (query_payload, use_cache, error_result) where error_result is a
+            failure envelope if the search cannot be sent, otherwise None
+    """
+    # Validate search parameters
+    with span('validate'):
+        validated_params = validate_search_params(params)
+    
+    # Construct query based on search type
+    with span('construct'):
+        query_payload = construct_query_payload(validated_params)
+    
+    # Reject a query the API cannot parse before spending an upstream call on it
+    try:
+        parse_query(query_payload.get('q') or '*')
+    except QuerySyntaxError as e:
+        logger.warning(f"Invalid query {query_payload.get('q')}: {str(e)}")
+        return query_payload, False, {
             'success': False,
-            'error': f"Request error: {str(e)}",
+            'error': f"Invalid query syntax: {str(e)}",
             'query_payload': query_payload
         }
-    except Exception as e:
-        logger.error(f"Error in search_patents: {str(e)}")
-        return {
+    
+    # Shared client holds the API key, headers and pooled connections
+    client = get_client()
+    if not client.api_key:
+        logger.error("API key is empty or not set in config.py")
+        return query_payload, False, {
             'success': False,
-            'error': f"Connection error: {str(e)}",
+            'error': 'API key is empty or not set in config.py',
             'query_payload': query_payload
         }
+    
+    logger.info(f"Using API key: {client.masked_key}")
+    
+    # Log the request details
+    logger.info(f"Making API request to: {API_ENDPOINTS['patent_search']}")
+    
+    return query_payload, not validated_params.get('bypass_cache', False), None
+
+def empty_search_result(query_payload):
+    """Success envelope with no results, for a search that cannot match any record"""
+    return {
+        'success': True,
+        'data': {'count': 0, 'patentFileWrapperDataBag': [], 'results': [], 'metadata': {'total': 0}},
+        'query_payload': query_payload,
+        'note': "The date or value ranges of this search do not overlap, so no record can match."
+    }
 
-def try_alternative_company_search(original_payload, url, headers):
+def handle_search_response(response, query_payload, mirror=True):
     """
-    Try alternative search formats for company names
+    Turn an upstream search response into the result envelope returned to the frontend
     
     Args:
-        original_payload (dict): Original search payload
-        url (str): API endpoint URL
-        headers (dict): Request headers
-        
+        response (ODPResponse): Response from the ODP client
+        query_payload (dict): Payload that was sent
+        mirror (bool, optional): Set to False to leave the records out of the local mirror
+    
     Returns:
-        dict: Search results from the most successful alternative search
+        dict: Success envelope with data, or failure envelope with error
     """
-    # Extract the company name from the query
-    query = original_payload.get("q", "")
-    if not query or "applicationMetaData.firstNamedApplicant:" not in query:
-        return None
-    
-    # Extract the company name part
-    parts = query.split("applicationMetaData.firstNamedApplicant:")
-    if len(parts) <= 1:
-        return None
-    
-    company_part = parts[1].strip()
-    
-    # If it's part of a complex query, extract just the company name
-    if " " in company_part:
-        space_pos = company_part.find(" ")
-        if space_pos > 0:
-            company_part = company_part[:space_pos].strip()
-    
-    # Remove any surrounding quotes
-    if company_part.startswith('"') and company_part.endswith('"'):
-        company_part = company_part[1:-1]
-    
-    logger.info(f"Extracted company name for alternative search: {company_part}")
-    
-    # Create alternative search formats
-    alternative_formats = []
-    
-    # 1. Try without quotes
-    if " " in company_part:
-        alternative_formats.append(company_part)
-    
-    # 2. Try with quotes
-    if not (company_part.startswith('"') and company_part.endswith('"')):
-        alternative_formats.append(f'"{company_part}"')
-    
-    # 3. Try with wildcards
-    if " " in company_part:
-        words = company_part.split()
-        if len(words) >= 2:
-            # Try just the first word with wildcard
-            alternative_formats.append(f"{words[0]}*")
-    
-    # 4. For company names with LLC, Inc, etc., try different formats
-    company_suffixes = ['LLC', 'INC', 'CORP', 'CORPORATION', 'CO', 'LTD', 'LIMITED', 'LP', 'LLP']
-    words = company_part.upper().split()
-    
-    if words and words[-1] in company_suffixes:
-        # Try without the suffix
-        alternative_formats.append(" ".join(words[:-1]))
+    # Log the response status
+    logger.info(f"API response status: {response.status_code} "
+                f"(queued {response.queue_time:.3f}s, {response.retries} retries, cached: {response.from_cache})")
+    
+    # Handle response based on status code
+    if response.status_code == 200:
+        with span('decode'):
+            result = response.json()
         
-        # Try with different suffix formats
-        if words[-1] == "LLC":
-            alternative_formats.append(f"{' '.join(words[:-1])} L.L.C.")
-            alternative_formats.append(f"{' '.join(words[:-1])}, LLC")
-        elif words[-1] == "INC":
-            alternative_formats.append(f"{' '.join(words[:-1])} Inc.")
-            alternative_formats.append(f"{' '.join(words[:-1])}, Inc.")
-        elif words[-1] == "CORP":
-            alternative_formats.append(f"{' '.join(words[:-1])} Corporation")
-            alternative_formats.append(f"{' '.join(words[:-1])}, Corp.")
-    
-    # 5. Try a more general search using assignee field
-    alternative_formats.append(f"assigneeName:{company_part}")
-    
-    # 6. Try a more general search using just the company name without field specification
-    if len(words) > 1:
-        # For multi-word company names, try just the most distinctive word
-        # Usually the first word is the most distinctive for company names
-        alternative_formats.append(words[0])
-    
-    # Try each alternative format
-    best_result = None
-    max_results = 0
-    
-    for alt_format in alternative_formats:
-        logger.info(f"Trying alternative company name format: {alt_format}")
+        # Handle the actual API response structure
+        results = result.get('patentFileWrapperDataBag', [])
+        result_count = len(results)
+        total_count = result.get('count', 0)
         
-        # Create a new payload with the alternative format
-        alt_payload = original_payload.copy()
+        # Add a results field for compatibility with frontend
+        result['results'] = results
+        result['metadata'] = {'total': total_count}
         
-        # Replace the company name in the query
-        if "applicationMetaData.firstNamedApplicant:" in query:
-            # Special case for assigneeName field
-            if alt_format.startswith("assigneeName:"):
-                new_query = alt_format
-            # Special case for general search without field
-            elif not ":" in alt_format:
-                new_query = alt_format
-            else:
-                new_query = query.replace(f"applicationMetaData.firstNamedApplicant:{company_part}", 
-                                         f"applicationMetaData.firstNamedApplicant:{alt_format}")
-            alt_payload["q"] = new_query
+        logger.info(f"Retrieved {result_count} results out of {total_count} total")
+        if mirror:
+            mirror_search_results(response, results)
         
-        # Make the request
-        try:
-            logger.info(f"Sending alternative search request with payload: {json.dumps(alt_payload)}")
-            response = requests.post(url, headers=headers, json=alt_payload)
-            
-            if response.status_code == 200:
-                result = response.json()
-                results = result.get('patentFileWrapperDataBag', [])
-                result_count = len(results)
-                
-                logger.info(f"Alternative search returned {result_count} results")
-                
-                # Add a results field for compatibility with frontend
-                result['results'] = results
-                result['metadata'] = {'total': result.get('count', 0)}
-                
-                # Keep track of the best result
-                if result_count > max_results:
-                    max_results = result_count
-                    best_result = {
-                        'success': True,
-                        'data': result,
-                        'query_payload': alt_payload,
-                        'note': f"Used alternative company name format: {alt_format}"
-                    }
-        except Exception as e:
-            logger.error(f"Error in alternative search: {str(e)}")
-    
-    # If no results found with alternative formats, try a fallback search
-    if not best_result:
-        logger.info("No results found with alternative formats. Trying fallback search...")
-        fallback_result = try_fallback_search(original_payload, url, headers)
-        if fallback_result:
-            return fallback_result
-    
-    return best_result
+        # Always include the query_payload in the response for debugging
+        search_result = {
+            'success': True,
+            'data': result,
+            'query_payload': query_payload
+        }
+        if response.stale:
+            search_result['note'] = "The USPTO API is currently unavailable. Showing cached results."
+        return search_result
+    elif response.status_code == 404:
+        logger.error("No matching records found or invalid endpoint")
+        logger.error(f"Response text: {response.text}")
+        return {
+            'success': False,
+            'error': 'No matching records found or invalid endpoint',
+            'query_payload': query_payload
+        }
+    elif response.status_code == 403:
+        logger.error("API Key is invalid or unauthorized")
+        logger.error(f"Response text: {response.text}")
+        return {
+            'success': False,
+            'error': 'API Key is invalid or unauthorized',
+            'query_payload': query_payload
+        }
+    else:
+        error_message = f"API error: {response.status_code}"
+        if hasattr(response, 'text'):
+            error_message += f" - {response.text}"
+        logger.error(error_message)
+        return {
+            'success': False,
+            'error': error_message,
+            'query_payload': query_payload
+        }
 
-def try_fallback_search(original_payload, url, headers):
+def search_error_result(error, query_payload):
     """
-    Try a fallback search when all other searches fail
+    Build the failure envelope for an exception raised while searching
     
     Args:
-        original_payload (dict): Original search payload
-        url (str): API endpoint URL
-        headers (dict): Request headers
-        
+        error (Exception): The exception
+        query_payload (dict): Payload that was being sent
+    
     Returns:
-        dict: Search results from the fallback search
+        dict: Failure envelope
     """
-    # Create a fallback payload that searches for patents in the same date range
-    # but without the specific company name constraint
-    fallback_payload = original_payload.copy()
-    
-    # Use a wildcard search to get any patents in the date range
-    fallback_payload["q"] = "*"
-    
-    # Keep the date range filters
-    # The rangeFilters should already be in the original payload
-    
-    # Limit results to avoid overwhelming the user
-    if "pagination" in fallback_payload:
-        fallback_payload["pagination"]["limit"] = 20
-    
-    logger.info(f"Trying fallback search with payload: {json.dumps(fallback_payload)}")
-    
-    try:
-        response = requests.post(url, headers=headers, json=fallback_payload)
-        
-        if response.status_code == 200:
-            result = response.json()
-            results = result.get('patentFileWrapperDataBag', [])
-            result_count = len(results)
-            
-            logger.info(f"Fallback search returned {result_count} results")
-            
-            # Add a results field for compatibility with frontend
-            result['results'] = results
-            result['metadata'] = {'total': result.get('count', 0)}
-            
-            if result_count > 0:
-                return {
-                    'success': True,
-                    'data': result,
-                    'query_payload': fallback_payload,
-                    'note': "Used fallback search with date range only. The specific company name was not found."
-                }
-    except Exception as e:
-        logger.error(f"Error in fallback search: {str(e)}")
+    if isinstance(error, DeadlineExceeded):
+        logger.error(f"Search deadline exceeded: {str(error)}")
+        message = 'The USPTO API did not respond in time. Please try again.'
+    elif isinstance(error, CircuitOpenError):
+        logger.error(f"Circuit breaker open: {str(error)}")
+        message = 'The USPTO API is currently unavailable. Please try again shortly.'
+    elif isinstance(error, requests.exceptions.RequestException):
+        logger.error(f"Request error: {str(error)}")
+        message = f"Request error: {str(error)}"
+    else:
+        logger.error(f"Error in search_patents: {str(error)}")
+        message = f"Connection error: {str(error)}"
     
-    return None
+    return {
+        'success': False,
+        'error': message,
+        'query_payload': query_payload
+    }
 
-def make_api_request(url, payload, retry_count=0):
+def make_api_request(url, payload):
     """
-    Make an API request with retry logic for rate limiting
+    Make an API request; rate limiting and 429 retries are handled by the client
     
     Args:
         url (str): API endpoint URL
         payload (dict): Request payload
-        retry_count (int): Current retry attempt
         
     Returns:
         dict: API response data or error message
     """
     try:
-        api_key = get_api_key()
+        client = get_client()
         # Log API key for debugging (mask most of it)
-        if api_key:
-            masked_key = api_key[:4] + '*' * (len(api_key) - 8) + api_key[-4:] if len(api_key) > 8 else '****'
-            logger.info(f"Using API key: {masked_key}")
+        if client.api_key:
+            logger.info(f"Using API key: {client.masked_key}")
         else:
             logger.error("API key is empty or not set in config.py")
         
-        headers = {
-            'X-API-KEY': api_key,
-            'Content-Type': 'application/json'
-        }
-        
         # Log the full request details
         logger.info(f"Making API request to: {url}")
-        logger.info(f"Headers: {json.dumps({k: (v if k != 'X-API-KEY' else masked_key) for k, v in headers.items()})}")
         
-        response = requests.post(
-            url,
-            headers=headers,
-            json=payload,
-            allow_redirects=True
-        )
+        response = client.post(url, payload)
         
         # Log the response status and headers
-        logger.info(f"API response status: {response.status_code}")
-        logger.info(f"API response headers: {dict(response.headers)}")
-        
-        # Handle rate limiting (429 Too Many Requests)
-        if response.status_code == 429 and retry_count < MAX_RETRIES:
-            retry_count += 1
-            wait_time = RETRY_DELAY * retry_count
-            logger.warning(f"Rate limit exceeded (429). Retrying in {wait_time} seconds. Attempt {retry_count}/{MAX_RETRIES}")
-            time.sleep(wait_time)
-            return make_api_request(url, payload, retry_count)
+        logger.info(f"API response status: {response.status_code} "
+                    f"(queued {response.queue_time:.3f}s, {response.retries} retries)")
+        logger.info("API response headers: %s", response.headers, extra=VERBOSE)
         
         # Check if request was successful
         response.raise_for_status()
@@ -463,11 +357,9 @@ def format_applicant_name_for_search(applicant_name):
     # If the name contains special characters or spaces and doesn't already have quotes, add them
     if not has_quotes and (' ' in formatted_name or ',' in formatted_name or '.' in formatted_name):
         # For company names with LLC, Inc, Corp, etc., try to handle them specially
-        company_suffixes = ['LLC', 'INC', 'CORP', 'CORPORATION', 'CO', 'LTD', 'LIMITED', 'LP', 'LLP']
-        
         # Check if the name ends with a common company suffix
         name_parts = formatted_name.upper().split()
-        if name_parts and name_parts[-1] in company_suffixes:
+        if name_parts and name_parts[-1] in COMPANY_SUFFIXES:
             # Try two formats - with and without quotes
             logger.info(f"Company name detected: {formatted_name}")
             
@@ -546,7 +438,7 @@ def construct_query_payload(params):
     Returns:
         dict: API query payload
     """
-    logger.info(f"Constructing query payload from request data: {json.dumps(params, indent=2)}")
+    logger.info("Constructing query payload from request data: %s", LazyJSON(params), extra=VERBOSE)
     
     search_type = params.get('search_type')
     query_params = params.get('query_params', {})
@@ -601,7 +493,7 @@ def construct_query_payload(params):
     quick_search_criteria = []
     
     if quick_fields:
-        logger.info(f"Processing quick fields from params: {json.dumps(quick_fields)}")
+        logger.info("Processing quick fields from params: %s", LazyJSON(quick_fields), extra=VERBOSE)
         
         # Applicant name - use firstNamedApplicant consistently
         if 'applicant_name' in quick_fields and quick_fields['applicant_name']:
@@ -827,54 +719,27 @@ def construct_query_payload(params):
         if field and value:
             payload["q"] = f"{field}:({value})"
     
-    # Special case - if we already have a term that includes firstApplicantName, replace it with firstNamedApplicant
-    if payload["q"] and "applicationMetaData.firstApplicantName:" in payload["q"]:
-        logger.info("Replacing firstApplicantName with firstNamedApplicant in query")
-        payload["q"] = payload["q"].replace("applicationMetaData.firstApplicantName:", "applicationMetaData.firstNamedApplicant:")
-    
-    # Special case - if we have a direct applicant name search, format it properly
-    if payload["q"] and "applicationMetaData.firstNamedApplicant:" in payload["q"]:
-        # Extract the applicant name part
-        parts = payload["q"].split("applicationMetaData.firstNamedApplicant:")
-        if len(parts) > 1:
-            # Get the part after the field name
-            applicant_part = parts[1].strip()
-            
-            # If it's at the beginning of a complex query, extract just the name part
-            if " " in applicant_part:
-                # Find where the next condition starts
-                space_pos = applicant_part.find(" ")
-                if space_pos > 0:
-                    name_part = applicant_part[:space_pos]
-                    rest_part = applicant_part[space_pos:]
-                    
-                    # Format just the name part
-                    if not (name_part.startswith('"') and name_part.endswith('"')) and " " in name_part:
-                        formatted_name = format_applicant_name_for_search(name_part)
-                        # Reconstruct the query
-                        payload["q"] = f"applicationMetaData.firstNamedApplicant:{formatted_name}{rest_part}"
-                        logger.info(f"Reformatted applicant name in query: {payload['q']}")
-            else:
-                # It's a simple query with just the applicant name
-                if not (applicant_part.startswith('"') and applicant_part.endswith('"')) and " " in applicant_part:
-                    formatted_name = format_applicant_name_for_search(applicant_part)
-                    # Reconstruct the query
-                    payload["q"] = f"applicationMetaData.firstNamedApplicant:{formatted_name}"
-                    logger.info(f"Reformatted applicant name in query: {payload['q']}")
+    # Search firstNamedApplicant rather than firstApplicantName
+    if payload["q"]:
+        payload["q"] = rename_fields(payload["q"], {"applicationMetaData.firstApplicantName": APPLICANT_FIELD})
     
     # Final validation - ensure query term exists
     if "q" not in payload or not payload["q"]:
         payload["q"] = "*"  # Default to wildcard search if no query term
     
-    logger.info(f"Constructed API payload: {json.dumps(payload, indent=2)}")
+    # Merge duplicate filters and ranges, and move enumerated-field clauses into filters
+    payload = optimize_payload(payload)
+    
+    logger.info("Constructed API payload: %s", LazyJSON(payload), extra=VERBOSE)
     return payload
 
-def export_to_csv(params):
+def export_to_csv(params, deadline=None):
     """
     Export search results to CSV format
     
     Args:
         params (dict): Parameters including search results to export
+        deadline (Deadline, optional): Time budget of the incoming request
     
     Returns:
         dict: Success flag and CSV data
@@ -898,7 +763,7 @@ def export_to_csv(params):
             search_params['pagination']['limit'] = 100
         
         # Run the search
-        search_result = search_patents(search_params)
+        search_result = search_patents(search_params, deadline=deadline)
         
         if search_result.get('success'):
             # Get results from the patentFileWrapperDataBag field
@@ -911,7 +776,8 @@ def export_to_csv(params):
             if not results and 'patentFileWrapperDataBag' in data:
                 results = data.get('patentFileWrapperDataBag', [])
                 
-            csv_data = format_results_for_csv(results)
+            with span('csv'):
+                csv_data = format_results_for_csv(results)
             
             return {
                 'success': True,
@@ -928,11 +794,6 @@ def export_to_csv(params):
             'error': 'No results or search parameters provided for export'
         }
 
-def get_api_key():
-    """Get API key from config"""
-    from config import DevConfig
-    return getattr(DevConfig, 'ODP_API_KEY', '')
-
 def test_api_connection():
     """
     Test function to check if the USPTO API is reachable
@@ -941,16 +802,15 @@ def test_api_connection():
         dict: Status of the API connection
     """
     try:
-        api_key = get_api_key()
+        client = get_client()
         
-        if not api_key:
+        if not client.api_key:
             return {
                 'success': False,
                 'error': 'API key is not set in config.py'
             }
         
-        # Use the exact same URL and test payload from the working test script
-        test_url = 'https://api.uspto.gov/api/v1/patent/applications/search'
+        test_url = API_ENDPOINTS['patent_search']
         
         # Use a simple, known-working test payload
         test_payload = {
@@ -971,26 +831,14 @@ def test_api_connection():
             ]
         }
         
-        headers = {
-            'X-API-KEY': api_key,
-            'Content-Type': 'application/json'
-        }
-        
         logger.info(f"Testing API connection to: {test_url}")
-        logger.info(f"Test payload: {json.dumps(test_payload)}")
+        logger.info("Test payload: %s", LazyJSON(test_payload), extra=VERBOSE)
         
-        # Make a POST request to match how the working example does it
-        response = requests.post(
-            test_url,
-            headers=headers,
-            json=test_payload,
-            allow_redirects=True,
-            timeout=30
-        )
+        response = client.post(test_url, test_payload, use_cache=False)
         
         status = response.status_code
         logger.info(f"Test connection status: {status}")
-        logger.info(f"Response headers: {dict(response.headers)}")
+        logger.info("Response headers: %s", response.headers, extra=VERBOSE)
         
         if status == 200:
             # Try to parse the response
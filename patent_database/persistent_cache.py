@@ -0,0 +1,197 @@
+"""
+Persistent response cache shared by worker processes, stored in SQLite
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Only refresh an entry's access time when it is older than this, so reads rarely write
+ACCESS_UPDATE_INTERVAL = 60  # seconds
+
+# Check the total cache size after this many writes
+EVICTION_CHECK_INTERVAL = 50
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    status INTEGER NOT NULL,
+    headers TEXT NOT NULL,
+    body BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    expires_at REAL NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at);
+"""
+
+class SQLiteResponseCache:
+    """
+    Response cache in an SQLite database running in WAL mode
+
+    Survives restarts and is shared by every worker process on the host: WAL lets
+    many processes read while one writes. Bodies are zlib-compressed, every entry
+    has its own expiry time, and the least recently used entries are evicted once
+    the stored bodies exceed `max_bytes`. Expired entries are kept for another
+    `stale_ttl` seconds for serving while the upstream API is unavailable. Same
+    interface as ResponseCache; values are (status_code, headers, content) tuples.
+    """
+
+    def __init__(self, path, max_bytes=256 * 1024 * 1024, ttl=300, stale_ttl=3600):
+        self.path = os.path.abspath(path)
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.hits = 0
+        self.misses = 0
+        self._writes = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        connection = self._connect()
+        connection.executescript(SCHEMA)
+        logger.info(f"Using persistent response cache at {self.path}")
+
+    def _connect(self):
+        """Get this thread's connection, opening it on first use"""
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+        return connection
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get(self, key, allow_stale=False):
+        """
+        Look up a cached response
+
+        Args:
+            key (str): Cache key from make_cache_key
+            allow_stale (bool, optional): Also return entries past their TTL
+
+        Returns:
+            tuple: (status_code, headers, content), or None on a miss or expired entry
+        """
+        now = time.time()
+        try:
+            connection = self._connect()
+            row = connection.execute(
+                'SELECT status, headers, body, expires_at, accessed_at FROM responses WHERE key = ?',
+                (key,)
+            ).fetchone()
+            if row is None or row[3] <= now - (self.stale_ttl if allow_stale else 0):
+                self._count(False)
+                return None
+
+            if row[4] < now - ACCESS_UPDATE_INTERVAL:
+                connection.execute('UPDATE responses SET accessed_at = ? WHERE key = ?', (now, key))
+        except sqlite3.Error as e:
+            logger.error(f"Persistent cache read failed: {str(e)}")
+            self._count(False)
+            return None
+
+        self._count(True)
+        return row[0], json.loads(row[1]), zlib.decompress(row[2])
+
+    def contains(self, key):
+        """
+        Check for an entry within its TTL without counting a hit or miss
+
+        Unlike get, the entry's access time is not updated.
+
+        Args:
+            key (str): Cache key from make_cache_key
+
+        Returns:
+            bool: True if get would return the entry
+        """
+        try:
+            row = self._connect().execute(
+                'SELECT 1 FROM responses WHERE key = ? AND expires_at > ?', (key, time.time())
+            ).fetchone()
+        except sqlite3.Error as e:
+            logger.error(f"Persistent cache read failed: {str(e)}")
+            return False
+        return row is not None
+
+    def set(self, key, value, ttl=None):
+        """
+        Store a response
+
+        Args:
+            key (str): Cache key from make_cache_key
+            value (tuple): (status_code, headers, content)
+            ttl (float, optional): Overrides the default TTL in seconds
+        """
+        status_code, headers, content = value
+        body = zlib.compress(content)
+        now = time.time()
+        expires_at = now + (ttl if ttl is not None else self.ttl)
+        try:
+            self._connect().execute(
+                'INSERT OR REPLACE INTO responses (key, status, headers, body, size, expires_at, accessed_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (key, status_code, json.dumps(dict(headers)), body, len(body), expires_at, now)
+            )
+        except sqlite3.Error as e:
+            logger.error(f"Persistent cache write failed: {str(e)}")
+            return
+
+        with self._lock:
+            self._writes += 1
+            check_size = self._writes % EVICTION_CHECK_INTERVAL == 0
+        if check_size:
+            self.evict()
+
+    def evict(self):
+        """Delete entries past their stale period, then least recently used ones until under max_bytes"""
+        try:
+            connection = self._connect()
+            connection.execute('DELETE FROM responses WHERE expires_at <= ?', (time.time() - self.stale_ttl,))
+            total = connection.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+            if total <= self.max_bytes:
+                return
+
+            excess = total - self.max_bytes
+            victims = []
+            for key, size in connection.execute('SELECT key, size FROM responses ORDER BY accessed_at').fetchall():
+                victims.append((key,))
+                excess -= size
+                if excess <= 0:
+                    break
+            connection.executemany('DELETE FROM responses WHERE key = ?', victims)
+            logger.info(f"Evicted {len(victims)} entries from the persistent response cache")
+        except sqlite3.Error as e:
+            logger.error(f"Persistent cache eviction failed: {str(e)}")
+
+    def clear(self):
+        """Remove every entry"""
+        self._connect().execute('DELETE FROM responses')
+
+    def stats(self):
+        """
+        Get cache counters
+
+        Returns:
+            dict: hits and misses for this process, entries and bytes in the database
+        """
+        entries, size = self._connect().execute(
+            'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses').fetchone()
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'entries': entries, 'bytes': size}
@@ -0,0 +1,396 @@
+"""
+In-memory query engine answering search payloads from the records of the local mirror
+"""
+import bisect
+import functools
+import heapq
+import logging
+import os
+import re
+import threading
+from collections import defaultdict
+from functools import lru_cache
+
+from .mirror import get_mirror
+from .query_parser import MatchAll, Term, Range, BooleanQuery, Not, Required, iter_nodes, parse_query, value_key
+from .utils import get_config_value
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+TOKEN_PATTERN = re.compile(r'\w+')
+
+DEFAULT_LOCAL_INDEX_MAX_RECORDS = 200000
+
+# Record fields holding the same data under different names; a query on any of them searches all
+FIELD_GROUPS = [
+    ['inventionTitle', 'applicationMetaData.inventionTitle'],
+    ['applicationNumberText', 'applicationMetaData.applicationNumberText'],
+    ['filingDate', 'applicationMetaData.filingDate'],
+    ['applicationMetaData.firstNamedApplicant', 'applicationMetaData.firstApplicantName'],
+    ['applicationMetaData.firstNamedInventor', 'applicationMetaData.firstInventorName', 'inventorNameText',
+     'applicationMetaData.inventorBag.inventorNameText'],
+]
+FIELD_ALIASES = {field: group for group in FIELD_GROUPS for field in group}
+
+# Fields searched by terms without a field name
+DEFAULT_FIELDS = ['inventionTitle', 'applicationMetaData.firstNamedApplicant', 'applicationMetaData.firstNamedInventor']
+
+class LocalIndexFull(Exception):
+    """The mirror holds more records than ODP_LOCAL_INDEX_MAX_RECORDS"""
+
+def answered_exactly(node):
+    """
+    Check whether the local index gives the same answer as the API to a query tree
+
+    Terms without a field name are only searched in DEFAULT_FIELDS, where the
+    API searches every field, and proximity and boost suffixes are ignored.
+    Clauses separated by spaces only are ANDed locally, where the API may OR them.
+    """
+    for child in iter_nodes(node):
+        if isinstance(child, (Term, Range)) and (not child.field or getattr(child, 'suffix', '')):
+            return False
+        if isinstance(child, BooleanQuery) and child.operator == 'DEFAULT' and len(child.clauses) > 1:
+            return False
+    return True
+
+def project_record(record, fields):
+    """
+    Copy of a record with only the dot-separated `fields`, like the API's `fields` parameter
+
+    Nested values are shared with the record, not copied.
+    """
+    if not fields:
+        return record
+    projected = {}
+    for field in fields:
+        _copy_path(record, split_path(field), projected)
+    return projected
+
+def _copy_path(source, parts, target):
+    """Copy the value at `parts` below source into the same place below target, descending into lists"""
+    if not isinstance(source, dict) or parts[0] not in source:
+        return
+    value = source[parts[0]]
+    if len(parts) == 1:
+        target[parts[0]] = value
+    elif isinstance(value, list):
+        projected = target.setdefault(parts[0], [{} for _ in value])
+        if projected is not value:
+            for item, projected_item in zip(value, projected):
+                _copy_path(item, parts[1:], projected_item)
+    elif isinstance(value, dict):
+        projected = target.setdefault(parts[0], {})
+        if projected is not value:
+            _copy_path(value, parts[1:], projected)
+
+def tokenize(text):
+    """Lowercased word tokens of a value"""
+    return TOKEN_PATTERN.findall(str(text).lower())
+
+@lru_cache(maxsize=256)
+def split_path(path):
+    """Split a dot-separated path once"""
+    return tuple(path.split('.'))
+
+def _collect(value, parts, found):
+    """Append the scalar values at `parts` below `value` to found, descending into lists"""
+    for position, part in enumerate(parts):
+        if isinstance(value, list):
+            for item in value:
+                _collect(item, parts[position:], found)
+            return
+        if not isinstance(value, dict) or part not in value:
+            return
+        value = value[part]
+    for item in (value if isinstance(value, list) else (value,)):
+        if item is not None and item != '' and not isinstance(item, dict):
+            found.append(item)
+
+def record_values(record, paths):
+    """Scalar values found at any of the dot-separated paths, descending into lists"""
+    found = []
+    for path in paths:
+        _collect(record, split_path(path), found)
+    return found
+
+def clause_cost(node):
+    """Rough order in which to evaluate the clauses of an AND: single terms, then ranges, then the rest"""
+    if isinstance(node, Term):
+        return 0 if node.kind == 'term' and len(tokenize(node.value)) == 1 else 2
+    return 1 if isinstance(node, Range) else 3
+
+class FieldIndex:
+    """
+    Indexes of one query field over every record
+
+    An inverted index from tokens to record ids answers terms, phrases and
+    wildcards, a map of whole lowercased values answers filters, and a sorted
+    array of (value_key, id) pairs answers ranges and sorting.
+    """
+
+    def __init__(self, paths):
+        self.paths = paths
+        self.postings = defaultdict(set)
+        self.exact = defaultdict(set)
+        self.sorted = []
+        self.texts = {}
+        self.keys = {}
+
+    def build(self, records):
+        """Index a batch of (id, record) pairs, sorting once at the end"""
+        for doc_id, record in records:
+            self.add(doc_id, record, sort=False)
+        self.sorted.sort()
+
+    def add(self, doc_id, record, sort=True):
+        values = record_values(record, self.paths)
+        if not values:
+            return
+        tokens_per_value = [tokenize(value) for value in values]
+        # Tokens of each value between spaces, so a phrase is a substring of one value
+        self.texts[doc_id] = '\n'.join(f" {' '.join(tokens)} " for tokens in tokens_per_value)
+        self.keys[doc_id] = value_key(values[0])
+        for value, tokens in zip(values, tokens_per_value):
+            self.exact[str(value).lower()].add(doc_id)
+            for token in tokens:
+                self.postings[token].add(doc_id)
+            if sort:
+                bisect.insort(self.sorted, (value_key(value), doc_id))
+            else:
+                self.sorted.append((value_key(value), doc_id))
+
+    def remove(self, doc_id, record):
+        for value in record_values(record, self.paths):
+            self.exact[str(value).lower()].discard(doc_id)
+            for token in tokenize(value):
+                self.postings[token].discard(doc_id)
+            position = bisect.bisect_left(self.sorted, (value_key(value), doc_id))
+            if position < len(self.sorted) and self.sorted[position] == (value_key(value), doc_id):
+                del self.sorted[position]
+        self.texts.pop(doc_id, None)
+        self.keys.pop(doc_id, None)
+
+    def match_term(self, term, candidates=None):
+        """
+        Ids of records where the term, phrase or wildcard pattern matches
+
+        Args:
+            term (Term): Term node
+            candidates (set, optional): Only these records can match; narrows
+                the phrase check of multi-word terms
+
+        Returns:
+            set: Record ids, possibly including ids outside `candidates`
+        """
+        if term.kind == 'wildcard':
+            if term.value == '*':
+                return set(self.texts)
+            token_pattern = re.compile(re.escape(term.value.lower()).replace(r'\*', r'\w*').replace(r'\?', r'\w'))
+            value_pattern = re.compile(re.escape(term.value.lower()).replace(r'\*', '.*').replace(r'\?', '.'))
+            matches = set()
+            for token, doc_ids in self.postings.items():
+                if token_pattern.fullmatch(token):
+                    matches |= doc_ids
+            for value, doc_ids in self.exact.items():
+                if value_pattern.fullmatch(value):
+                    matches |= doc_ids
+            return matches
+
+        tokens = tokenize(term.value)
+        if not tokens:
+            return set()
+        postings = sorted((self.postings.get(token, set()) for token in tokens), key=len)
+        if candidates is not None:
+            postings.insert(0, candidates)
+        matches = set.intersection(*postings)
+        if len(tokens) == 1:
+            return matches
+        # Keep the records where the tokens appear next to each other in one value
+        phrase = f" {' '.join(tokens)} "
+        texts = self.texts
+        return {doc_id for doc_id in matches if phrase in texts[doc_id]}
+
+    def match_range(self, low, high, include_low=True, include_high=True):
+        """Ids of records with a value between low and high; either end may be None"""
+        start, end = 0, len(self.sorted)
+        if low is not None:
+            bound = (value_key(low), -1 if include_low else float('inf'))
+            start = bisect.bisect_left(self.sorted, bound)
+        if high is not None:
+            bound = (value_key(high), float('inf') if include_high else -1)
+            end = bisect.bisect_right(self.sorted, bound)
+        return {doc_id for _, doc_id in self.sorted[start:end]}
+
+    def match_values(self, values):
+        """Ids of records whose whole value is one of `values`, ignoring case"""
+        return set().union(*(self.exact.get(str(value).lower(), set()) for value in values))
+
+class LocalIndex:
+    """
+    The mirror's records held in memory, with a FieldIndex per queried field
+
+    Field indexes are built the first time a query uses the field. Records the
+    mirror stored since the last query are loaded and re-indexed before each
+    query, so the indexes follow searches and syncs without being rebuilt.
+
+    Every worker process holds its own copy of every record plus its indexes,
+    so the index refuses to load a mirror of more than
+    ODP_LOCAL_INDEX_MAX_RECORDS records; local searches then use the mirror's
+    SQLite indexes (see local_search.search_mirror_tables).
+    """
+
+    def __init__(self, mirror):
+        self.mirror = mirror
+        self.records = []
+        self.doc_ids = {}
+        self.fields = {}
+        self.loaded_until = 0
+        self.lock = threading.Lock()
+
+    def refresh(self):
+        """
+        Load the records stored or changed in the mirror since the last refresh
+
+        Raises:
+            LocalIndexFull: The records would not fit in ODP_LOCAL_INDEX_MAX_RECORDS
+        """
+        max_records = get_config_value('ODP_LOCAL_INDEX_MAX_RECORDS', DEFAULT_LOCAL_INDEX_MAX_RECORDS)
+        # Count before the first load, which would read the whole mirror
+        if not self.records and self.mirror.count() > max_records:
+            raise LocalIndexFull(f"The local mirror has more than {max_records} records "
+                                 f"(ODP_LOCAL_INDEX_MAX_RECORDS in config.py)")
+        rows = self.mirror.records_updated_since(self.loaded_until)
+        added = len({application_number for application_number, _, _ in rows} - self.doc_ids.keys())
+        if len(self.records) + added > max_records:
+            raise LocalIndexFull(f"The local mirror has more than {max_records} records "
+                                 f"(ODP_LOCAL_INDEX_MAX_RECORDS in config.py)")
+        for application_number, record, updated_at in rows:
+            self.loaded_until = max(self.loaded_until, updated_at)
+            doc_id = self.doc_ids.get(application_number)
+            if doc_id is None:
+                doc_id = self.doc_ids[application_number] = len(self.records)
+                self.records.append(record)
+            elif self.records[doc_id] == record:
+                continue
+            else:
+                for index in self.fields.values():
+                    index.remove(doc_id, self.records[doc_id])
+                self.records[doc_id] = record
+            for index in self.fields.values():
+                index.add(doc_id, record)
+
+    def field(self, name):
+        """The FieldIndex of a query field, built on first use"""
+        index = self.fields.get(name)
+        if index is None:
+            index = self.fields[name] = FieldIndex(FIELD_ALIASES.get(name, [name]))
+            index.build(enumerate(self.records))
+        return index
+
+    def evaluate(self, node, candidates=None):
+        """
+        Ids of the records matching a query tree; clauses separated by spaces only are ANDed
+
+        Args:
+            node (tuple): Query tree node
+            candidates (set, optional): Records the caller will intersect the result
+                with; the clauses of an AND are evaluated within the matches of
+                the clauses before them, cheapest first
+
+        Returns:
+            set: Record ids; only the ids in `candidates` are guaranteed to be correct
+        """
+        if isinstance(node, MatchAll):
+            return set(range(len(self.records))) if candidates is None else set(candidates)
+        if isinstance(node, Term):
+            fields = [node.field] if node.field else DEFAULT_FIELDS
+            return set().union(*(self.field(field).match_term(node, candidates) for field in fields))
+        if isinstance(node, Range):
+            return self.field(node.field or DEFAULT_FIELDS[0]).match_range(
+                node.low, node.high, node.include_low, node.include_high)
+        if isinstance(node, Required):
+            return self.evaluate(node.clause, candidates)
+        if isinstance(node, Not):
+            universe = set(range(len(self.records))) if candidates is None else candidates
+            return universe - self.evaluate(node.clause, candidates)
+        if node.operator == 'OR':
+            return set().union(*(self.evaluate(clause, candidates) for clause in node.clauses))
+        matches = candidates
+        for clause in sorted(node.clauses, key=clause_cost):
+            clause_matches = self.evaluate(clause, matches)
+            matches = clause_matches if matches is None else matches & clause_matches
+        return matches
+
+    def top(self, doc_ids, sort, count):
+        """The first `count` ids in sort order, by partial heap selection rather than a full sort"""
+        keys = [(self.field(item['field']), item.get('order') != 'asc') for item in sort or []]
+
+        def compare(first, second):
+            for index, descending in keys:
+                first_key, second_key = index.keys.get(first), index.keys.get(second)
+                if first_key == second_key:
+                    continue
+                # Records without the field come last in either direction
+                if first_key is None or second_key is None:
+                    return 1 if first_key is None else -1
+                return (first_key < second_key) - (first_key > second_key) if descending else \
+                    (first_key > second_key) - (first_key < second_key)
+            return first - second
+
+        return heapq.nsmallest(count, doc_ids, key=functools.cmp_to_key(compare))
+
+    def execute(self, payload):
+        """
+        Run a search payload against the records
+
+        Args:
+            payload (dict): Payload as returned by construct_query_payload
+
+        Returns:
+            tuple: (total, records) with records the requested page in sort order,
+                holding only the payload's `fields`
+
+        Raises:
+            QuerySyntaxError: `q` cannot be parsed
+            LocalIndexFull: The mirror holds too many records to search in memory
+        """
+        pagination = payload.get('pagination') or {}
+        offset, limit = int(pagination.get('offset', 0)), int(pagination.get('limit', 50))
+        tree = parse_query(payload.get('q') or '*')
+
+        with self.lock:
+            self.refresh()
+            doc_ids = self.evaluate(tree)
+            for payload_filter in payload.get('filters') or []:
+                doc_ids &= self.field(payload_filter['name']).match_values(payload_filter.get('value') or [])
+            for range_filter in payload.get('rangeFilters') or []:
+                doc_ids &= self.field(range_filter['field']).match_range(
+                    range_filter.get('valueFrom') or None, range_filter.get('valueTo') or None)
+            page = self.top(doc_ids, payload.get('sort'), offset + limit)[offset:]
+            return len(doc_ids), [project_record(self.records[doc_id], payload.get('fields')) for doc_id in page]
+
+_index = None
+_index_pid = None
+_index_lock = threading.Lock()
+
+def get_local_index():
+    """
+    Get the in-memory index of the local mirror for the current worker process
+
+    Returns:
+        LocalIndex: Index of the mirror, or None if ODP_MIRROR_ENABLED is off
+    """
+    global _index, _index_pid
+
+    mirror = get_mirror()
+    if mirror is None:
+        return None
+
+    pid = os.getpid()
+    with _index_lock:
+        if _index is None or _index_pid != pid or _index.mirror is not mirror:
+            _index = LocalIndex(mirror)
+            _index_pid = pid
+        return _index
@@ -0,0 +1,134 @@
+"""
+Applicant name query expansion: collapse company-name variants into one OR clause
+"""
+import re
+import logging
+from .constants import COMPANY_SUFFIXES
+from .query_parser import QuerySyntaxError, Term, parse_query, iter_nodes, transform, to_query_string
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+APPLICANT_FIELD = 'applicationMetaData.firstNamedApplicant'
+
+# Spellings of each company suffix, in the order they are added to the OR clause
+SUFFIX_SPELLINGS = {
+    'LLC': ['LLC', 'L.L.C.', ', LLC', ', L.L.C.'],
+    'INC': ['INC', 'Inc.', ', Inc.'],
+    'CORP': ['CORP', 'Corp.', 'Corporation', ', Corp.'],
+    'CORPORATION': ['CORPORATION', 'Corp.', ', Corp.'],
+    'LTD': ['LTD', 'Ltd.', 'Limited'],
+    'LIMITED': ['LIMITED', 'Ltd.'],
+    'CO': ['CO', 'Co.', 'Company']
+}
+
+def find_applicant_clause(query):
+    """
+    Find the first applicant-name clause in a query string
+
+    Args:
+        query (str): The q string of a search payload
+
+    Returns:
+        tuple: (clause node of the parsed query, company name without quotes),
+            or (None, None) if absent or the query cannot be parsed
+    """
+    try:
+        tree = parse_query(query or '')
+    except QuerySyntaxError:
+        return None, None
+    for node in iter_nodes(tree):
+        if isinstance(node, Term) and node.field == APPLICANT_FIELD:
+            return node, node.value
+    return None, None
+
+def expand_applicant_name(company_name):
+    """
+    Build the spellings of a company name that the USPTO data commonly uses
+
+    Args:
+        company_name (str): Company name without quotes, e.g. "Acme Widgets LLC"
+
+    Returns:
+        list: Unique name variants, starting with the name as given
+    """
+    words = company_name.split()
+    variants = [company_name]
+
+    suffix = words[-1].upper().rstrip('.').replace('.', '') if words else ''
+    if len(words) > 1 and suffix in COMPANY_SUFFIXES:
+        base = ' '.join(words[:-1]).rstrip(',')
+        variants.append(base)
+        for spelling in SUFFIX_SPELLINGS.get(suffix, [suffix]):
+            separator = '' if spelling.startswith(',') else ' '
+            variants.append(f"{base}{separator}{spelling}")
+
+    unique_variants = []
+    seen = set()
+    for variant in variants:
+        key = variant.upper()
+        if key not in seen:
+            seen.add(key)
+            unique_variants.append(variant)
+    return unique_variants
+
+def build_applicant_or_clause(variants):
+    """
+    Combine name variants into a single applicant clause
+
+    Args:
+        variants (list): Company name variants
+
+    Returns:
+        str: e.g. applicationMetaData.firstNamedApplicant:("A" OR "A LLC")
+    """
+    quoted = ' OR '.join('"' + variant.replace('"', '') + '"' for variant in variants)
+    return f"{APPLICANT_FIELD}:({quoted})"
+
+def replace_applicant_clause(query, clause, variants):
+    """
+    Replace an applicant clause of a query with one searching every name variant
+
+    Args:
+        query (str): The q string of a search payload
+        clause (Term): Clause node returned by find_applicant_clause for this query
+        variants (list): Company name variants
+
+    Returns:
+        str: Rewritten query
+    """
+    or_clause = parse_query(build_applicant_or_clause(variants))
+    return to_query_string(transform(parse_query(query), lambda node: or_clause if node is clause else node))
+
+def normalize_company_name(name):
+    """Uppercase a company name and drop punctuation so spellings can be compared"""
+    return ' '.join(re.sub(r'[.,]', ' ', name or '').upper().split())
+
+def annotate_matched_variants(records, variants):
+    """
+    Record which name variant matched each search result
+
+    Sets `matchedApplicantVariant` on every record whose applicant name equals one
+    of the variants once punctuation and case are ignored.
+
+    Args:
+        records (list): Records from patentFileWrapperDataBag
+        variants (list): Name variants that were searched
+
+    Returns:
+        list: Variants that matched at least one record, in search order
+    """
+    normalized = {normalize_company_name(variant): variant for variant in reversed(variants)}
+    matched = set()
+
+    for record in records:
+        metadata = record.get('applicationMetaData', {})
+        applicant = metadata.get('firstApplicantName') or metadata.get('firstNamedApplicant') or ''
+        variant = normalized.get(normalize_company_name(applicant))
+        record['matchedApplicantVariant'] = variant
+        if variant:
+            matched.add(variant)
+
+    logger.info(f"Applicant variants matched: {sorted(matched)}")
+    return [variant for variant in variants if variant in matched]
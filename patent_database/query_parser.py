@@ -0,0 +1,394 @@
+"""
+Parser for the Lucene-style `q` syntax of the ODP search API
+
+Queries are parsed into a small immutable tree that query rewriting, cache keys,
+validation and the local mirror share:
+
+    MatchAll()                                  *  or  *:*
+    Term(field, value, kind, suffix)            field:value, field:"a phrase", field:Technolog*,
+                                                "a phrase"~2 (suffix '~2'), "a phrase"^3
+    Range(field, low, high, include_low, include_high)
+                                                field:[a TO b], field:{a TO b}, field:>=a, field:<b
+    BooleanQuery(operator, clauses)             AND, OR, or DEFAULT for clauses separated by spaces only
+    Not(clause)                                 NOT clause, !clause, -clause
+    Required(clause)                            +clause
+
+A field applied to a group, e.g. field:(Design OR Plant), is pushed down onto
+the terms of the group. && and || are read as AND and OR. Values keep their escapes as written; a fuzzy or
+boost suffix on a word stays part of its value. Syntax the tree cannot hold,
+such as a boosted group or a field name as a value, is a QuerySyntaxError
+rather than being re-written into a different query.
+"""
+import re
+from collections import namedtuple
+from functools import lru_cache
+
+MatchAll = namedtuple('MatchAll', [])
+Term = namedtuple('Term', ['field', 'value', 'kind', 'suffix'], defaults=('',))
+Range = namedtuple('Range', ['field', 'low', 'high', 'include_low', 'include_high'])
+BooleanQuery = namedtuple('BooleanQuery', ['operator', 'clauses'])
+Not = namedtuple('Not', ['clause'])
+Required = namedtuple('Required', ['clause'])
+
+MATCH_ALL = MatchAll()
+
+OPERATORS = {'AND': 'AND', 'OR': 'OR', 'NOT': 'NOT', '&&': 'AND', '||': 'OR'}
+# Prefixes of a clause: prohibited (like NOT) or required
+PREFIX_OPERATORS = {'!': 'NOT', '-': 'NOT', '+': 'PLUS'}
+FIELD_PATTERN = re.compile(r'^[A-Za-z_][\w.]*$')
+RANGE_PATTERN = re.compile(r'^\s*("[^"]*"|\S+)\s+TO\s+("[^"]*"|\S+)\s*$')
+COMPARISON_PATTERN = re.compile(r'^(>=|<=|>|<)(.+)$')
+WILDCARD_PATTERN = re.compile(r'(?<!\\)[*?]')
+WORD_CHARACTER = re.compile(r'[^\W_]')
+WORD_END = ' \t\r\n()[]{}"'
+# Proximity (~N) and boost (^N) written straight after a phrase
+SUFFIX_PATTERN = re.compile(r'(?:~\d*(?:\.\d+)?|\^\d+(?:\.\d+)?)+')
+
+class QuerySyntaxError(ValueError):
+    """The query string cannot be parsed"""
+
+def tokenize(query):
+    """
+    Split a query string into (kind, value, position) tokens
+
+    Kinds are LPAREN, RPAREN, AND, OR, NOT, PLUS, PHRASE, SUFFIX, RANGE and WORD.
+    Words end after an unescaped ':', so a word ending in ':' is a field name
+    whose value is the next token. A SUFFIX token follows its PHRASE. A '!',
+    '-' or '+' starting a token is a NOT or PLUS prefix; inside a word it is
+    part of the word.
+
+    Raises:
+        QuerySyntaxError: Unterminated phrase or range, or a suffix the tree cannot hold
+    """
+    tokens, index = [], 0
+    while index < len(query):
+        char = query[index]
+        if char.isspace():
+            index += 1
+        elif char in '()':
+            tokens.append(('LPAREN' if char == '(' else 'RPAREN', char, index))
+            index += 1
+            if char == ')' and query[index:index + 1] in ('~', '^'):
+                raise QuerySyntaxError(f"Boosting or proximity on a group is not supported at position {index}")
+        elif char == '"':
+            end = index + 1
+            while end < len(query) and query[end] != '"':
+                end += 2 if query[end] == '\\' else 1
+            if end >= len(query):
+                raise QuerySyntaxError(f"Unterminated phrase at position {index}")
+            tokens.append(('PHRASE', query[index + 1:end], index))
+            index = end + 1
+            suffix = SUFFIX_PATTERN.match(query, index)
+            if suffix:
+                tokens.append(('SUFFIX', suffix.group(), index))
+                index = suffix.end()
+        elif char in '[{':
+            end = min((position for position in (query.find(']', index), query.find('}', index)) if position >= 0),
+                      default=-1)
+            if end < 0:
+                raise QuerySyntaxError(f"Unterminated range at position {index}")
+            tokens.append(('RANGE', query[index:end + 1], index))
+            index = end + 1
+            if query[index:index + 1] in ('~', '^'):
+                raise QuerySyntaxError(f"Boosting or proximity on a range is not supported at position {index}")
+        elif char in ']}':
+            raise QuerySyntaxError(f"Unexpected '{char}' at position {index}")
+        elif char in PREFIX_OPERATORS:
+            tokens.append((PREFIX_OPERATORS[char], char, index))
+            index += 1
+        else:
+            end = index
+            while end < len(query) and query[end] not in WORD_END:
+                end += 2 if query[end] == '\\' else 1
+                if query[end - 1] == ':' and query[end - 2:end] != '\\:':
+                    break
+            word = query[index:end]
+            tokens.append((OPERATORS.get(word, 'WORD'), word, index))
+            index = end
+    return tokens
+
+class _Parser:
+    """Recursive descent over the tokens: OR binds loosest, then AND and juxtaposition, then NOT and +"""
+
+    def __init__(self, query):
+        self.tokens = tokenize(query)
+        self.index = 0
+
+    def peek(self):
+        return self.tokens[self.index][0] if self.index < len(self.tokens) else None
+
+    def take(self):
+        token = self.tokens[self.index]
+        self.index += 1
+        return token
+
+    def error(self, message):
+        position = self.tokens[self.index][2] if self.index < len(self.tokens) else 'end of query'
+        return QuerySyntaxError(f"{message} at position {position}")
+
+    def parse(self):
+        if not self.tokens:
+            return MATCH_ALL
+        node = self.parse_or(None)
+        if self.peek() is not None:
+            raise self.error("Unexpected ')'")
+        return node
+
+    def parse_or(self, field):
+        clauses = [self.parse_and(field)]
+        while self.peek() == 'OR':
+            self.take()
+            clauses.append(self.parse_and(field))
+        return clauses[0] if len(clauses) == 1 else BooleanQuery('OR', tuple(clauses))
+
+    def parse_and(self, field):
+        groups = [[self.parse_unary(field)]]
+        while self.peek() not in (None, 'OR', 'RPAREN'):
+            if self.peek() == 'AND':
+                self.take()
+                groups[-1].append(self.parse_unary(field))
+            else:
+                groups.append([self.parse_unary(field)])
+        clauses = [group[0] if len(group) == 1 else BooleanQuery('AND', tuple(group)) for group in groups]
+        return clauses[0] if len(clauses) == 1 else BooleanQuery('DEFAULT', tuple(clauses))
+
+    def parse_unary(self, field):
+        kind = self.peek()
+        if kind == 'NOT':
+            self.take()
+            return Not(self.parse_unary(field))
+        if kind == 'PLUS':
+            self.take()
+            return Required(self.parse_unary(field))
+        if kind == 'LPAREN':
+            self.take()
+            if self.peek() == 'RPAREN':
+                raise self.error("Empty group")
+            node = self.parse_or(field)
+            if self.peek() != 'RPAREN':
+                raise self.error("Missing ')'")
+            self.take()
+            return node
+        if kind in ('PHRASE', 'RANGE', 'WORD'):
+            return self.parse_clause(field)
+        raise self.error("Expected a search term")
+
+    def parse_clause(self, field):
+        kind, value, _ = self.take()
+        if kind == 'WORD' and value.endswith(':') and not value.endswith('\\:'):
+            name = value[:-1]
+            if name == '*' and self.peek() == 'WORD' and self.tokens[self.index][1] == '*':
+                self.take()
+                return MATCH_ALL
+            if not FIELD_PATTERN.match(name):
+                raise self.error(f"Invalid field name {name!r}")
+            if self.peek() in ('LPAREN', 'NOT', 'PLUS'):
+                return self.parse_unary(name)
+            if self.peek() in ('PHRASE', 'RANGE', 'WORD'):
+                if self.peek() == 'WORD' and self.tokens[self.index][1].endswith(':'):
+                    raise self.error(f"Unescaped ':' in the value of field {name}")
+                kind, value, _ = self.take()
+                return self.with_suffix(make_value(kind, value, name))
+            raise self.error(f"Missing value for field {name}")
+        return self.with_suffix(make_value(kind, value, field))
+
+    def with_suffix(self, node):
+        """Attach the proximity or boost suffix following a phrase"""
+        if self.peek() == 'SUFFIX':
+            return node._replace(suffix=self.take()[1])
+        return node
+
+def make_value(kind, value, field):
+    """Build the node for one value token searched in `field` (None for the default fields)"""
+    if kind == 'PHRASE':
+        return Term(field, value, 'phrase')
+    if kind == 'RANGE':
+        match = RANGE_PATTERN.match(value[1:-1])
+        if not match:
+            raise QuerySyntaxError(f"Invalid range {value}")
+        low, high = (None if end == '*' else end.strip('"') for end in match.groups())
+        return Range(field, low, high, value[0] == '[', value[-1] == ']')
+    comparison = COMPARISON_PATTERN.match(value)
+    if comparison:
+        operator, bound = comparison.groups()
+        if operator[0] == '>':
+            return Range(field, bound, None, operator == '>=', True)
+        return Range(field, None, bound, True, operator == '<=')
+    if value == '*' and field is None:
+        return MATCH_ALL
+    return Term(field, value, 'wildcard' if WILDCARD_PATTERN.search(value) else 'term')
+
+def value_key(value):
+    """Sort key of a field value or range bound: numbers in numeric order before text, text case-insensitively"""
+    try:
+        return (0, float(value), '')
+    except (TypeError, ValueError):
+        return (1, 0, str(value).lower())
+
+@lru_cache(maxsize=1024)
+def parse_query(query):
+    """
+    Parse a `q` string into a query tree; results are cached and must not be modified
+
+    Args:
+        query (str): Lucene-style query string
+
+    Returns:
+        tuple: Root node of the query tree; an empty query is MatchAll
+
+    Raises:
+        QuerySyntaxError: The query is not valid syntax
+    """
+    return _Parser(query or '').parse()
+
+def _common_field(clauses):
+    """The field all clauses search, if they are all terms or ranges on the same field"""
+    fields = {clause.field if isinstance(clause, (Term, Range)) else None for clause in clauses}
+    return fields.pop() if len(fields) == 1 else None
+
+def to_query_string(node, field=None):
+    """
+    Serialize a query tree back into `q` syntax
+
+    Args:
+        node (tuple): Query tree node
+        field (str, optional): Field already applied by an enclosing field:( ) group
+
+    Returns:
+        str: Query string that parses to an equivalent tree
+    """
+    if isinstance(node, MatchAll):
+        return '*'
+    prefix = f"{node.field}:" if getattr(node, 'field', None) and node.field != field else ''
+    if isinstance(node, Term):
+        return prefix + (f'"{node.value}"' if node.kind == 'phrase' else node.value) + node.suffix
+    if isinstance(node, Range):
+        if node.high is None and node.low is not None and node.include_high:
+            return f"{prefix}{'>=' if node.include_low else '>'}{node.low}"
+        if node.low is None and node.high is not None and node.include_low:
+            return f"{prefix}{'<=' if node.include_high else '<'}{node.high}"
+        return (f"{prefix}{'[' if node.include_low else '{'}{node.low or '*'} TO "
+                f"{node.high or '*'}{']' if node.include_high else '}'}")
+    if isinstance(node, Not):
+        return 'NOT ' + _grouped(node.clause, field)
+    if isinstance(node, Required):
+        return '+' + _grouped(node.clause, field)
+
+    group_field = _common_field(node.clauses) if len(node.clauses) > 1 else None
+    if group_field and group_field != field:
+        return f"{group_field}:{_grouped(node, group_field)}"
+    separator = ' ' if node.operator == 'DEFAULT' else f" {node.operator} "
+    return separator.join(_grouped(clause, field) for clause in node.clauses)
+
+def _grouped(node, field):
+    """Serialize a clause, in parentheses if it is a boolean query not written as field:( )"""
+    if isinstance(node, BooleanQuery) and _common_field(node.clauses) in (None, field):
+        return f"({to_query_string(node, field)})"
+    return to_query_string(node, field)
+
+def transform(node, function):
+    """
+    Rebuild a query tree bottom-up, replacing every node with function(node)
+
+    Args:
+        node (tuple): Root node
+        function (callable): Takes a node whose children are already transformed and returns a node
+
+    Returns:
+        tuple: New root node; subtrees function leaves alone are shared with the input
+    """
+    if isinstance(node, BooleanQuery):
+        node = BooleanQuery(node.operator, tuple(transform(clause, function) for clause in node.clauses))
+    elif isinstance(node, (Not, Required)):
+        node = type(node)(transform(node.clause, function))
+    return function(node)
+
+def iter_nodes(node):
+    """Yield every node of a query tree, parents before their children"""
+    yield node
+    for child in (node.clauses if isinstance(node, BooleanQuery) else
+                  [node.clause] if isinstance(node, (Not, Required)) else []):
+        yield from iter_nodes(child)
+
+def _has_modifiers(node):
+    """True if a group has NOT or + clauses, which apply to the group rather than to an enclosing one"""
+    return any(isinstance(clause, (Not, Required)) for clause in node.clauses)
+
+def _commutes(node):
+    """
+    True if the order of a clause among space-separated ones does not matter
+
+    Words with no letters or digits, such as '&' or '|', may be operators to
+    the API, so a group holding one keeps its order.
+    """
+    return all(WORD_CHARACTER.search(child.value) for child in iter_nodes(node)
+               if isinstance(child, Term) and child.kind != 'phrase')
+
+def _normalize(node):
+    """
+    Flatten nested groups with the same operator, and sort and de-duplicate their clauses
+
+    OR and space-separated groups are only flattened into an enclosing one when
+    they have no NOT or + clauses, which would then apply to the enclosing
+    group. Space-separated groups are only sorted when every clause commutes.
+    """
+    if not isinstance(node, BooleanQuery):
+        return node
+    clauses = []
+    for clause in node.clauses:
+        if (isinstance(clause, BooleanQuery) and clause.operator == node.operator
+                and (node.operator == 'AND' or not _has_modifiers(clause))):
+            clauses.extend(clause.clauses)
+        else:
+            clauses.append(clause)
+    clauses = list(dict.fromkeys(clauses))
+    if node.operator != 'DEFAULT' or all(_commutes(clause) for clause in clauses):
+        clauses.sort(key=to_query_string)
+    return clauses[0] if len(clauses) == 1 else BooleanQuery(node.operator, tuple(clauses))
+
+@lru_cache(maxsize=1024)
+def canonical_query(query):
+    """
+    Canonical spelling of a query, for cache keys
+
+    Queries that differ only in spacing, grouping or the order of the clauses of
+    an AND/OR get the same spelling, as do space-separated clauses in a
+    different order when every one of them commutes (see _commutes).
+    Unparseable queries only have their whitespace collapsed.
+
+    Args:
+        query (str): Lucene-style query string
+
+    Returns:
+        str: Canonical query string
+    """
+    try:
+        return to_query_string(transform(parse_query(query), _normalize))
+    except QuerySyntaxError:
+        return ' '.join(query.split())
+
+def rename_fields(query, renames):
+    """
+    Rename the fields searched by a query
+
+    Args:
+        query (str): Lucene-style query string
+        renames (dict): Old field name -> new field name
+
+    Returns:
+        str: Rewritten query; the query is returned as given if no field was renamed
+            or it cannot be parsed
+    """
+    try:
+        tree = parse_query(query)
+    except QuerySyntaxError:
+        return query
+    if not any(getattr(node, 'field', None) in renames for node in iter_nodes(tree)):
+        return query
+
+    def rename(node):
+        if isinstance(node, (Term, Range)) and node.field in renames:
+            return node._replace(field=renames[node.field])
+        return node
+
+    return to_query_string(transform(tree, rename))
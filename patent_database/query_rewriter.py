@@ -0,0 +1,212 @@
+"""
+Optimization pass over query payloads before they are sent upstream
+"""
+import copy
+import logging
+
+from .constants import ENUMERATED_FIELDS
+from .query_parser import (QuerySyntaxError, MATCH_ALL, MatchAll, Term, Range, BooleanQuery,
+                           parse_query, to_query_string, transform, value_key)
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def merge_filters(filters):
+    """
+    Combine filters on the same field into one
+
+    Filters are ANDed and the values of one filter ORed, so two filters on a
+    field are merged into the values they have in common. Filters whose values
+    have nothing in common are left as they are.
+
+    Args:
+        filters (list): Payload filters, {'name': field, 'value': [values]}
+
+    Returns:
+        list: Filters with at most one per field where possible, values de-duplicated
+    """
+    merged = []
+    by_name = {}
+    for payload_filter in filters:
+        values = list(dict.fromkeys(payload_filter.get('value') or []))
+        current = by_name.get(payload_filter.get('name'))
+        if current is not None:
+            common = [value for value in current['value'] if value in values]
+            if common:
+                current['value'] = common
+                continue
+        payload_filter = dict(payload_filter, value=values)
+        by_name.setdefault(payload_filter.get('name'), payload_filter)
+        merged.append(payload_filter)
+    return merged
+
+def is_empty_range(range_filter):
+    """True if a range filter's lower end is above its upper end"""
+    value_from, value_to = range_filter.get('valueFrom'), range_filter.get('valueTo')
+    return bool(value_from and value_to and value_key(value_from) > value_key(value_to))
+
+def intersect_range(current, value_from, value_to):
+    """
+    Overlap of a range filter with [value_from, value_to]; empty ends are open
+
+    Returns:
+        dict: Narrowed copy of the range filter, or None if the ranges do not overlap
+    """
+    narrowed = dict(current)
+    if value_from and (not narrowed.get('valueFrom') or value_key(value_from) > value_key(narrowed['valueFrom'])):
+        narrowed['valueFrom'] = value_from
+    if value_to and (not narrowed.get('valueTo') or value_key(value_to) < value_key(narrowed['valueTo'])):
+        narrowed['valueTo'] = value_to
+    return None if is_empty_range(narrowed) else narrowed
+
+def merge_range_filters(range_filters):
+    """
+    Combine range filters on the same field into their intersection
+
+    Range filters that do not overlap are left as they are; see matches_nothing.
+
+    Args:
+        range_filters (list): Payload rangeFilters, {'field', 'valueFrom', 'valueTo'}
+
+    Returns:
+        list: Range filters with one per field where they overlap
+    """
+    merged = []
+    by_field = {}
+    for range_filter in range_filters:
+        current = by_field.get(range_filter.get('field'))
+        narrowed = current and intersect_range(current, range_filter.get('valueFrom'), range_filter.get('valueTo'))
+        if narrowed:
+            current.update(narrowed)
+            continue
+        range_filter = dict(range_filter)
+        by_field.setdefault(range_filter.get('field'), range_filter)
+        merged.append(range_filter)
+    return merged
+
+def matches_nothing(payload):
+    """
+    Check whether the range filters of a payload rule out every record
+
+    True for an inverted range or two ranges on one field that do not overlap,
+    e.g. filing dates in 2020 and in 2023; such a search need not be sent.
+    """
+    by_field = {}
+    for range_filter in payload.get('rangeFilters') or []:
+        if is_empty_range(range_filter):
+            return True
+        field = range_filter.get('field')
+        if field in by_field:
+            by_field[field] = intersect_range(by_field[field], range_filter.get('valueFrom'),
+                                              range_filter.get('valueTo'))
+            if by_field[field] is None:
+                return True
+        else:
+            by_field[field] = range_filter
+    return False
+
+def simplify(node):
+    """
+    Drop repeated clauses from groups and `*` from explicit AND groups; an OR with `*` in it matches everything
+
+    Clauses separated by spaces only are left with their `*`, since whether
+    they are ANDed or ORed is up to the API.
+    """
+    if not isinstance(node, BooleanQuery):
+        return node
+    if node.operator == 'OR' and MATCH_ALL in node.clauses:
+        return MATCH_ALL
+    clauses = list(dict.fromkeys(node.clauses))
+    if node.operator == 'AND':
+        clauses = [clause for clause in clauses if not isinstance(clause, MatchAll)] or [MATCH_ALL]
+    return clauses[0] if len(clauses) == 1 else BooleanQuery(node.operator, tuple(clauses))
+
+def enumerated_values(clause):
+    """The field and values of a clause that filters can express, e.g. field:(Design OR Plant); else None"""
+    terms = clause.clauses if isinstance(clause, BooleanQuery) and clause.operator == 'OR' else (clause,)
+    if not all(isinstance(term, Term) and term.kind in ('term', 'phrase') and not term.suffix for term in terms):
+        return None
+    fields = {term.field for term in terms}
+    if len(fields) != 1 or terms[0].field not in ENUMERATED_FIELDS:
+        return None
+    return terms[0].field, [term.value for term in terms]
+
+def covered_by_filters(clause, filters):
+    """
+    Check whether a filter already requires what a clause on an enumerated field asks for
+
+    Values are compared as written: filters match exact values while `q` is
+    searched, so a clause is never turned into a filter, only dropped when a
+    filter spelled the same way makes it redundant.
+    """
+    moved = enumerated_values(clause)
+    if not moved:
+        return False
+    field, values = moved
+    return any(payload_filter.get('name') == field and payload_filter.get('value')
+               and set(payload_filter['value']) <= set(values) for payload_filter in filters)
+
+def optimize_payload(payload):
+    """
+    Rewrite a query payload into a smaller, equivalent one
+
+    - merges filters on the same field and overlapping range filters on the same field
+    - drops clauses of `q` on ENUMERATED_FIELDS that a filter already requires
+    - folds range clauses of `q` into an overlapping range filter on the same field
+    - drops repeated clauses, and `*` from explicit AND groups, from `q`
+
+    Only clauses that the whole query requires (the query itself, or a clause
+    of a top-level AND) are moved out of `q`. `q` is re-written only if it
+    changed, and left alone if it cannot be parsed.
+
+    Args:
+        payload (dict): Payload as returned by construct_query_payload
+
+    Returns:
+        dict: Optimized copy of the payload
+    """
+    optimized = copy.deepcopy(payload)
+    filters = merge_filters(optimized.get('filters') or [])
+    range_filters = merge_range_filters(optimized.get('rangeFilters') or [])
+
+    try:
+        tree = parse_query(optimized.get('q') or '*')
+    except QuerySyntaxError:
+        tree = None
+
+    if tree is not None:
+        simplified = transform(tree, simplify)
+        required = (simplified.clauses if isinstance(simplified, BooleanQuery) and simplified.operator == 'AND'
+                    else (simplified,))
+        kept = []
+        ranges = {}
+        for range_filter in range_filters:
+            ranges.setdefault(range_filter.get('field'), range_filter)
+        for clause in required:
+            if covered_by_filters(clause, filters):
+                continue
+            if isinstance(clause, Range) and clause.field in ranges and clause.include_low and clause.include_high:
+                narrowed = intersect_range(ranges[clause.field], clause.low, clause.high)
+                if narrowed:
+                    ranges[clause.field].update(narrowed)
+                    continue
+            kept.append(clause)
+
+        if len(kept) != len(required) or simplified != tree:
+            if not kept:
+                rewritten = MATCH_ALL
+            else:
+                rewritten = kept[0] if len(kept) == 1 else BooleanQuery('AND', tuple(kept))
+            optimized['q'] = to_query_string(rewritten)
+
+    if 'filters' in optimized:
+        optimized['filters'] = filters
+    if 'rangeFilters' in optimized:
+        optimized['rangeFilters'] = range_filters
+
+    if optimized != payload:
+        logger.info(f"Optimized payload: q {payload.get('q')!r} -> {optimized.get('q')!r}, "
+                    f"{len(optimized.get('filters') or [])} filters, "
+                    f"{len(optimized.get('rangeFilters') or [])} range filters")
+    return optimized
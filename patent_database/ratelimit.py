@@ -0,0 +1,156 @@
+"""
+Rate limiting for USPTO ODP API calls: token buckets, Retry-After parsing and backoff
+"""
+import datetime
+import email.utils
+import json
+import logging
+import os
+import random
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows - cross-process sharing is not available
+    fcntl = None
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class TokenBucket:
+    """
+    Thread-safe token bucket shared by every request in the process
+
+    Tokens refill continuously at `rate` per second up to `capacity`. A caller
+    that finds the bucket empty reserves the next token and sleeps until it is
+    due, so waiting threads are released in arrival order instead of all at once.
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self._tokens = float(capacity)
+        self._last = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """
+        Take one token, going into debt if none are available
+
+        Returns:
+            float: Seconds the caller must wait before sending its request
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+            return max(wait, self._blocked_until - now)
+
+    def pause(self, seconds):
+        """Hold back every caller for `seconds`, e.g. after a Retry-After response"""
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+
+class FileTokenBucket(TokenBucket):
+    """
+    Token bucket whose state lives in a small file guarded by flock
+
+    Lets several worker processes on one host share a single ODP quota. Uses
+    wall-clock time because monotonic clocks are not comparable across processes.
+    """
+
+    def __init__(self, path, rate, capacity):
+        super().__init__(rate, capacity)
+        self.path = path
+
+    def _update(self, change):
+        with open(self.path, 'a+') as state_file:
+            fcntl.flock(state_file, fcntl.LOCK_EX)
+            try:
+                state_file.seek(0)
+                raw = state_file.read()
+                now = time.time()
+                state = json.loads(raw) if raw else {'tokens': self.capacity, 'last': now, 'blocked_until': 0.0}
+                state['tokens'] = min(self.capacity, state['tokens'] + (now - state['last']) * self.rate)
+                state['last'] = now
+                result = change(state, now)
+                state_file.seek(0)
+                state_file.truncate()
+                state_file.write(json.dumps(state))
+                return result
+            finally:
+                fcntl.flock(state_file, fcntl.LOCK_UN)
+
+    def reserve(self):
+        def take(state, now):
+            state['tokens'] -= 1
+            wait = -state['tokens'] / self.rate if state['tokens'] < 0 else 0.0
+            return max(wait, state['blocked_until'] - now)
+        return self._update(take)
+
+    def pause(self, seconds):
+        def block(state, now):
+            state['blocked_until'] = max(state['blocked_until'], now + seconds)
+        self._update(block)
+
+def create_rate_limiter(rate, capacity, state_file=None):
+    """
+    Create the rate limiter for this process
+
+    Args:
+        rate (float): Requests per second allowed by the ODP quota
+        capacity (float): Burst size
+        state_file (str, optional): Path used to share the bucket across processes
+
+    Returns:
+        TokenBucket: Process-local or file-backed bucket
+    """
+    if state_file:
+        if fcntl is not None:
+            logger.info(f"Sharing ODP rate limit across processes via {state_file}")
+            return FileTokenBucket(os.path.abspath(state_file), rate, capacity)
+        logger.warning("File locking is not available on this platform. Using a per-process rate limit.")
+    return TokenBucket(rate, capacity)
+
+def parse_retry_after(value):
+    """
+    Parse a Retry-After header
+
+    Args:
+        value (str): Header value, either delta-seconds or an HTTP date
+
+    Returns:
+        float or None: Seconds to wait, or None if the header is missing or invalid
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=datetime.timezone.utc)
+    return max(0.0, (retry_at - datetime.datetime.now(datetime.timezone.utc)).total_seconds())
+
+def backoff_delay(attempt, base_delay, max_delay):
+    """
+    Exponential backoff with full jitter
+
+    Args:
+        attempt (int): Zero-based retry attempt
+        base_delay (float): Delay for the first retry in seconds
+        max_delay (float): Upper bound for any single delay
+
+    Returns:
+        float: Seconds to sleep before the next attempt
+    """
+    return random.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
@@ -0,0 +1,164 @@
+"""
+Request deadlines and circuit breaking for USPTO ODP API calls
+"""
+import logging
+import threading
+import time
+from collections import deque
+
+import requests
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class DeadlineExceeded(requests.exceptions.Timeout):
+    """The time budget of the incoming request ran out before the upstream call finished"""
+
+class CircuitOpenError(requests.exceptions.RequestException):
+    """The circuit breaker is open and no cached response is available"""
+
+class Deadline:
+    """
+    Time budget for everything done on behalf of one incoming request
+
+    Created when the request arrives and passed down to every upstream call,
+    including the alternative and fallback chains, so the sum of those calls
+    cannot outlive the request.
+    """
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self):
+        """Seconds left in the budget, never negative"""
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self):
+        return self.remaining() <= 0
+
+    def check(self, action='Upstream request'):
+        """Raise DeadlineExceeded if the budget is used up"""
+        if self.expired():
+            raise DeadlineExceeded(f"{action} skipped: request deadline of {self.seconds}s exceeded")
+
+    def timeout(self, default):
+        """
+        Cap a (connect, read) timeout so it ends no later than the deadline
+
+        Args:
+            default (tuple): Default (connect, read) timeout in seconds
+
+        Returns:
+            tuple: Timeout to pass to requests
+        """
+        self.check()
+        remaining = self.remaining()
+        return tuple(min(value, remaining) for value in default)
+
+class CircuitBreaker:
+    """
+    Error-rate circuit breaker for the upstream API
+
+    Closed: requests flow and outcomes are recorded over a rolling window. Once at
+    least `min_requests` were seen and the failure rate reaches `error_threshold`,
+    the breaker opens and requests fail fast. After `recovery_timeout` seconds it
+    goes half-open and lets `half_open_max_calls` probe requests through; a
+    successful probe closes it again, a failed one re-opens it. A probe that
+    ends without an outcome (deadline, rate-limit wait, unexpected error) must
+    give its slot back with release_probe(); a slot still taken after another
+    `recovery_timeout` is freed anyway.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, error_threshold=0.5, min_requests=10, window=60,
+                 recovery_timeout=30, half_open_max_calls=1):
+        self.error_threshold = error_threshold
+        self.min_requests = min_requests
+        self.window = window
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self._state = self.CLOSED
+        self._opened_at = 0.0
+        self._probes = 0
+        self._probing_since = 0.0
+        self._outcomes = deque()
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            self._refresh_state()
+            return self._state
+
+    def _refresh_state(self):
+        now = time.monotonic()
+        if self._state == self.OPEN and now - self._opened_at >= self.recovery_timeout:
+            logger.info("Circuit breaker half-open. Probing the USPTO API")
+            self._state = self.HALF_OPEN
+            self._probes = 0
+            self._probing_since = now
+        elif (self._state == self.HALF_OPEN and self._probes
+              and now - self._probing_since >= self.recovery_timeout):
+            logger.warning("Circuit breaker probe never finished. Probing the USPTO API again")
+            self._probes = 0
+            self._probing_since = now
+
+    def allow_request(self):
+        """
+        Decide whether a request may go upstream
+
+        Returns:
+            bool: False while the breaker is open or all half-open probes are taken
+        """
+        with self._lock:
+            self._refresh_state()
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.HALF_OPEN and self._probes < self.half_open_max_calls:
+                if not self._probes:
+                    self._probing_since = time.monotonic()
+                self._probes += 1
+                return True
+            return False
+
+    def release_probe(self):
+        """Give back a half-open probe slot taken by a request that recorded no outcome"""
+        with self._lock:
+            if self._state == self.HALF_OPEN and self._probes:
+                self._probes -= 1
+
+    def record_success(self):
+        with self._lock:
+            if self._state == self.HALF_OPEN:
+                logger.info("Circuit breaker closed. USPTO API is responding again")
+                self._state = self.CLOSED
+                self._outcomes.clear()
+            self._record(True)
+
+    def record_failure(self):
+        with self._lock:
+            if self._state == self.HALF_OPEN:
+                self._open()
+                return
+            self._record(False)
+            failures = sum(1 for _, ok in self._outcomes if not ok)
+            if (self._state == self.CLOSED and len(self._outcomes) >= self.min_requests
+                    and failures / len(self._outcomes) >= self.error_threshold):
+                self._open()
+
+    def _record(self, ok):
+        now = time.monotonic()
+        self._outcomes.append((now, ok))
+        while self._outcomes and self._outcomes[0][0] < now - self.window:
+            self._outcomes.popleft()
+
+    def _open(self):
+        logger.warning(f"Circuit breaker open. Failing fast for {self.recovery_timeout} seconds")
+        self._state = self.OPEN
+        self._opened_at = time.monotonic()
+        self._outcomes.clear()
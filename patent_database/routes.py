@@ -1,17 +1,47 @@
-from flask import render_template, jsonify, request, current_app, send_file
+from flask import render_template, jsonify, request, current_app, send_file, Response, g
 from . import patent_database_bp
 from .operations import run_operation, search_patents, export_to_csv
+from .client import create_deadline
+from .export import stream_csv_export
+from .batch import check_batch, iter_search_batch, search_batch
+from .lookup import lookup_application_numbers, parse_application_numbers
+from .excel_export import build_excel_export, EXCEL_MIMETYPE
+from .metrics import render_metrics, observe_search, count_response_bytes
+from .timing import collect_timings, current_timings, span
+from .structured_logging import LazyJSON, VERBOSE
 from .constants import SEARCH_TYPES, VALID_FIELDS, FIELD_DISPLAY_NAMES, BOOLEAN_OPERATORS, API_ENDPOINTS
 import logging
 import json
 import io
 import datetime
 import re
+import time
+import functools
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+@patent_database_bp.after_request
+def count_serialized_bytes(response):
+    """Count the body size of every response that is not streamed, and report the timings of timed views"""
+    size = response.calculate_content_length()
+    if size is not None:
+        count_response_bytes(request.endpoint or 'unknown', size)
+    timings = g.pop('timings', None)
+    if timings is not None:
+        response.headers['Server-Timing'] = timings.header()
+    return response
+
+def timed(view):
+    """Time the stages of a view; the after_request hook reports them in a Server-Timing header"""
+    @functools.wraps(view)
+    def timed_view(*args, **kwargs):
+        with collect_timings() as timings:
+            g.timings = timings
+            return view(*args, **kwargs)
+    return timed_view
+
 @patent_database_bp.route('/')
 def index():
     """Render the main index page"""
@@ -29,13 +59,16 @@ def index():
                            api_key=api_key)  # Pass the API key to the template
 
 @patent_database_bp.route('/api/search', methods=['POST'])
+@timed
 def api_search():
     """API endpoint for patent search"""
+    started = time.perf_counter()
+    data = None
     try:
         data = request.get_json()
-        logger.info(f"Search request received: {json.dumps(data, indent=2)}")
+        logger.info("Search request received: %s", LazyJSON(data), extra=VERBOSE)
         
-        result = search_patents(data)
+        result = search_patents(data, deadline=create_deadline())
         
         # Log search results summary
         if result.get('success'):
@@ -49,29 +82,118 @@ def api_search():
         else:
             logger.error(f"Search failed: {result.get('error')}")
         
-        return jsonify(result)
+        # Stage timings next to the query_payload debug field, on request
+        if data.get('debug'):
+            result['timings'] = current_timings().as_dict()
+        
+        with span('serialize'):
+            return jsonify(result)
     except Exception as e:
         logger.exception(f"Exception in search API: {str(e)}")
         return jsonify({'success': False, 'error': str(e)}), 500
+    finally:
+        observe_search(data.get('search_type') if isinstance(data, dict) else None, started)
+
+@patent_database_bp.route('/api/search/batch', methods=['POST'])
+def api_search_batch():
+    """
+    API endpoint running a list of searches concurrently
+    
+    Accepts a list of search parameters, or {'searches': [...], 'stream': true}.
+    Returns the results in request order, or with ?stream=1, 'stream': true or
+    Accept: application/x-ndjson, one {"index", "result"} line per search as it finishes.
+    """
+    try:
+        data = request.get_json()
+        searches = data.get('searches') if isinstance(data, dict) else data
+        error = check_batch(searches)
+        if error:
+            return jsonify({'success': False, 'error': error}), 400
+        logger.info(f"Batch search request received with {len(searches)} searches")
+        
+        stream = (request.args.get('stream') in ('1', 'true')
+                  or (isinstance(data, dict) and data.get('stream'))
+                  or request.accept_mimetypes.best_match(['application/json', 'application/x-ndjson'])
+                  == 'application/x-ndjson')
+        if stream:
+            lines = (json.dumps({'index': index, 'result': result}) + '\n'
+                     for index, result in iter_search_batch(searches))
+            return Response(lines, mimetype='application/x-ndjson')
+        
+        return jsonify({'success': True, 'results': search_batch(searches)})
+    except Exception as e:
+        logger.exception(f"Exception in batch search API: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@patent_database_bp.route('/api/lookup', methods=['POST'])
+def api_lookup():
+    """
+    API endpoint fetching the records of many application numbers
+    
+    Accepts {'application_numbers': [...], 'use_cache': true}, or an uploaded
+    file with the numbers separated by anything. Returns the records found and a
+    report of the missing, failed and invalid numbers and the upstream calls made.
+    """
+    try:
+        if 'file' in request.files:
+            text = request.files['file'].read().decode('utf-8', errors='replace')
+            numbers = parse_application_numbers(text)
+            use_cache = request.form.get('use_cache', 'true').lower() != 'false'
+        else:
+            data = request.get_json(silent=True) or {}
+            numbers = data.get('application_numbers') if isinstance(data, dict) else data
+            use_cache = data.get('use_cache', True) if isinstance(data, dict) else True
+        if not isinstance(numbers, list):
+            return jsonify({'success': False, 'error': "Send {'application_numbers': [...]} or upload a file"}), 400
+        logger.info(f"Lookup request received with {len(numbers)} application numbers")
+        
+        result = lookup_application_numbers(numbers, use_cache=use_cache)
+        return jsonify(result), 200 if result.get('success') else 400
+    except Exception as e:
+        logger.exception(f"Exception in lookup API: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
 
 @patent_database_bp.route('/api/export-csv', methods=['POST'])
+@timed
 def api_export_csv():
     """API endpoint to export search results to CSV"""
     try:
         data = request.get_json()
         logger.info("CSV export request received")
         
-        result = export_to_csv(data)
+        # Set headers for file download
+        now = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        filename = f"patent_search_results_{now}.csv"
+        
+        # Excel workbook of every page of the search, as requested by the Export to Excel button
+        if data.get('format') == 'excel':
+            result = build_excel_export(data)
+            if not result.get('success'):
+                return jsonify({'success': False, 'error': result.get('error')}), 400
+            
+            return send_file(result['excel_file'],
+                             as_attachment=True,
+                             download_name=filename.replace('.csv', '.xlsx'),
+                             mimetype=EXCEL_MIMETYPE)
+        
+        # Stream every page of the search instead of the first 100 results
+        if data.get('all_pages'):
+            result = stream_csv_export(data)
+            if not result.get('success'):
+                return jsonify({'success': False, 'error': result.get('error')}), 400
+            
+            return Response(result['csv_stream'],
+                            mimetype='text/csv',
+                            headers={'Content-Disposition': f'attachment; filename={filename}',
+                                     'X-Total-Count': str(result['total'])})
+        
+        result = export_to_csv(data, deadline=create_deadline())
         
         if not result.get('success'):
             return jsonify({'success': False, 'error': result.get('error')}), 400
         
         # Create an in-memory file-like object
-        buffer = io.StringIO(result.get('csv_data', ''))
-        
-        # Set headers for file download
-        now = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"patent_search_results_{now}.csv"
+        buffer = io.BytesIO(result.get('csv_data', '').encode('utf-8'))
         
         return send_file(buffer, 
                         as_attachment=True,
@@ -103,13 +225,13 @@ def api_preview_query():
             logger.error("No data received in preview-query request")
             return jsonify({'success': False, 'error': 'No data received'}), 400
             
-        logger.info(f"Preview query request received: {json.dumps(data, indent=2)}")
+        logger.info("Preview query request received: %s", LazyJSON(data), extra=VERBOSE)
         
         # Validate the parameters
         from .utils import validate_search_params
         try:
             validated_params = validate_search_params(data)
-            logger.info(f"Parameters validated successfully: {json.dumps(validated_params, indent=2)}")
+            logger.info("Parameters validated successfully: %s", LazyJSON(validated_params), extra=VERBOSE)
         except Exception as e:
             logger.error(f"Parameter validation failed: {str(e)}")
             return jsonify({'success': False, 'error': f'Parameter validation failed: {str(e)}'}), 400
@@ -117,7 +239,7 @@ def api_preview_query():
         # Construct the query payload
         try:
             query_payload = construct_query_payload(validated_params)
-            logger.info(f"Query payload constructed: {json.dumps(query_payload, indent=2)}")
+            logger.info("Query payload constructed: %s", LazyJSON(query_payload), extra=VERBOSE)
         except Exception as e:
             logger.error(f"Query payload construction failed: {str(e)}")
             return jsonify({'success': False, 'error': f'Query payload construction failed: {str(e)}'}), 400
@@ -174,7 +296,7 @@ def api_find_similar():
     """API endpoint to find similar patents"""
     try:
         data = request.get_json()
-        logger.info(f"Similar patent request received: {json.dumps(data, indent=2)}")
+        logger.info("Similar patent request received: %s", LazyJSON(data), extra=VERBOSE)
         
         patent_number = data.get('patent_number')
         title = data.get('title')
@@ -215,10 +337,15 @@ def api_find_similar():
         }
         
         # Perform the search
-        from .operations import search_patents
-        result = search_patents(search_params)
+        result = search_patents(search_params, deadline=create_deadline())
         
         return jsonify(result)
     except Exception as e:
         logger.exception(f"Exception in find similar patents API: {str(e)}")
         return jsonify({'success': False, 'error': str(e)}), 500
+
+@patent_database_bp.route('/metrics')
+def metrics():
+    """Prometheus metrics of this server, summed over worker processes"""
+    body, content_type = render_metrics()
+    return Response(body, headers={'Content-Type': content_type})
@@ -0,0 +1,69 @@
+"""
+Coalescing of identical concurrent upstream requests
+"""
+import threading
+
+class _Call:
+    """An in-flight call that other callers can wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight:
+    """
+    Run at most one call per key at a time
+
+    The first caller for a key runs the function; callers arriving with the same
+    key while it is running wait for it and receive the same result (or exception).
+    `deduplicated` counts the calls that were served this way.
+    """
+
+    def __init__(self):
+        self.deduplicated = 0
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, function, timeout=None):
+        """
+        Run `function` for `key`, or wait for the identical call already running
+
+        Args:
+            key (str): Identifies identical calls, e.g. a cache key
+            function (callable): Called with no arguments by the first caller
+            timeout (float, optional): Longest time to wait for another caller's call
+
+        Returns:
+            tuple: (result, shared) where shared is True if another caller made the call
+
+        Raises:
+            TimeoutError: The identical call did not finish within `timeout`
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+            else:
+                self.deduplicated += 1
+
+        if not leader:
+            if not call.done.wait(timeout):
+                raise TimeoutError(f"Timed out waiting for in-flight call {key}")
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = function()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+        return call.result, False
@@ -0,0 +1,133 @@
+"""
+Logging set-up that keeps payload dumps and log output off the request path
+
+- LazyJSON defers json.dumps of a payload until a record using it is emitted,
+  so nothing is serialized when the level is disabled
+- records logged with extra=VERBOSE (payload and header dumps) are kept at the
+  ODP_LOG_SAMPLE_RATE of config.py
+- records are put on a queue and formatted and written by a background thread,
+  as JSON lines when ODP_LOG_JSON is set
+
+Only the patent_database logger is configured, so the logging of a host app
+that registers the blueprint is left alone.
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+from logging.handlers import QueueHandler, QueueListener
+
+from .utils import get_config_value
+
+DEFAULT_LOG_SAMPLE_RATE = 1.0
+
+# Pass as extra= to mark a verbose record that may be sampled away
+VERBOSE = {'verbose': True}
+
+class LazyJSON:
+    """Log argument serialized with json.dumps only when the message is built"""
+    __slots__ = ('value', 'indent')
+
+    def __init__(self, value, indent=None):
+        self.value = value
+        self.indent = indent
+
+    def __str__(self):
+        return json.dumps(self.value, indent=self.indent, default=str)
+
+class SampleFilter(logging.Filter):
+    """Keep every record not marked verbose, and verbose records at `rate` (0 to 1)"""
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        return not getattr(record, 'verbose', False) or random.random() < self.rate
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line with the time, level, logger, process, message and exception"""
+
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'process': record.process,
+            'message': record.getMessage()
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+class BackgroundQueueHandler(QueueHandler):
+    """
+    Hand records to a QueueListener thread as they are
+
+    Building the message (and serializing LazyJSON arguments), formatting and
+    writing the line all happen on the listener thread, so arguments must not
+    be modified after they are logged.
+    """
+
+    def prepare(self, record):
+        return record
+
+PACKAGE_LOGGER = 'patent_database'
+
+_handler = None
+_listener = None
+
+def setup_logging():
+    """
+    Route the patent_database logger through a background queue; safe to call more than once
+
+    The logger's level is LOG_LEVEL of config.py. Its records reach the root
+    logger's handlers too only when ODP_LOG_PROPAGATE is set.
+    """
+    global _handler
+
+    if _handler is not None:
+        return
+
+    _handler = BackgroundQueueHandler(queue.SimpleQueue())
+    _handler.addFilter(SampleFilter(get_config_value('ODP_LOG_SAMPLE_RATE', DEFAULT_LOG_SAMPLE_RATE)))
+
+    package_logger = logging.getLogger(PACKAGE_LOGGER)
+    package_logger.addHandler(_handler)
+    package_logger.setLevel(get_config_value('LOG_LEVEL', 'INFO'))
+    package_logger.propagate = get_config_value('ODP_LOG_PROPAGATE', False)
+
+    _start_listener()
+    atexit.register(_stop_listener)
+    os.register_at_fork(after_in_child=_restart_listener)
+
+def _start_listener():
+    global _listener
+
+    output = logging.StreamHandler()
+    output.setFormatter(JSONFormatter() if get_config_value('ODP_LOG_JSON', False)
+                        else logging.Formatter('%(levelname)s:%(name)s:%(message)s'))
+    _listener = QueueListener(_handler.queue, output)
+    _listener.start()
+
+def _stop_listener():
+    """Write out the queued records and stop the listener thread"""
+    global _listener
+
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+def _restart_listener():
+    """
+    Start a new queue and listener in a forked worker
+
+    The listener thread does not survive fork, and the inherited queue may hold
+    the parent's records or a lock taken at the time of the fork.
+    """
+    _handler.queue = queue.SimpleQueue()
+    _start_listener()
@@ -0,0 +1,222 @@
+"""
+Incremental sync of saved searches into the local mirror
+"""
+import copy
+import datetime
+import json
+import logging
+import time
+
+from .client import count_upstream_calls
+from .constants import MAX_RESULTS_PER_PAGE
+from .export import open_payload_pages
+from .lookup import record_number
+from .mirror import get_mirror
+from .operations import prepare_search
+from .resilience import Deadline
+from .utils import get_config_value
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DEFAULT_SYNC_DEADLINE = 1800
+DEFAULT_SYNC_WINDOW_ROWS = 5000
+
+# Records are fetched in order of this field, and the watermark is its highest synced value
+WATERMARK_FIELD = 'applicationMetaData.applicationStatusDate'
+# Second sort field, so records sharing a status date keep one order between windows
+NUMBER_FIELD = 'applicationNumberText'
+
+SYNC_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sync_queries (
+    name TEXT PRIMARY KEY,
+    params TEXT NOT NULL,
+    watermark TEXT,
+    resume_since TEXT,
+    resume_number TEXT,
+    resume_max_date TEXT,
+    last_run TEXT
+);
+"""
+
+class SyncError(Exception):
+    """A sync could not be started or did not finish"""
+
+def _connect():
+    """Get the mirror's connection with the sync table created"""
+    mirror = get_mirror()
+    if mirror is None:
+        raise SyncError('The local mirror is not enabled (ODP_MIRROR_ENABLED in config.py)')
+    connection = mirror.connect()
+    connection.executescript(SYNC_SCHEMA)
+    return mirror, connection
+
+def save_query(name, params):
+    """
+    Save a search to be synced under `name`, keeping its watermark if it already exists
+
+    Args:
+        name (str): Name of the saved query
+        params (dict): Search parameters as accepted by search_patents
+    """
+    _, _, error_result = prepare_search(copy.deepcopy(params))
+    if error_result:
+        raise SyncError(error_result.get('error'))
+
+    _, connection = _connect()
+    connection.execute(
+        'INSERT INTO sync_queries (name, params) VALUES (?, ?) '
+        'ON CONFLICT (name) DO UPDATE SET params = excluded.params',
+        (name, json.dumps(params, sort_keys=True))
+    )
+
+def list_queries():
+    """
+    List the saved queries
+
+    Returns:
+        list: One dict per query with its name, params, watermark, the application
+            number an unfinished run resumes after and the last run
+    """
+    _, connection = _connect()
+    rows = connection.execute(
+        'SELECT name, params, watermark, resume_number, last_run FROM sync_queries ORDER BY name'
+    ).fetchall()
+    return [
+        {
+            'name': name,
+            'params': json.loads(params),
+            'watermark': watermark,
+            'resume_number': resume_number,
+            'last_run': json.loads(last_run) if last_run else None
+        }
+        for name, params, watermark, resume_number, last_run in rows
+    ]
+
+def build_sync_payload(params, since):
+    """
+    Build the payload fetching the records of a saved search changed since a date
+
+    Args:
+        params (dict): Saved search parameters
+        since (str): Status date, inclusive; None fetches everything
+
+    Returns:
+        dict: Query payload sorted by WATERMARK_FIELD, oldest change first, then NUMBER_FIELD
+    """
+    query_payload, _, error_result = prepare_search(copy.deepcopy(params))
+    if error_result:
+        raise SyncError(error_result.get('error'))
+
+    range_filters = [rf for rf in query_payload.get('rangeFilters') or [] if rf.get('field') != WATERMARK_FIELD]
+    if since:
+        range_filters.append({
+            'field': WATERMARK_FIELD,
+            'valueFrom': since,
+            'valueTo': datetime.date.today().isoformat()
+        })
+    query_payload['rangeFilters'] = range_filters
+    query_payload['sort'] = [{'field': WATERMARK_FIELD, 'order': 'asc'}, {'field': NUMBER_FIELD, 'order': 'asc'}]
+    query_payload['pagination'] = {'offset': 0, 'limit': MAX_RESULTS_PER_PAGE}
+    return query_payload
+
+def sync_key(record):
+    """(status date, application number) of a record, the order a sync run goes through them in"""
+    return (record.get('applicationMetaData') or {}).get('applicationStatusDate') or '', record_number(record)
+
+def run_sync(name, deadline=None):
+    """
+    Fetch the records of a saved query changed since its watermark into the local mirror
+
+    Each run asks only for records whose status date is on or after the
+    watermark, oldest first, in windows of at most ODP_SYNC_WINDOW_ROWS rows
+    whose pages are fetched concurrently like the exports. Every window after
+    the first starts again at the status date of the last record synced and
+    skips the records up to it, so rows that move while a run is paused are
+    not stepped over the way an offset would. Progress is saved after every
+    page, so a run that fails or runs out of time resumes after the last
+    record it synced; the watermark moves forward only once a run has seen
+    every window. Records at the watermark date itself are fetched again on
+    the next run, which the mirror counts as unchanged, so runs are idempotent.
+
+    Args:
+        name (str): Name of the saved query
+        deadline (Deadline, optional): Time budget; defaults to ODP_SYNC_DEADLINE
+
+    Returns:
+        dict: Rows added, changed and unchanged, upstream calls made and the new watermark
+
+    Raises:
+        SyncError: The query does not exist, the mirror is disabled, more records
+            than a window share one status date, or the run failed
+    """
+    mirror, connection = _connect()
+    row = connection.execute(
+        'SELECT params, watermark, resume_since, resume_number, resume_max_date FROM sync_queries WHERE name = ?',
+        (name,)
+    ).fetchone()
+    if row is None:
+        raise SyncError(f"No saved query named {name}")
+
+    params, watermark, resume_since, resume_number, max_date = row
+    if resume_number is None:
+        since, cursor, max_date = watermark, None, watermark
+    else:
+        since, cursor = resume_since, (resume_since, resume_number)
+        logger.info(f"Resuming sync of {name} after application {resume_number} of {resume_since}")
+
+    deadline = deadline or Deadline(get_config_value('ODP_SYNC_DEADLINE', DEFAULT_SYNC_DEADLINE))
+    window_rows = get_config_value('ODP_SYNC_WINDOW_ROWS', DEFAULT_SYNC_WINDOW_ROWS)
+    params = json.loads(params)
+    report = {'name': name, 'added': 0, 'changed': 0, 'unchanged': 0, 'since': since, 'windows': 0}
+
+    def save_progress(**columns):
+        assignments = ', '.join(f'{column} = ?' for column in columns)
+        connection.execute(f'UPDATE sync_queries SET {assignments} WHERE name = ?', [*columns.values(), name])
+
+    # Counts only this run's requests, not those of searches running at the same time
+    with count_upstream_calls() as calls:
+        try:
+            while True:
+                window_since = cursor[0] if cursor else since
+                # Records go through mirror.upsert below so they are only counted once
+                payload = build_sync_payload(params, window_since)
+                pages, total, error_result = open_payload_pages(payload, use_cache=False, max_rows=window_rows,
+                                                                deadline=deadline, mirror=False)
+                if error_result:
+                    raise SyncError(error_result.get('error'))
+                report['windows'] += 1
+                report.setdefault('total', total)
+
+                rows = 0
+                for page in pages:
+                    rows += len(page)
+                    records = [record for record in page if cursor is None or sync_key(record) > cursor]
+                    if not records:
+                        continue
+                    for key, count in mirror.upsert(records).items():
+                        report[key] += count
+                    cursor = max(sync_key(record) for record in records)
+                    if cursor[0] and (max_date is None or cursor[0] > max_date):
+                        max_date = cursor[0]
+                    save_progress(resume_since=cursor[0], resume_number=cursor[1], resume_max_date=max_date)
+
+                if rows >= total:
+                    break
+                if cursor is None or cursor[0] == window_since:
+                    raise SyncError(f"More than {window_rows} records have status date {window_since}; "
+                                    f"raise ODP_SYNC_WINDOW_ROWS")
+        except Exception as e:
+            report['upstream_calls'] = calls.count
+            report['error'] = str(e)
+            save_progress(last_run=json.dumps(dict(report, finished_at=time.time())))
+            logger.error(f"Sync of {name} stopped after {cursor}: {str(e)}")
+            raise SyncError(str(e)) from e
+
+    report.update(upstream_calls=calls.count, watermark=max_date)
+    save_progress(watermark=max_date, resume_since=None, resume_number=None, resume_max_date=None,
+                  last_run=json.dumps(dict(report, finished_at=time.time())))
+    logger.info(f"Synced {name}: {report['added']} added, {report['changed']} changed, "
+                f"{report['unchanged']} unchanged in {report['upstream_calls']} upstream calls")
+    return report
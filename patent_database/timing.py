@@ -0,0 +1,74 @@
+"""
+Per-request timing of the stages of a search, for Server-Timing headers and the `timings` debug field
+"""
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+_current = contextvars.ContextVar('odp_timings', default=None)
+
+class Timings:
+    """
+    Milliseconds spent in each stage of one incoming request
+
+    Stages entered more than once add up, also when they ran concurrently (the
+    pages or alternative searches fetched in parallel), so their sum can exceed
+    the total. Those spans are added from several threads, hence the lock.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.spans = {}
+        self._lock = threading.Lock()
+
+    def add(self, name, seconds):
+        with self._lock:
+            self.spans[name] = self.spans.get(name, 0.0) + seconds * 1000
+
+    def total(self):
+        return (time.perf_counter() - self.started) * 1000
+
+    def as_dict(self):
+        """Stage durations in milliseconds, in the order the stages were first entered, and the total so far"""
+        with self._lock:
+            timings = {name: round(duration, 1) for name, duration in self.spans.items()}
+        timings['total'] = round(self.total(), 1)
+        return timings
+
+    def header(self):
+        """Value of a Server-Timing header, e.g. `validate;dur=0.2, upstream;dur=412.7, total;dur=430.1`"""
+        return ', '.join(f"{name};dur={duration:.1f}" for name, duration in self.as_dict().items())
+
+@contextmanager
+def collect_timings():
+    """Time the stages run inside the block; yields the Timings they are added to"""
+    timings = Timings()
+    token = _current.set(timings)
+    try:
+        yield timings
+    finally:
+        _current.reset(token)
+
+def current_timings():
+    """Timings of the request being timed, or None"""
+    return _current.get()
+
+@contextmanager
+def span(name):
+    """Add the time the block takes to stage `name` of the request being timed, if any"""
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(name, time.perf_counter() - started)
+
+def record_span(name, seconds):
+    """Add a duration measured elsewhere to stage `name` of the request being timed, if any"""
+    timings = _current.get()
+    if timings is not None:
+        timings.add(name, seconds)
@@ -0,0 +1,180 @@
+"""
+Record/replay transport under the ODP client, for reproducing upstream traffic offline
+
+In record mode every upstream request and its response (status, headers, body,
+latency) is appended to a cassette; in replay mode responses are served from
+the cassette without network access. A cassette is a file of gzip members,
+each holding one JSON interaction, so a recording cut short stays readable.
+
+Interactions are matched on method, URL path and the canonical request payload,
+so a cassette recorded against api.uspto.gov replays against any host. Requests
+repeated in the recording are answered in recorded order; once they run out the
+last response is served again.
+"""
+import base64
+import gzip
+import json
+import logging
+import os
+import threading
+import time
+from urllib.parse import urlsplit, parse_qsl
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+from .cache import make_cache_key
+from .utils import get_config_value
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DEFAULT_CASSETTE_PATH = 'instance/odp_cassette.jsonl.gz'
+CASSETTE_MODES = ('record', 'replay')
+
+# Headers describing the wire encoding; the recorded body is already decoded
+ENCODING_HEADERS = ('content-encoding', 'content-length', 'transfer-encoding')
+
+class CassetteMiss(LookupError):
+    """The cassette holds no response for a request"""
+
+class Cassette:
+    """
+    Upstream interactions recorded to, or replayed from, a compressed file
+
+    Args:
+        path (str): Cassette file
+        mode (str): 'record' or 'replay'
+        latency_scale (float, optional): Replayed responses are delayed by their
+            recorded latency times this factor; 0 answers immediately
+    """
+
+    def __init__(self, path, mode, latency_scale=0.0):
+        if mode not in CASSETTE_MODES:
+            raise ValueError(f"Cassette mode must be one of {CASSETTE_MODES}, not {mode!r}")
+        self.path = path
+        self.mode = mode
+        self.latency_scale = latency_scale
+        self.lock = threading.Lock()
+        self.interactions = {}
+        self.positions = {}
+        if mode == 'replay':
+            self.load()
+        elif os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    @staticmethod
+    def key(method, url, body):
+        """Match key of a request: method, URL path and canonical JSON body or query parameters"""
+        parts = urlsplit(url)
+        if body:
+            payload = json.loads(body)
+        else:
+            payload = dict(parse_qsl(parts.query)) or None
+        return make_cache_key(method, parts.path, payload)
+
+    def load(self):
+        with gzip.open(self.path, 'rt', encoding='utf-8') as file:
+            for line in file:
+                interaction = json.loads(line)
+                self.interactions.setdefault(interaction['key'], []).append(interaction)
+        logger.info(f"Loaded {sum(map(len, self.interactions.values()))} interactions from cassette {self.path}")
+
+    def record(self, method, url, body, status_code, headers, content, latency):
+        """Append one interaction to the cassette file"""
+        interaction = {
+            'key': self.key(method, url, body),
+            'method': method,
+            'url': url,
+            'request': body.decode('utf-8') if isinstance(body, bytes) else body,
+            'status': status_code,
+            'headers': {name: value for name, value in headers.items() if name.lower() not in ENCODING_HEADERS},
+            'latency': round(latency, 4)
+        }
+        try:
+            interaction['body'] = content.decode('utf-8')
+        except UnicodeDecodeError:
+            interaction['body_base64'] = base64.b64encode(content).decode('ascii')
+        member = gzip.compress((json.dumps(interaction) + '\n').encode('utf-8'))
+        with self.lock:
+            with open(self.path, 'ab') as file:
+                file.write(member)
+
+    def replay(self, method, url, body):
+        """
+        The next recorded interaction for a request
+
+        Returns:
+            tuple: (interaction dict, body bytes, seconds to delay the response)
+
+        Raises:
+            CassetteMiss: Nothing was recorded for the request
+        """
+        key = self.key(method, url, body)
+        with self.lock:
+            recorded = self.interactions.get(key)
+            if not recorded:
+                raise CassetteMiss(f"No recorded response for {method} {url} in cassette {self.path}")
+            position = self.positions.get(key, 0)
+            self.positions[key] = position + 1
+        interaction = recorded[min(position, len(recorded) - 1)]
+        content = (base64.b64decode(interaction['body_base64']) if 'body_base64' in interaction
+                   else interaction['body'].encode('utf-8'))
+        return interaction, content, interaction['latency'] * self.latency_scale
+
+class CassetteAdapter(HTTPAdapter):
+    """requests transport adapter that records to or replays from a cassette"""
+
+    def __init__(self, cassette, **kwargs):
+        self.cassette = cassette
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        if self.cassette.mode == 'replay':
+            try:
+                interaction, content, delay = self.cassette.replay(request.method, request.url, request.body)
+            except CassetteMiss as e:
+                raise requests.exceptions.ConnectionError(str(e), request=request)
+            if delay:
+                time.sleep(delay)
+            response = requests.Response()
+            response.status_code = interaction['status']
+            response.headers = CaseInsensitiveDict(interaction['headers'])
+            response.encoding = get_encoding_from_headers(response.headers)
+            response._content = content
+            response.url = request.url
+            response.request = request
+            response.connection = self
+            return response
+
+        started = time.perf_counter()
+        response = super().send(request, **kwargs)
+        content = response.content
+        self.cassette.record(request.method, request.url, request.body, response.status_code,
+                             response.headers, content, time.perf_counter() - started)
+        return response
+
+_cassette = None
+_cassette_lock = threading.Lock()
+
+def get_cassette():
+    """
+    The cassette configured by ODP_CASSETTE_MODE in config.py, shared by the process
+
+    Returns:
+        Cassette: Cassette to record to or replay from, or None for live traffic
+    """
+    global _cassette
+
+    mode = get_config_value('ODP_CASSETTE_MODE', None)
+    if not mode:
+        return None
+    with _cassette_lock:
+        if _cassette is None:
+            _cassette = Cassette(get_config_value('ODP_CASSETTE_PATH', DEFAULT_CASSETTE_PATH), mode,
+                                 latency_scale=get_config_value('ODP_CASSETTE_LATENCY_SCALE', 0.0))
+            logger.info(f"ODP traffic is {'recorded to' if mode == 'record' else 'replayed from'} {_cassette.path}")
+        return _cassette
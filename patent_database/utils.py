@@ -3,9 +3,9 @@ Utility functions for the patent database tool
 """
 import csv
 import io
-import json
 import logging
 from .constants import VALID_FIELDS, SEARCH_TYPES, MAX_RESULTS_PER_PAGE, CSV_EXPORT_FIELDS
+from .extractors import compile_extractor, extract_rows, MISSING
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -153,44 +153,17 @@ def format_results_for_csv(results):
     writer = csv.writer(output)
     
     # Write header row
-    header = [field.split('.')[-1] if '.' in field else field for field in CSV_EXPORT_FIELDS]
-    writer.writerow(header)
+    writer.writerow(get_csv_header())
     
     # Write data rows
-    for patent in results:
-        row = []
-        for field in CSV_EXPORT_FIELDS:
-            # Handle nested fields
-            if '.' in field:
-                parts = field.split('.')
-                value = patent
-                
-                # Special case for applicationMetaData fields
-                if parts[0] == 'applicationMetaData':
-                    value = patent.get('applicationMetaData', {})
-                    for part in parts[1:]:
-                        if isinstance(value, dict) and part in value:
-                            value = value.get(part)
-                        else:
-                            value = ""
-                            break
-                else:
-                    # Handle other nested fields
-                    for part in parts:
-                        if isinstance(value, dict) and part in value:
-                            value = value.get(part)
-                        else:
-                            value = ""
-                            break
-            else:
-                # Handle top-level fields
-                value = patent.get(field, "")
-                
-            row.append(value)
-        writer.writerow(row)
+    writer.writerows(extract_rows(results, CSV_EXPORT_FIELDS))
     
     return output.getvalue()
 
+def get_csv_header():
+    """Column names for CSV_EXPORT_FIELDS: the last part of each field path"""
+    return [field.split('.')[-1] if '.' in field else field for field in CSV_EXPORT_FIELDS]
+
 def log_debug_info(message, data=None):
     """
     Log debug information
@@ -199,12 +172,14 @@ def log_debug_info(message, data=None):
         message (str): Debug message
         data (any, optional): Data to log
     """
+    from .structured_logging import LazyJSON, VERBOSE
+
     logger.info(message)
     if data:
         if isinstance(data, (dict, list)):
-            logger.info(json.dumps(data, indent=2))
+            logger.info("%s", LazyJSON(data, indent=2), extra=VERBOSE)
         else:
-            logger.info(str(data))
+            logger.info("%s", data, extra=VERBOSE)
 
 def get_nested_value(obj, path, default=""):
     """
@@ -218,13 +193,30 @@ def get_nested_value(obj, path, default=""):
     Returns:
         any: The value at the path or default if not found
     """
-    parts = path.split('.')
-    current = obj
+    value = compile_extractor(path, MISSING)(obj)
+    return default if value is MISSING else value
+
+def get_config_value(name, default=None):
+    """
+    Get a tool setting from config, falling back to a default
     
-    for part in parts:
-        if isinstance(current, dict) and part in current:
-            current = current[part]
-        else:
-            return default
+    Args:
+        name (str): Setting name on DevConfig
+        default (any, optional): Value used when the setting is missing
     
-    return current 
\ No newline at end of file
+    Returns:
+        any: The configured value or default
+    """
+    from config import DevConfig
+    return getattr(DevConfig, name, default)
+
+def get_api_key():
+    """Get API key from config"""
+    return get_config_value('ODP_API_KEY', '')
+
+def mask_api_key(api_key):
+    """Mask all but the first and last four characters of an API key for logging"""
+    if not api_key:
+        return ''
+    return api_key[:4] + '*' * (len(api_key) - 8) + api_key[-4:] if len(api_key) > 8 else '****'
+ 
\ No newline at end of file
@@ -0,0 +1,36 @@
+"""
+Shared fixtures: config overrides, a local mock of the ODP API and a fresh shared client
+"""
+import pytest
+
+import config
+from benchmarks.mock_odp import MockODPServer
+from patent_database import client as client_module
+from patent_database.constants import API_ENDPOINTS
+
+@pytest.fixture
+def settings(monkeypatch):
+    """Override DevConfig values for one test: settings(ODP_CACHE_ENABLED=False, ...)"""
+    def override(**values):
+        for name, value in values.items():
+            monkeypatch.setattr(config.DevConfig, name, value, raising=False)
+    return override
+
+@pytest.fixture
+def mock_odp(monkeypatch):
+    """MockODPServer with API_ENDPOINTS pointed at it"""
+    server = MockODPServer().start()
+    for name, url in server.endpoints().items():
+        monkeypatch.setitem(API_ENDPOINTS, name, url)
+    yield server
+    server.stop()
+
+@pytest.fixture
+def odp_client(monkeypatch, settings, mock_odp):
+    """A new shared ODPClient talking to the mock API, without response cache or rate limit"""
+    settings(ODP_CACHE_ENABLED=False, ODP_RATE_LIMIT_PER_SECOND=1000, ODP_RATE_LIMIT_BURST=1000,
+             ODP_RATE_LIMIT_STATE_FILE=None, ODP_MIRROR_ENABLED=False, ODP_CASSETTE_MODE=None)
+    monkeypatch.setattr(client_module, '_client', None)
+    client = client_module.get_client()
+    yield client
+    client.close()
@@ -0,0 +1,33 @@
+from patent_database.alternative_search import (AlternativeSelector, build_alternative_searches,
+                                                build_fallback_payload, needs_alternative_search)
+
+PAYLOAD = {'q': 'applicationMetaData.firstNamedApplicant:"Acme Widgets LLC"', 'pagination': {'offset': 0, 'limit': 2}}
+
+def found(count):
+    return {'results': [{}] * count}
+
+def test_spellings_are_searched_in_one_or_clause():
+    variants, or_payload, alternatives = build_alternative_searches(PAYLOAD)
+    assert 'Acme Widgets L.L.C.' in variants
+    assert or_payload['q'].count(' OR ') == len(variants) - 1
+    assert [alt_format for alt_format, _ in alternatives] == ['Acme*', 'assigneeName:Acme Widgets LLC', 'ACME']
+
+def test_queries_without_an_applicant_have_no_alternatives():
+    assert build_alternative_searches({'q': 'inventionTitle:widget'}) is None
+    assert not needs_alternative_search({'success': True, 'data': {'results': []}}, {'q': 'inventionTitle:widget'})
+    assert needs_alternative_search({'success': True, 'data': {'results': []}}, PAYLOAD)
+
+def test_selector_keeps_the_most_results_and_the_earliest_on_a_tie():
+    selector = AlternativeSelector()
+    assert not selector.add(found(1), 2, 'ACME', {})
+    assert not selector.add(found(1), 0, 'Acme*', {})
+    assert not selector.add(None, 1, 'assigneeName:Acme', {})
+    assert selector.best_result['note'].endswith('Acme*')
+    assert selector.add(found(2), 1, 'assigneeName:Acme', PAYLOAD)
+    assert selector.best_result['query_payload'] is PAYLOAD
+
+def test_fallback_payload_leaves_the_original_alone():
+    fallback = build_fallback_payload(PAYLOAD)
+    assert fallback['q'] == '*'
+    assert fallback['pagination']['limit'] == 20
+    assert PAYLOAD['pagination']['limit'] == 2
@@ -0,0 +1,64 @@
+import json
+
+import pytest
+from flask import Flask
+
+from patent_database import batch as batch_module
+from patent_database import patent_database_bp
+from patent_database.batch import search_batch
+
+def search(offset=0, term='widget'):
+    return {'search_type': 'simple', 'query_params': {'term': term}, 'pagination': {'offset': offset, 'limit': 5}}
+
+def first_number(result):
+    return result['data']['patentFileWrapperDataBag'][0]['applicationNumberText']
+
+@pytest.fixture
+def app(odp_client):
+    app = Flask(__name__)
+    app.register_blueprint(patent_database_bp)
+    return app
+
+def test_identical_searches_are_sent_once(odp_client, mock_odp):
+    results = search_batch([search(), search(10), search()])
+    assert mock_odp.requests == 2
+    assert results[0] == results[2]
+
+def test_results_are_in_request_order(odp_client):
+    offsets = [40, 0, 25, 5, 15]
+    results = search_batch([search(offset) for offset in offsets])
+    assert [first_number(result) for result in results] == [str(16000000 + offset) for offset in offsets]
+
+def test_failures_stay_with_their_search(odp_client, monkeypatch):
+    run_search = batch_module.run_search
+
+    def failing_run_search(query_payload, use_cache):
+        if query_payload['pagination']['offset'] == 99:
+            raise RuntimeError('upstream exploded')
+        return run_search(query_payload, use_cache)
+
+    monkeypatch.setattr(batch_module, 'run_search', failing_run_search)
+    invalid_query = {'search_type': 'advanced_query', 'query_params': {'raw_query': 'inventionTitle:(widget'}}
+    results = search_batch([search(), 'not an object', invalid_query, search(99), search(5)])
+    assert [result['success'] for result in results] == [True, False, False, False, True]
+    assert results[1]['error'] == 'Search parameters must be an object'
+    assert results[2]['error'].startswith('Invalid query syntax')
+    assert results[3]['error'] == 'upstream exploded'
+    assert first_number(results[4]) == '16000005'
+
+def test_batch_streams_ndjson_lines(app, mock_odp):
+    response = app.test_client().post('/patent_database/api/search/batch?stream=1',
+                                      json=[search(0), 42, search(10), search(0)])
+    assert response.mimetype == 'application/x-ndjson'
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert sorted(line['index'] for line in lines) == [0, 1, 2, 3]
+    results = {line['index']: line['result'] for line in lines}
+    assert lines[0] == {'index': 1, 'result': {'success': False, 'error': 'Search parameters must be an object'}}
+    assert first_number(results[2]) == '16000010'
+    assert results[0] == results[3]
+    assert mock_odp.requests == 2
+
+def test_batch_rejects_a_malformed_request(app):
+    response = app.test_client().post('/patent_database/api/search/batch', json={'searches': 'widget'})
+    assert response.status_code == 400
+    assert response.get_json()['success'] is False
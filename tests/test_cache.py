@@ -0,0 +1,45 @@
+import time
+
+from patent_database.cache import ResponseCache, canonicalize_payload, make_cache_key
+
+URL = 'https://api.uspto.gov/api/v1/patent/applications/search'
+TYPE_FIELD = 'applicationMetaData.applicationTypeLabelName'
+
+def payload(**values):
+    return dict({'q': 'wireless AND sensor', 'fields': ['inventionTitle', 'applicationNumberText'],
+                 'filters': [{'name': TYPE_FIELD, 'value': ['Utility', 'Design']}],
+                 'rangeFilters': [], 'pagination': {'offset': 0, 'limit': 25}}, **values)
+
+def test_formatting_does_not_change_the_key():
+    reformatted = payload(q='sensor  AND (wireless)', fields=['applicationNumberText', 'inventionTitle'],
+                          filters=[{'name': TYPE_FIELD, 'value': ['Design', 'Utility', 'Design']}])
+    assert make_cache_key('post', URL, reformatted) == make_cache_key('POST', URL, payload())
+
+def test_meaningful_changes_change_the_key():
+    key = make_cache_key('POST', URL, payload())
+    assert make_cache_key('POST', URL, payload(q='wireless OR sensor')) != key
+    assert make_cache_key('POST', URL, payload(pagination={'offset': 25, 'limit': 25})) != key
+    assert make_cache_key('POST', URL, payload(sort=[{'field': 'filingDate', 'order': 'asc'}])) != \
+        make_cache_key('POST', URL, payload(sort=[{'field': 'filingDate', 'order': 'desc'}]))
+    assert make_cache_key('GET', URL, payload()) != key
+
+def test_canonical_payload_is_a_copy():
+    original = payload()
+    canonicalize_payload(original)
+    assert original == payload()
+
+def test_cache_evicts_least_recently_used():
+    cache = ResponseCache(max_entries=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+    assert cache.get('b') is None
+    assert (cache.get('a'), cache.get('c')) == (1, 3)
+
+def test_expired_entries_are_only_served_when_stale_is_allowed():
+    cache = ResponseCache(ttl=0.01, stale_ttl=60)
+    cache.set('a', 1)
+    time.sleep(0.02)
+    assert cache.get('a') is None
+    assert cache.get('a', allow_stale=True) == 1
@@ -0,0 +1,59 @@
+import pytest
+import urllib3
+
+from patent_database import client as client_module
+from patent_database.client import ODPClient, get_client
+from patent_database.constants import API_ENDPOINTS
+
+PAYLOAD = {'q': 'widget', 'pagination': {'offset': 0, 'limit': 5}}
+
+@pytest.fixture
+def connections(monkeypatch):
+    """Count the TCP connections opened by urllib3"""
+    opened = []
+    connect = urllib3.connection.HTTPConnection.connect
+
+    def counting_connect(self):
+        opened.append(self.port)
+        return connect(self)
+
+    monkeypatch.setattr(urllib3.connection.HTTPConnection, 'connect', counting_connect)
+    return opened
+
+def test_requests_reuse_one_pooled_connection(odp_client, mock_odp, connections):
+    for offset in range(5):
+        response = odp_client.post(API_ENDPOINTS['patent_search'], dict(PAYLOAD, pagination={'offset': offset, 'limit': 5}))
+        assert response.status_code == 200
+    assert mock_odp.requests == 5
+    assert len(connections) == 1
+
+def test_headers_are_built_once_on_the_session():
+    client = ODPClient('abcd1234efgh5678')
+    assert client.session.headers['X-API-KEY'] == 'abcd1234efgh5678'
+    assert client.session.headers['Content-Type'] == 'application/json'
+    assert client.masked_key == 'abcd********5678'
+
+def test_pool_sizes_and_timeouts_come_from_config(monkeypatch, settings):
+    settings(ODP_POOL_CONNECTIONS=2, ODP_POOL_MAXSIZE=7, ODP_CONNECT_TIMEOUT=3, ODP_READ_TIMEOUT=11,
+             ODP_CASSETTE_MODE=None)
+    monkeypatch.setattr(client_module, '_client', None)
+    client = get_client()
+    adapter = client.session.get_adapter('https://api.uspto.gov')
+    assert adapter._pool_connections == 2
+    assert adapter._pool_maxsize == 7
+    assert client.timeout == (3, 11)
+
+def test_one_client_per_process(monkeypatch, settings):
+    settings(ODP_CASSETTE_MODE=None)
+    monkeypatch.setattr(client_module, '_client', None)
+    client = get_client()
+    assert get_client() is client
+    # A forked worker has another pid and must not share the parent's sockets
+    monkeypatch.setattr(client_module, '_client_pid', -1)
+    assert get_client() is not client
+
+def test_response_can_be_decoded_repeatedly(odp_client):
+    response = odp_client.post(API_ENDPOINTS['patent_search'], PAYLOAD)
+    first = response.json()
+    first['patentFileWrapperDataBag'].clear()
+    assert len(response.json()['patentFileWrapperDataBag']) == 5
@@ -0,0 +1,38 @@
+import datetime
+
+from openpyxl import load_workbook
+
+from benchmarks.mock_odp import make_record
+from patent_database import excel_export
+from patent_database.excel_export import build_excel_export
+from patent_database.export import EXPORT_INCOMPLETE_MARKER, PageFetchError
+from patent_database.utils import get_csv_header
+
+def export_rows(monkeypatch, pages, total):
+    monkeypatch.setattr(excel_export, 'open_export_pages', lambda data, deadline=None: (pages, total, None))
+    result = build_excel_export({'all_pages': True})
+    assert result['success']
+    worksheet = load_workbook(result['excel_file'], read_only=True).active
+    return result, [list(row) for row in worksheet.iter_rows(values_only=True)]
+
+def test_workbook_holds_every_page(monkeypatch):
+    pages = [[make_record(number) for number in range(start, start + 3)] for start in (0, 3)]
+    result, rows = export_rows(monkeypatch, iter(pages), 6)
+    assert result['rows'] == 6 and result['incomplete'] is None
+    assert rows[0] == get_csv_header()
+    assert len(rows) == 7
+    header = rows[0]
+    first = dict(zip(header, rows[1]))
+    assert first['applicationNumberText'] == '16000000'
+    assert first['filingDate'] == datetime.datetime.fromisoformat(make_record(0)['applicationMetaData']['filingDate'])
+    assert all(row[0] != EXPORT_INCOMPLETE_MARKER for row in rows)
+
+def test_failed_page_ends_the_workbook_with_a_marker_row(monkeypatch):
+    def pages():
+        yield [make_record(0), make_record(1)]
+        raise PageFetchError({'success': False, 'error': 'API error: 500'})
+
+    result, rows = export_rows(monkeypatch, pages(), 6)
+    assert result['rows'] == 2 and result['incomplete'] == 'API error: 500'
+    assert len(rows) == 4
+    assert rows[-1][:2] == [EXPORT_INCOMPLETE_MARKER, 'Stopped after 2 rows: API error: 500']
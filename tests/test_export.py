@@ -0,0 +1,41 @@
+import csv
+import io
+
+from patent_database import export as export_module
+from patent_database.export import EXPORT_INCOMPLETE_MARKER, PageFetchError, iter_csv, open_payload_pages
+from patent_database.timing import collect_timings, current_timings
+
+PAYLOAD = {'q': 'widget', 'pagination': {'offset': 0, 'limit': 100}}
+
+def read_csv(chunks):
+    return list(csv.reader(io.StringIO(''.join(chunks))))
+
+def test_csv_export_ends_with_a_marker_row_when_a_page_fails():
+    def pages():
+        yield [{'applicationNumberText': '16000001'}]
+        raise PageFetchError({'success': False, 'error': 'API error: 500'})
+
+    rows = read_csv(iter_csv(pages()))
+    assert len(rows) == 3
+    assert rows[-1] == [EXPORT_INCOMPLETE_MARKER, 'Stopped after 1 rows: API error: 500']
+
+def test_complete_csv_export_has_no_marker_row():
+    rows = read_csv(iter_csv([[{'applicationNumberText': '16000001'}], [{'applicationNumberText': '16000002'}]]))
+    assert len(rows) == 3
+    assert all(row[0] != EXPORT_INCOMPLETE_MARKER for row in rows)
+
+def test_pages_fetched_in_worker_threads_add_to_the_request_timings(monkeypatch, odp_client):
+    seen = []
+    handle_search_response = export_module.handle_search_response
+
+    def recording_handle_search_response(*args, **kwargs):
+        seen.append(current_timings())
+        return handle_search_response(*args, **kwargs)
+
+    monkeypatch.setattr(export_module, 'handle_search_response', recording_handle_search_response)
+    with collect_timings() as timings:
+        pages, total, error_result = open_payload_pages(PAYLOAD, use_cache=False, max_rows=400, mirror=False)
+        assert error_result is None
+        assert sum(len(page) for page in pages) == 400
+    assert len(seen) == 4
+    assert all(seen_timings is timings for seen_timings in seen)
@@ -0,0 +1,42 @@
+import pytest
+
+from benchmarks.mock_odp import make_record
+from patent_database.constants import CSV_EXPORT_FIELDS
+from patent_database.extractors import compile_row_extractor, extract_columns, extract_rows
+
+FIELDS = CSV_EXPORT_FIELDS + ['applicationMetaData.inventorBag', 'a.b.c', 'a.b.d', 'a.b']
+
+def field_value(record, field):
+    """The value of one field, walked step by step as the export did before extractors were compiled"""
+    value = record
+    for part in field.split('.'):
+        if not isinstance(value, dict) or part not in value:
+            return ""
+        value = value[part]
+    return value
+
+RECORDS = [
+    make_record(1),
+    make_record(2) | {'grantDate': None, 'a': {'b': {'c': 0}}},
+    {'inventionTitle': 'Widget', 'applicationMetaData': 'not an object', 'a': {'b': 'not an object'}},
+    {'applicationMetaData': {'filingDate': '2020-01-01'}, 'a': None},
+    {},
+    None,
+    ['not', 'a', 'record'],
+]
+
+@pytest.mark.parametrize('record', RECORDS)
+def test_row_matches_each_field(record):
+    row = compile_row_extractor(FIELDS)(record)
+    assert len(row) == len(FIELDS)
+    for field, value in zip(FIELDS, row):
+        assert value == field_value(record, field), field
+
+def test_batches_match_rows():
+    rows = [compile_row_extractor(FIELDS)(record) for record in RECORDS]
+    assert list(extract_rows(RECORDS, FIELDS)) == rows
+    assert extract_columns(RECORDS, FIELDS) == [list(column) for column in zip(*rows)]
+
+def test_single_field_and_default():
+    assert compile_row_extractor(['a.b.c'], None)({'a': {'b': {}}}) == (None,)
+    assert extract_columns([], FIELDS) == [[] for _ in FIELDS]
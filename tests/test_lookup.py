@@ -0,0 +1,100 @@
+import json
+import threading
+import time
+from functools import partial
+
+import pytest
+
+from patent_database import lookup as lookup_module
+from patent_database.cache import ResponseCache, make_cache_key
+from patent_database.client import ODPResponse
+from patent_database.lookup import build_lookup_payload, detail_url, lookup_application_numbers, plan_lookup
+
+NUMBERS = ['16000001', '16000002', '16000003', '16000004', '16000005', '16000006']
+
+def record(number):
+    return {'applicationNumberText': number, 'applicationMetaData': {'inventionTitle': f'Widget {number}'}}
+
+def response(status_code, records=()):
+    body = {'count': len(records), 'patentFileWrapperDataBag': list(records)}
+    return ODPResponse(status_code, {'Content-Type': 'application/json'}, json.dumps(body).encode())
+
+@pytest.fixture
+def upstream(monkeypatch, settings, odp_client):
+    """Answer lookup searches from `statuses`, keyed by the first number of a chunk, and count the calls"""
+    settings(ODP_LOOKUP_CONCURRENCY=1)
+    monkeypatch.setattr(lookup_module, 'plan_lookup', partial(plan_lookup, chunk_size=2))
+    calls = {'searches': [], 'statuses': {}, 'delay': 0}
+
+    def post(url, payload, **kwargs):
+        numbers = payload['q'].split('(')[1].rstrip(')').split(' OR ')
+        calls['searches'].append(payload)
+        status_code = calls['statuses'].get(numbers[0], 200)
+        time.sleep(calls['delay'])
+        return response(status_code, [record(number) for number in numbers] if status_code == 200 else ())
+
+    monkeypatch.setattr(odp_client, 'post', post)
+    return calls
+
+def test_lookup_payload_requests_full_records():
+    payload = build_lookup_payload(['16000001', '16000002'])
+    assert 'fields' not in payload
+    assert payload['pagination'] == {'offset': 0, 'limit': 2}
+
+def test_lookup_finds_every_number(upstream):
+    result = lookup_application_numbers(NUMBERS + ['12'], use_cache=False)
+    assert result['success']
+    assert [found['applicationNumberText'] for found in result['data']['results']] == NUMBERS
+    assert result['report']['failed'] == []
+    assert result['report']['invalid'] == ['12']
+    assert len(upstream['searches']) == 3
+
+def test_failed_chunk_keeps_the_other_records(upstream):
+    upstream['statuses']['16000003'] = 500
+    result = lookup_application_numbers(NUMBERS, use_cache=False)
+    assert result['success']
+    assert result['report']['found'] == 4
+    assert result['report']['failed'] == ['16000003', '16000004']
+    assert result['report']['missing'] == []
+    assert len(upstream['searches']) == 3
+
+def test_not_found_chunk_is_missing_not_failed(upstream):
+    upstream['statuses']['16000001'] = 404
+    result = lookup_application_numbers(NUMBERS, use_cache=False)
+    assert result['report']['missing'] == ['16000001', '16000002']
+    assert result['report']['failed'] == []
+
+def test_rejected_key_stops_the_lookup(upstream):
+    upstream['statuses']['16000001'] = 403
+    upstream['delay'] = 0.05
+    result = lookup_application_numbers(NUMBERS, use_cache=False)
+    assert result['success']
+    assert '403' in result['report']['error']
+    assert len(upstream['searches']) == 2
+    assert result['report']['found'] == 2
+    assert result['report']['failed'] == ['16000001', '16000002', '16000005', '16000006']
+
+def test_plan_reads_cached_details_without_counting_misses():
+    cache = ResponseCache()
+    cache.set(make_cache_key('GET', detail_url('16000002'), None), response(200).to_cache_entry())
+    chunks, details = plan_lookup(NUMBERS[:3], cache)
+    assert chunks == [['16000001', '16000003']]
+    assert details == ['16000002']
+    assert cache.stats()['hits'] == 0 and cache.stats()['misses'] == 0
+
+def test_upstream_calls_count_only_this_lookup(upstream, settings, odp_client, monkeypatch):
+    settings(ODP_LOOKUP_CONCURRENCY=2)
+    post = odp_client.post
+
+    def counting_post(url, payload, **kwargs):
+        odp_client.count_upstream_request()
+        # A search of another request sent at the same time
+        other = threading.Thread(target=odp_client.count_upstream_request)
+        other.start()
+        other.join()
+        return post(url, payload, **kwargs)
+
+    monkeypatch.setattr(odp_client, 'post', counting_post)
+    result = lookup_application_numbers(NUMBERS, use_cache=False)
+    assert result['report']['upstream_calls'] == len(upstream['searches']) == 3
+    assert odp_client.upstream_requests == 6
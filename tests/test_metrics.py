@@ -0,0 +1,50 @@
+import os
+import subprocess
+import sys
+import textwrap
+
+from patent_database.constants import API_ENDPOINTS
+from patent_database.metrics import count_cache_lookup, endpoint_name, render_metrics, upstream_outcome
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def run_python(script, **environ):
+    """Run a script in a fresh interpreter, where prometheus_client has not picked its storage yet"""
+    env = {name: value for name, value in os.environ.items() if name != 'PROMETHEUS_MULTIPROC_DIR'}
+    return subprocess.run([sys.executable, '-c', textwrap.dedent(script)], cwd=ROOT, capture_output=True,
+                          text=True, env=dict(env, **environ))
+
+def test_labels():
+    assert endpoint_name(API_ENDPOINTS['patent_search']) == 'patent_search'
+    assert endpoint_name('https://example.com/other') == 'other'
+    assert [upstream_outcome(status) for status in (200, 429, 503, None, 418)] == ['200', '429', 'error', 'error',
+                                                                                  'other']
+
+def test_rendered_metrics_include_counted_lookups():
+    count_cache_lookup('hit')
+    body, content_type = render_metrics()
+    assert b'odp_cache_lookups_total{result="hit"}' in body
+    assert content_type.startswith('text/plain')
+
+def test_multiprocess_directory_is_only_set_by_setup(tmp_path):
+    result = run_python(f"""
+        import os
+        from types import SimpleNamespace
+        import config
+        config.DevConfig.ODP_METRICS_MULTIPROC_DIR = {str(tmp_path)!r}
+        from patent_database import metrics
+        assert 'PROMETHEUS_MULTIPROC_DIR' not in os.environ
+        metrics.setup_metrics()
+        metrics.count_retry('https://example.com')
+        with metrics.waiting_for_rate_limiter():
+            print(sorted(os.listdir({str(tmp_path)!r})))
+        metrics.child_exit(None, SimpleNamespace(pid=os.getpid()))
+        print(sorted(os.listdir({str(tmp_path)!r})))
+        print(b'odp_upstream_retries_total' in metrics.render_metrics()[0])
+    """)
+    assert result.returncode == 0, result.stderr
+    during, after, rendered = result.stdout.splitlines()
+    assert 'gauge_livesum' in during
+    assert 'gauge_livesum' not in after
+    assert 'counter_' in after
+    assert rendered == 'True'
@@ -0,0 +1,67 @@
+import multiprocessing
+import os
+
+from patent_database import persistent_cache
+from patent_database.persistent_cache import SQLiteResponseCache
+
+RESPONSE = (200, {'Content-Type': 'application/json'}, b'{"count": 1}')
+
+def write_entries(path, prefix, count):
+    cache = SQLiteResponseCache(path)
+    for number in range(count):
+        cache.set(f'{prefix}{number}', (200, {}, f'{prefix}{number}'.encode()))
+
+def test_round_trip(tmp_path):
+    cache = SQLiteResponseCache(str(tmp_path / 'cache.sqlite3'))
+    cache.set('key', RESPONSE)
+    assert cache.get('key') == RESPONSE
+    assert cache.get('other') is None
+    assert cache.stats()['hits'] == 1 and cache.stats()['misses'] == 1
+
+def test_expired_entry_is_a_miss(tmp_path):
+    cache = SQLiteResponseCache(str(tmp_path / 'cache.sqlite3'), ttl=300)
+    cache.set('fresh', RESPONSE)
+    cache.set('expired', RESPONSE, ttl=-1)
+    assert cache.get('fresh') == RESPONSE
+    assert cache.get('expired') is None
+
+def test_contains_counts_nothing(tmp_path):
+    cache = SQLiteResponseCache(str(tmp_path / 'cache.sqlite3'))
+    cache.set('fresh', RESPONSE)
+    cache.set('expired', RESPONSE, ttl=-1)
+    assert cache.contains('fresh')
+    assert not cache.contains('expired') and not cache.contains('other')
+    assert cache.stats()['hits'] == 0 and cache.stats()['misses'] == 0
+
+def test_stale_entry_is_served_only_within_the_stale_period(tmp_path):
+    cache = SQLiteResponseCache(str(tmp_path / 'cache.sqlite3'), stale_ttl=60)
+    cache.set('stale', RESPONSE, ttl=-1)
+    cache.set('too old', RESPONSE, ttl=-120)
+    assert cache.get('stale', allow_stale=True) == RESPONSE
+    assert cache.get('too old', allow_stale=True) is None
+
+def test_least_recently_used_entries_are_evicted_over_max_bytes(tmp_path, monkeypatch):
+    monkeypatch.setattr(persistent_cache, 'EVICTION_CHECK_INTERVAL', 1)
+    cache = SQLiteResponseCache(str(tmp_path / 'cache.sqlite3'), max_bytes=3000)
+    for number in range(5):
+        cache.set(f'key{number}', (200, {}, os.urandom(1000)))
+    stats = cache.stats()
+    assert stats['bytes'] <= 3000
+    assert cache.get('key0') is None
+    assert cache.get('key4') is not None
+
+def test_processes_share_the_database(tmp_path):
+    path = str(tmp_path / 'cache.sqlite3')
+    cache = SQLiteResponseCache(path)
+    context = multiprocessing.get_context('spawn')
+    writers = [context.Process(target=write_entries, args=(path, prefix, 50)) for prefix in ('a', 'b')]
+    for writer in writers:
+        writer.start()
+    write_entries(path, 'c', 50)
+    for writer in writers:
+        writer.join(30)
+        assert writer.exitcode == 0
+    assert cache.stats()['entries'] == 150
+    assert cache.get('a49') == (200, {}, b'a49')
+    assert cache.get('b0') == (200, {}, b'b0')
+    assert cache._connect().execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
@@ -0,0 +1,115 @@
+import pytest
+
+from benchmarks.mock_odp import make_record
+from patent_database.local_search import (UnsupportedMirrorQuery, find_covering_query, payload_conditions,
+                                          search_mirror_tables)
+from patent_database.mirror import LocalMirror
+from patent_database.query_executor import LocalIndex, LocalIndexFull, answered_exactly, project_record
+from patent_database.query_parser import parse_query
+
+RECORDS = [make_record(number) for number in range(50)]
+
+@pytest.fixture
+def index(tmp_path):
+    mirror = LocalMirror(str(tmp_path / 'mirror.sqlite3'))
+    mirror.upsert(RECORDS)
+    return LocalIndex(mirror)
+
+def payload(q, **values):
+    return dict({'q': q, 'filters': [], 'rangeFilters': [], 'pagination': {'offset': 0, 'limit': 100},
+                 'sort': [{'field': 'applicationMetaData.filingDate', 'order': 'desc'}]}, **values)
+
+def expected_numbers(matches):
+    return {record['applicationNumberText'] for record in RECORDS if matches(record['applicationMetaData'])}
+
+def test_fielded_term_and_filter(index):
+    total, records = index.execute(payload('inventionTitle:widget', filters=[
+        {'name': 'applicationMetaData.applicationTypeLabelName', 'value': ['Utility']}]))
+    expected = expected_numbers(lambda meta: 'widget' in meta['inventionTitle'].lower().split()
+                                and meta['applicationTypeLabelName'] == 'Utility')
+    assert total == len(expected)
+    assert {record['applicationNumberText'] for record in records} == expected
+
+def test_range_filter_and_sort(index):
+    total, records = index.execute(payload('*', rangeFilters=[
+        {'field': 'applicationMetaData.filingDate', 'valueFrom': '2018-01-01', 'valueTo': '2020-12-31'}]))
+    dates = [record['applicationMetaData']['filingDate'] for record in records]
+    assert total == len(expected_numbers(lambda meta: '2018-01-01' <= meta['filingDate'] <= '2020-12-31'))
+    assert dates == sorted(dates, reverse=True)
+
+def test_not_and_pagination(index):
+    total, records = index.execute(payload('* AND NOT inventionTitle:widget', pagination={'offset': 5, 'limit': 10}))
+    assert total == len(expected_numbers(lambda meta: 'widget' not in meta['inventionTitle'].lower().split()))
+    assert len(records) == 10
+
+def test_results_hold_only_the_requested_fields(index):
+    _, records = index.execute(payload('*', fields=['applicationNumberText', 'applicationMetaData.filingDate',
+                                                    'applicationMetaData.inventorBag.inventorNameText']))
+    record = records[0]
+    assert set(record) == {'applicationNumberText', 'applicationMetaData'}
+    assert set(record['applicationMetaData']) == {'filingDate', 'inventorBag'}
+    assert all(set(inventor) == {'inventorNameText'} for inventor in record['applicationMetaData']['inventorBag'])
+
+def test_projection_leaves_the_record_alone():
+    record = make_record(1)
+    project_record(record, ['applicationMetaData', 'applicationMetaData.filingDate'])
+    assert record == make_record(1)
+
+def test_index_refuses_more_records_than_the_cap(index, settings):
+    settings(ODP_LOCAL_INDEX_MAX_RECORDS=10)
+    with pytest.raises(LocalIndexFull):
+        index.execute(payload('*'))
+
+@pytest.mark.parametrize('query, exact', [
+    ('inventionTitle:widget', True),
+    ('applicationMetaData.filingDate:[2020-01-01 TO 2021-01-01] AND NOT inventionTitle:sensor', True),
+    ('widget', False),
+    ('inventionTitle:widget AND (sensor OR inventionTitle:valve)', False),
+    ('inventionTitle:"wireless sensor"~3', False),
+])
+def test_only_fielded_queries_are_answered_exactly(query, exact):
+    assert answered_exactly(parse_query(query)) is exact
+
+def test_unfielded_terms_are_not_covered_by_a_saved_query(monkeypatch):
+    monkeypatch.setattr('patent_database.sync.list_queries', lambda: pytest.fail('saved queries were read'))
+    assert find_covering_query(payload('widget')) is None
+
+def test_space_separated_groups_are_not_answered_exactly():
+    assert not answered_exactly(parse_query('inventionTitle:(widget sensor)'))
+    assert answered_exactly(parse_query('+inventionTitle:widget'))
+
+def test_space_separated_groups_are_one_condition():
+    assert payload_conditions(payload('inventionTitle:(widget sensor)')) == {'inventionTitle:(sensor widget)'}
+    assert payload_conditions(payload('inventionTitle:widget AND +inventionTitle:sensor')) == {
+        'inventionTitle:sensor', 'inventionTitle:widget'}
+
+def test_signed_term_in_a_group_is_excluded(index):
+    total, _ = index.execute(payload('* AND inventionTitle:(-widget)'))
+    assert total == len(expected_numbers(lambda meta: 'widget' not in meta['inventionTitle'].lower().split()))
+
+@pytest.mark.parametrize('q', [
+    'inventionTitle:widget',
+    'inventionTitle:wid* AND NOT inventionTitle:sensor',
+    'applicationMetaData.applicationTypeLabelName:(Utility OR Design) AND filingDate:[2018-01-01 TO 2021-12-31]',
+])
+def test_sqlite_indexes_answer_like_the_in_memory_index(index, settings, q):
+    expected = index.execute(payload(q))
+    settings(ODP_LOCAL_INDEX_MAX_RECORDS=10)
+    with pytest.raises(LocalIndexFull):
+        index.execute(payload(q))
+    total, records = search_mirror_tables(index.mirror, payload(q))
+    assert total == expected[0]
+    assert {record['applicationNumberText'] for record in records} == {
+        record['applicationNumberText'] for record in expected[1]}
+
+def test_sqlite_indexes_reject_unsupported_queries(index):
+    with pytest.raises(UnsupportedMirrorQuery):
+        search_mirror_tables(index.mirror, payload('inventionTitle:widget OR filingDate:[2020 TO 2021]'))
+
+def test_fts_index_is_rebuilt_for_an_existing_mirror(index):
+    connection = index.mirror.connect()
+    connection.executescript('DROP TRIGGER applications_fts_insert; DROP TRIGGER applications_fts_delete; '
+                             'DROP TRIGGER applications_fts_update; DROP TABLE applications_fts;')
+    mirror = LocalMirror(index.mirror.path)
+    assert search_mirror_tables(mirror, payload('inventionTitle:widget'))[0] == index.execute(
+        payload('inventionTitle:widget'))[0]
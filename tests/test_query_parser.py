@@ -0,0 +1,63 @@
+import pytest
+
+from patent_database.query_parser import (BooleanQuery, Not, QuerySyntaxError, Range, Required, Term, canonical_query,
+                                          parse_query, rename_fields, to_query_string)
+
+APPLICANT = 'applicationMetaData.firstApplicantName'
+RENAMES = {'applicant': APPLICANT}
+
+@pytest.mark.parametrize('query', [
+    'wireless AND charging',
+    'wireless charging',
+    f'{APPLICANT}:"Acme widgets"~2',
+    '"solar panel"^3 OR battery',
+    'applicationMetaData.filingDate:[2020-01-01 TO 2021-12-31]',
+    'NOT applicationMetaData.applicationTypeLabelName:Design',
+    'inventionTitle:(drone OR quadcopter) AND Technolog*',
+    '+inventionTitle:widget NOT applicationMetaData.applicationTypeLabelName:Design',
+])
+def test_query_string_round_trips(query):
+    assert to_query_string(parse_query(query)) == query
+
+def test_phrase_suffix_is_parsed():
+    assert parse_query('"Acme widgets"~2^1.5') == Term(None, 'Acme widgets', 'phrase', '~2^1.5')
+
+def test_rename_keeps_phrase_proximity():
+    assert rename_fields('applicant:"Acme widgets"~2', RENAMES) == f'{APPLICANT}:"Acme widgets"~2'
+    assert rename_fields('applicant:("Acme"~1 OR Globex)', RENAMES) == f'{APPLICANT}:("Acme"~1 OR Globex)'
+
+def test_rename_without_renamed_fields_keeps_query():
+    assert rename_fields('title:"a  b"   c', RENAMES) == 'title:"a  b"   c'
+
+@pytest.mark.parametrize('query', ['a:b:c', '(a OR b)^2', 'filingDate:[2020 TO 2021]~1', '"unterminated', 'a AND'])
+def test_unsupported_syntax_is_rejected(query):
+    with pytest.raises(QuerySyntaxError):
+        parse_query(query)
+
+def test_range_bounds():
+    assert parse_query('x:{1 TO 5]') == Range('x', '1', '5', False, True)
+
+def test_field_group_applies_to_each_term():
+    assert parse_query('x:(a b)') == BooleanQuery('DEFAULT', (Term('x', 'a', 'term'), Term('x', 'b', 'term')))
+
+def test_canonical_query_ignores_order_and_spacing():
+    assert canonical_query('b AND  a') == canonical_query('a AND b')
+    assert canonical_query('a OR b') != canonical_query('a AND b')
+
+def test_symbolic_operators():
+    assert parse_query('a || b && c') == parse_query('a OR b AND c')
+    assert parse_query('!a') == parse_query('NOT a')
+
+def test_symbolic_operators_do_not_share_a_cache_key():
+    assert canonical_query('a || b && c') != canonical_query('a && b || c')
+
+def test_signed_clauses():
+    assert parse_query('-inventionTitle:widget') == Not(Term('inventionTitle', 'widget', 'term'))
+    assert parse_query('+field:value') == Required(Term('field', 'value', 'term'))
+    assert parse_query('title:(-b)') == Not(Term('title', 'b', 'term'))
+    assert parse_query('a-b') == Term(None, 'a-b', 'term')
+
+def test_space_separated_groups_keep_order_around_symbols():
+    assert canonical_query('b a') == canonical_query('a b')
+    assert canonical_query('a & b') != canonical_query('b & a')
+    assert canonical_query('(a -b) c') != canonical_query('a -b c')
@@ -0,0 +1,69 @@
+from patent_database.operations import run_search
+from patent_database.query_rewriter import (merge_filters, merge_range_filters, matches_nothing, optimize_payload,
+                                            simplify)
+from patent_database.query_parser import parse_query, transform, to_query_string
+
+TYPE_FIELD = 'applicationMetaData.applicationTypeLabelName'
+FILING_DATE = 'applicationMetaData.filingDate'
+
+def simplified(query):
+    return to_query_string(transform(parse_query(query), simplify))
+
+def test_match_all_is_dropped_from_explicit_and_only():
+    assert simplified('wireless AND *') == 'wireless'
+    assert simplified('wireless *') == 'wireless *'
+    assert simplified('wireless OR *') == '*'
+    assert simplified('* AND *') == '*'
+
+def test_repeated_clauses_are_dropped():
+    assert simplified('sensor AND sensor') == 'sensor'
+    assert simplified('sensor sensor') == 'sensor'
+
+def test_filters_on_one_field_merge_into_common_values():
+    merged = merge_filters([{'name': TYPE_FIELD, 'value': ['Design', 'Plant']},
+                            {'name': TYPE_FIELD, 'value': ['Plant', 'Utility']}])
+    assert merged == [{'name': TYPE_FIELD, 'value': ['Plant']}]
+
+def test_overlapping_ranges_merge_into_their_intersection():
+    merged = merge_range_filters([{'field': FILING_DATE, 'valueFrom': '2020-01-01', 'valueTo': '2023-12-31'},
+                                  {'field': FILING_DATE, 'valueFrom': '2022-01-01', 'valueTo': '2024-12-31'}])
+    assert merged == [{'field': FILING_DATE, 'valueFrom': '2022-01-01', 'valueTo': '2023-12-31'}]
+
+def test_disjoint_ranges_are_never_inverted():
+    ranges = [{'field': FILING_DATE, 'valueFrom': '2023-01-01', 'valueTo': '2023-12-31'},
+              {'field': FILING_DATE, 'valueFrom': '2020-01-01', 'valueTo': '2022-01-01'}]
+    payload = optimize_payload({'q': 'sensor', 'rangeFilters': ranges})
+    assert payload['rangeFilters'] == ranges
+    assert matches_nothing(payload)
+    assert not matches_nothing({'rangeFilters': ranges[:1]})
+
+def test_disjoint_ranges_are_answered_without_an_upstream_call(odp_client, mock_odp):
+    payload = {'q': 'sensor', 'pagination': {'offset': 0, 'limit': 10},
+               'rangeFilters': [{'field': FILING_DATE, 'valueFrom': '2023-01-01', 'valueTo': '2023-12-31'},
+                                {'field': FILING_DATE, 'valueFrom': '2020-01-01', 'valueTo': '2022-01-01'}]}
+    result = run_search(payload)
+    assert result['success']
+    assert result['data']['results'] == []
+    assert mock_odp.requests == 0
+
+def test_q_range_folds_into_an_overlapping_range_filter():
+    payload = optimize_payload({'q': f'{FILING_DATE}:[2023-06-01 TO 2025-01-01]',
+                                'rangeFilters': [{'field': FILING_DATE, 'valueFrom': '2023-01-01',
+                                                  'valueTo': '2024-01-01'}]})
+    assert payload['q'] == '*'
+    assert payload['rangeFilters'] == [{'field': FILING_DATE, 'valueFrom': '2023-06-01', 'valueTo': '2024-01-01'}]
+
+def test_enumerated_clause_is_kept_in_q_as_written():
+    payload = optimize_payload({'q': f'{TYPE_FIELD}:design AND sensor', 'filters': []})
+    assert payload['q'] == f'{TYPE_FIELD}:design AND sensor'
+    assert payload['filters'] == []
+
+def test_enumerated_clause_repeating_a_filter_is_dropped():
+    payload = optimize_payload({'q': f'{TYPE_FIELD}:Design AND sensor',
+                                'filters': [{'name': TYPE_FIELD, 'value': ['Design']}]})
+    assert payload['q'] == 'sensor'
+    assert payload['filters'] == [{'name': TYPE_FIELD, 'value': ['Design']}]
+
+def test_unparseable_query_is_left_alone():
+    payload = {'q': 'title:"unterminated', 'filters': []}
+    assert optimize_payload(payload) == payload
@@ -0,0 +1,45 @@
+import email.utils
+import time
+
+import pytest
+
+from patent_database.ratelimit import (FileTokenBucket, TokenBucket, backoff_delay, create_rate_limiter,
+                                       parse_retry_after)
+
+def test_bucket_serves_its_burst_without_waiting():
+    bucket = TokenBucket(rate=10, capacity=3)
+    assert [bucket.reserve() for _ in range(3)] == [0.0, 0.0, 0.0]
+
+def test_empty_bucket_queues_callers_in_arrival_order():
+    bucket = TokenBucket(rate=10, capacity=1)
+    bucket.reserve()
+    waits = [bucket.reserve() for _ in range(3)]
+    assert waits == sorted(waits)
+    assert waits[0] == pytest.approx(0.1, abs=0.01)
+    assert waits[2] == pytest.approx(0.3, abs=0.01)
+
+def test_pause_holds_back_every_caller():
+    bucket = TokenBucket(rate=1000, capacity=10)
+    bucket.pause(0.5)
+    assert bucket.reserve() == pytest.approx(0.5, abs=0.01)
+
+def test_file_bucket_is_shared_through_its_state_file(tmp_path):
+    path = str(tmp_path / 'bucket.json')
+    first, second = FileTokenBucket(path, rate=10, capacity=2), FileTokenBucket(path, rate=10, capacity=2)
+    assert first.reserve() == 0.0
+    assert second.reserve() == 0.0
+    assert first.reserve() == pytest.approx(0.1, abs=0.01)
+
+def test_rate_limiter_is_file_backed_only_with_a_state_file(tmp_path):
+    assert type(create_rate_limiter(5, 5)) is TokenBucket
+    assert isinstance(create_rate_limiter(5, 5, str(tmp_path / 'bucket.json')), FileTokenBucket)
+
+def test_retry_after_accepts_seconds_and_dates():
+    assert parse_retry_after('2') == 2.0
+    assert parse_retry_after(None) is None
+    assert parse_retry_after('soon') is None
+    in_ten_seconds = email.utils.formatdate(time.time() + 10, usegmt=True)
+    assert parse_retry_after(in_ten_seconds) == pytest.approx(10, abs=1.5)
+
+def test_backoff_is_capped():
+    assert all(0 <= backoff_delay(attempt, 0.5, 4) <= 4 for attempt in range(10))
@@ -0,0 +1,99 @@
+import pytest
+
+from patent_database import resilience
+from patent_database.client import ODPClient
+from patent_database.constants import API_ENDPOINTS
+from patent_database.ratelimit import TokenBucket
+from patent_database.resilience import CircuitBreaker, Deadline, DeadlineExceeded
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(resilience.time, 'monotonic', fake)
+    return fake
+
+def open_breaker(breaker):
+    for _ in range(breaker.min_requests):
+        breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+def test_deadline_caps_timeouts(clock):
+    deadline = Deadline(10)
+    clock.now += 8
+    assert deadline.remaining() == pytest.approx(2)
+    assert deadline.timeout((5, 30)) == pytest.approx((2, 2))
+    clock.now += 3
+    assert deadline.expired()
+    with pytest.raises(DeadlineExceeded):
+        deadline.check()
+
+def test_breaker_opens_at_error_threshold(clock):
+    breaker = CircuitBreaker(error_threshold=0.5, min_requests=4)
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow_request()
+
+def test_failures_outside_the_window_are_forgotten(clock):
+    breaker = CircuitBreaker(min_requests=2, window=60)
+    breaker.record_failure()
+    clock.now += 61
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+def test_half_open_probe_closes_or_reopens(clock):
+    breaker = CircuitBreaker(min_requests=1, recovery_timeout=30)
+    open_breaker(breaker)
+    clock.now += 30
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow_request()
+    assert not breaker.allow_request()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+    clock.now += 30
+    assert breaker.allow_request()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow_request()
+
+def test_released_probe_lets_the_next_request_probe(clock):
+    breaker = CircuitBreaker(min_requests=1, recovery_timeout=30)
+    open_breaker(breaker)
+    clock.now += 30
+    assert breaker.allow_request()
+    breaker.release_probe()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow_request()
+
+def test_stale_probe_is_freed_after_recovery_timeout(clock):
+    breaker = CircuitBreaker(min_requests=1, recovery_timeout=30)
+    open_breaker(breaker)
+    clock.now += 30
+    assert breaker.allow_request()
+    clock.now += 29
+    assert not breaker.allow_request()
+    clock.now += 1
+    assert breaker.allow_request()
+
+def test_probe_ending_in_deadline_does_not_wedge_the_breaker(clock, mock_odp):
+    breaker = CircuitBreaker(min_requests=1, recovery_timeout=30)
+    client = ODPClient('key', rate_limiter=TokenBucket(1000, 1000), circuit_breaker=breaker)
+    open_breaker(breaker)
+    clock.now += 30
+    # The rate-limit wait is longer than the deadline, so the probe leaves before any outcome
+    client.rate_limiter.pause(5)
+    with pytest.raises(DeadlineExceeded):
+        client.post(API_ENDPOINTS['patent_search'], {'q': '*'}, deadline=Deadline(1))
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow_request()
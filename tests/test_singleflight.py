@@ -0,0 +1,73 @@
+import threading
+
+import pytest
+
+from patent_database.singleflight import SingleFlight
+
+def test_identical_concurrent_calls_run_once():
+    flight = SingleFlight()
+    release = threading.Event()
+    calls, results = [], []
+
+    def slow_call():
+        calls.append(1)
+        release.wait(5)
+        return 'response'
+
+    def caller():
+        results.append(flight.do('key', slow_call))
+
+    threads = [threading.Thread(target=caller) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    while flight.deduplicated < 4:
+        threading.Event().wait(0.01)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert sorted(results) == [('response', False)] + [('response', True)] * 4
+
+def test_waiters_receive_the_leaders_error():
+    flight = SingleFlight()
+    release = threading.Event()
+    errors = []
+
+    def failing_call():
+        release.wait(5)
+        raise ValueError('upstream failed')
+
+    def caller():
+        try:
+            flight.do('key', failing_call)
+        except ValueError as e:
+            errors.append(str(e))
+
+    threads = [threading.Thread(target=caller) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    while flight.deduplicated < 2:
+        threading.Event().wait(0.01)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert errors == ['upstream failed'] * 3
+
+def test_finished_calls_are_not_reused():
+    flight = SingleFlight()
+    assert flight.do('key', lambda: 1) == (1, False)
+    assert flight.do('key', lambda: 2) == (2, False)
+    assert flight.deduplicated == 0
+
+def test_waiter_gives_up_after_its_timeout():
+    flight = SingleFlight()
+    release = threading.Event()
+    leader = threading.Thread(target=flight.do, args=('key', lambda: release.wait(5)))
+    leader.start()
+    while not flight._calls:
+        threading.Event().wait(0.01)
+    with pytest.raises(TimeoutError):
+        flight.do('key', lambda: None, timeout=0.05)
+    release.set()
+    leader.join()
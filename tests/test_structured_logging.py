@@ -0,0 +1,83 @@
+import json
+import logging
+import threading
+
+import pytest
+
+from patent_database import structured_logging
+from patent_database.structured_logging import (LazyJSON, SampleFilter, JSONFormatter, VERBOSE,
+                                                PACKAGE_LOGGER, setup_logging)
+
+class Recorder(logging.Handler):
+    """Collects formatted messages and the thread that formatted them"""
+
+    def __init__(self):
+        super().__init__()
+        self.lines = []
+        self.threads = []
+
+    def emit(self, record):
+        self.lines.append(self.format(record))
+        self.threads.append(threading.current_thread().name)
+
+def make_record(message, *args, **extra):
+    record = logging.LogRecord('patent_database.test', logging.INFO, __file__, 1, message, args, None)
+    record.__dict__.update(extra)
+    return record
+
+def test_lazy_json_serializes_only_when_emitted():
+    calls = []
+
+    def default(value):
+        calls.append(value)
+        return str(value)
+
+    payload = {'when': object()}
+    logger = logging.getLogger('patent_database.test.lazy')
+    logger.setLevel(logging.WARNING)
+    logger.info("Payload: %s", LazyJSON(payload))
+    assert calls == []
+    assert json.loads(str(LazyJSON({'q': '*'}))) == {'q': '*'}
+
+def test_sample_filter_keeps_only_verbose_records_at_rate():
+    assert SampleFilter(0).filter(make_record("kept"))
+    assert not SampleFilter(0).filter(make_record("dropped", **VERBOSE))
+    assert SampleFilter(1).filter(make_record("kept", **VERBOSE))
+
+def test_json_formatter_writes_one_object_per_line():
+    line = JSONFormatter().format(make_record("Found %d results", 3))
+    entry = json.loads(line)
+    assert entry['message'] == 'Found 3 results'
+    assert entry['level'] == 'INFO'
+    assert entry['logger'] == 'patent_database.test'
+
+@pytest.fixture
+def package_logging(monkeypatch, settings):
+    """setup_logging() on a clean slate, undone after the test"""
+    settings(LOG_LEVEL='WARNING', ODP_LOG_SAMPLE_RATE=1.0, ODP_LOG_PROPAGATE=False)
+    monkeypatch.setattr(structured_logging, '_handler', None)
+    monkeypatch.setattr(structured_logging, '_listener', None)
+    package_logger = logging.getLogger(PACKAGE_LOGGER)
+    monkeypatch.setattr(package_logger, 'handlers', [])
+    monkeypatch.setattr(package_logger, 'level', package_logger.level)
+    monkeypatch.setattr(package_logger, 'propagate', package_logger.propagate)
+    yield package_logger
+    structured_logging._stop_listener()
+
+def test_setup_leaves_the_root_logger_alone(package_logging):
+    root = logging.getLogger()
+    handlers, level = list(root.handlers), root.level
+    setup_logging()
+    assert root.handlers == handlers
+    assert root.level == level
+    assert package_logging.level == logging.WARNING
+    assert package_logging.propagate is False
+
+def test_messages_are_built_on_the_listener_thread(package_logging):
+    setup_logging()
+    recorder = Recorder()
+    structured_logging._listener.handlers = (recorder,)
+    logging.getLogger('patent_database.test').warning("Payload: %s", LazyJSON({'q': 'widget'}))
+    structured_logging._stop_listener()
+    assert recorder.lines == ['Payload: {"q": "widget"}']
+    assert recorder.threads != [threading.current_thread().name]
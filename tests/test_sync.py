@@ -0,0 +1,80 @@
+import json
+import threading
+
+import pytest
+
+from benchmarks.mock_odp import make_record
+from patent_database import mirror as mirror_module
+from patent_database.client import ODPResponse
+from patent_database.sync import SyncError, run_sync, save_query, sync_key
+
+PARAMS = {'search_type': 'simple', 'query_params': {'term': 'widget'}}
+
+@pytest.fixture
+def upstream(monkeypatch, tmp_path, settings, odp_client):
+    """Answer sync searches from `records` like ODP: status date filter, sort, pagination"""
+    settings(ODP_MIRROR_ENABLED=True, ODP_MIRROR_PATH=str(tmp_path / 'mirror.sqlite3'), ODP_SYNC_WINDOW_ROWS=10)
+    monkeypatch.setattr(mirror_module, '_mirror', None)
+    state = {'records': [make_record(number) for number in range(30)], 'fail_after': None, 'calls': 0}
+
+    def post(url, payload, **kwargs):
+        state['calls'] += 1
+        if state['fail_after'] is not None and state['calls'] > state['fail_after']:
+            return ODPResponse(500, {}, b'{}')
+        since = next((rf['valueFrom'] for rf in payload['rangeFilters']), '')
+        matching = sorted((record for record in state['records'] if sync_key(record)[0] >= since), key=sync_key)
+        offset, limit = payload['pagination']['offset'], payload['pagination']['limit']
+        body = {'count': len(matching), 'patentFileWrapperDataBag': matching[offset:offset + limit]}
+        return ODPResponse(200, {}, json.dumps(body).encode())
+
+    monkeypatch.setattr(odp_client, 'post', post)
+    save_query('widgets', PARAMS)
+    return state
+
+def mirrored(records):
+    mirror = mirror_module.get_mirror()
+    return [record['applicationNumberText'] for record in records
+            if mirror.get(record['applicationNumberText']) is not None]
+
+def test_sync_pages_through_every_window(upstream):
+    report = run_sync('widgets')
+    assert report['added'] == 30
+    assert report['windows'] > 1
+    assert report['watermark'] == max(sync_key(record)[0] for record in upstream['records'])
+    assert len(mirrored(upstream['records'])) == 30
+
+def test_resumed_sync_does_not_skip_moved_records(upstream):
+    upstream['fail_after'] = 1
+    with pytest.raises(SyncError):
+        run_sync('widgets')
+    synced = set(mirrored(upstream['records']))
+    assert len(synced) == 10
+
+    # A synced record changes status, so every later row moves up by one
+    moved = next(record for record in upstream['records'] if record['applicationNumberText'] in synced)
+    moved['applicationMetaData']['applicationStatusDate'] = '2025-06-01'
+    upstream['fail_after'] = None
+    run_sync('widgets')
+    assert len(mirrored(upstream['records'])) == 30
+
+def test_window_full_of_one_status_date_fails(upstream):
+    for record in upstream['records']:
+        record['applicationMetaData']['applicationStatusDate'] = '2024-05-05'
+    with pytest.raises(SyncError, match='ODP_SYNC_WINDOW_ROWS'):
+        run_sync('widgets')
+
+def test_upstream_calls_count_only_this_run(upstream, odp_client, monkeypatch):
+    post = odp_client.post
+
+    def counting_post(url, payload, **kwargs):
+        odp_client.count_upstream_request()
+        # A search of another request sent at the same time
+        other = threading.Thread(target=odp_client.count_upstream_request)
+        other.start()
+        other.join()
+        return post(url, payload, **kwargs)
+
+    monkeypatch.setattr(odp_client, 'post', counting_post)
+    report = run_sync('widgets')
+    assert report['upstream_calls'] == upstream['calls']
+    assert odp_client.upstream_requests == 2 * upstream['calls']
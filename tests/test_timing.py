@@ -0,0 +1,32 @@
+import threading
+
+from patent_database.timing import Timings, collect_timings, current_timings, record_span, span
+
+def test_spans_add_up_per_stage():
+    with collect_timings() as timings:
+        record_span('upstream', 0.25)
+        record_span('upstream', 0.5)
+        with span('decode'):
+            pass
+    assert timings.as_dict()['upstream'] == 750.0
+    assert list(timings.as_dict()) == ['upstream', 'decode', 'total']
+    assert current_timings() is None
+
+def test_concurrent_spans_are_not_lost():
+    timings = Timings()
+
+    def add_many():
+        for _ in range(10000):
+            timings.add('upstream', 0.001)
+
+    threads = [threading.Thread(target=add_many) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert round(timings.spans['upstream']) == 80000
+
+def test_header_lists_every_stage():
+    timings = Timings()
+    timings.add('validate', 0.0002)
+    assert timings.header().startswith('validate;dur=0.2, total;dur=')
@@ -0,0 +1,50 @@
+import json
+
+import pytest
+import requests
+
+from patent_database.transport import Cassette, CassetteAdapter, CassetteMiss
+
+PATH = '/api/v1/patent/applications/search'
+
+def body(**payload):
+    return json.dumps(dict({'q': 'wireless AND sensor', 'pagination': {'offset': 0, 'limit': 25}}, **payload))
+
+def recorded_cassette(path, *interactions):
+    cassette = Cassette(str(path), 'record')
+    for request_body, content in interactions:
+        cassette.record('POST', f'https://api.uspto.gov{PATH}', request_body, 200,
+                        {'Content-Type': 'application/json', 'Content-Length': '99'}, content, 0.25)
+    return Cassette(str(path), 'replay')
+
+def test_replay_matches_path_and_canonical_payload(tmp_path):
+    cassette = recorded_cassette(tmp_path / 'cassette.jsonl.gz', (body(), b'{"count": 1}'))
+    interaction, content, delay = cassette.replay('POST', f'http://127.0.0.1:8080{PATH}',
+                                                  body(q='sensor AND  wireless'))
+    assert content == b'{"count": 1}'
+    assert delay == 0
+    assert 'Content-Length' not in interaction['headers']
+
+def test_repeated_requests_replay_in_order_then_repeat_the_last(tmp_path):
+    cassette = recorded_cassette(tmp_path / 'cassette.jsonl.gz', (body(), b'first'), (body(), b'second'))
+    replayed = [cassette.replay('POST', PATH, body())[1] for _ in range(3)]
+    assert replayed == [b'first', b'second', b'second']
+
+def test_unrecorded_request_is_a_miss(tmp_path):
+    cassette = recorded_cassette(tmp_path / 'cassette.jsonl.gz', (body(), b'{}'))
+    with pytest.raises(CassetteMiss):
+        cassette.replay('POST', PATH, body(pagination={'offset': 25, 'limit': 25}))
+
+def test_adapter_serves_replayed_responses_without_network(tmp_path):
+    cassette = recorded_cassette(tmp_path / 'cassette.jsonl.gz', (body(), b'{"count": 7}'))
+    session = requests.Session()
+    session.mount('https://', CassetteAdapter(cassette))
+    response = session.post(f'https://api.uspto.gov{PATH}', data=body())
+    assert response.status_code == 200
+    assert response.json() == {'count': 7}
+    with pytest.raises(requests.exceptions.ConnectionError):
+        session.post(f'https://api.uspto.gov{PATH}', data=body(q='other'))
+
+def test_unknown_mode_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        Cassette(str(tmp_path / 'cassette.jsonl.gz'), 'rewind')